@@ -11,6 +11,73 @@ class Config:
     DATABASE_USER = os.getenv('USER')
     DATABASE_PASSWORD = os.getenv('PASSWORD')
     
+    # Connection pool
+    DB_POOL_ENABLED = os.getenv('DB_POOL_ENABLED', 'True').lower() == 'true'
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_MAX_LIFETIME = int(os.getenv('DB_POOL_MAX_LIFETIME', 1800))  # seconds
+    DB_POOL_MAX_IDLE = int(os.getenv('DB_POOL_MAX_IDLE', 300))  # seconds
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+    DB_POOL_HEALTH_CHECK_INTERVAL = int(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', 30))  # seconds
+    
+    # Read replicas (comma-separated libpq DSNs) used by get_db(readonly=True)
+    DATABASE_REPLICA_URLS = [dsn.strip() for dsn in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if dsn.strip()]
+    DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5))  # seconds
+    DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', 5))  # seconds
+    DB_REPLICA_EJECT_SECONDS = float(os.getenv('DB_REPLICA_EJECT_SECONDS', 30))
+    DB_READ_YOUR_WRITES_WINDOW = float(os.getenv('DB_READ_YOUR_WRITES_WINDOW', 5))  # seconds after a session writes
+    
+    # SQL instrumentation (X-Query-Count / X-Query-Time-Ms headers and a log line per request)
+    SQL_INSTRUMENTATION = os.getenv('SQL_INSTRUMENTATION', 'True').lower() == 'true'
+    QUERY_LOG_ENABLED = os.getenv('QUERY_LOG_ENABLED', 'True').lower() == 'true'
+    QUERY_LOG_TOP_N = int(os.getenv('QUERY_LOG_TOP_N', 5))
+    
+    # Slow-query log (requires SQL_INSTRUMENTATION); 0 disables it
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 500))
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1))
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', 5000))
+    SLOW_QUERY_LOG_FILE = os.getenv('SLOW_QUERY_LOG_FILE', 'logs/slow_queries.log')
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', 5 * 1024 * 1024))
+    SLOW_QUERY_LOG_BACKUPS = int(os.getenv('SLOW_QUERY_LOG_BACKUPS', 3))
+    
+    # Default per-request limits (0 = unlimited); override with @query_limits or set_blueprint_limits
+    DEFAULT_STATEMENT_TIMEOUT_MS = int(os.getenv('DEFAULT_STATEMENT_TIMEOUT_MS', 0))
+    DEFAULT_MAX_QUERIES = int(os.getenv('DEFAULT_MAX_QUERIES', 0))
+    
+    # Rows fetched per round trip when streaming large result sets
+    STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 500))
+    
+    # Serve book listings from the trigger-maintained book_summary table (migration 0005)
+    BOOK_SUMMARY_ENABLED = os.getenv('BOOK_SUMMARY_ENABLED', 'True').lower() == 'true'
+    
+    # Typo-tolerant matching (pg_trgm word similarity, 0..1)
+    FUZZY_MATCH_THRESHOLD = float(os.getenv('FUZZY_MATCH_THRESHOLD', 0.45))
+    FUZZY_SUGGESTION_THRESHOLD = float(os.getenv('FUZZY_SUGGESTION_THRESHOLD', 0.3))
+    FUZZY_SUGGESTION_LIMIT = int(os.getenv('FUZZY_SUGGESTION_LIMIT', 3))
+    
+    # In-process autocomplete index (/api/suggest); rebuilt from the database this often (0 = never)
+    SUGGEST_INDEX_REBUILD_SECONDS = int(os.getenv('SUGGEST_INDEX_REBUILD_SECONDS', 300))
+    
+    # Per-process name -> id cache for authors, categories and languages (database/dimensions.py)
+    DIMENSION_CACHE_SIZE = int(os.getenv('DIMENSION_CACHE_SIZE', 5000))  # entries per table, 0 = no cache
+    DIMENSION_CACHE_TTL_SECONDS = int(os.getenv('DIMENSION_CACHE_TTL_SECONDS', 600))
+    
+    # POST /api/books/bulk: largest accepted batch and rows per multi-row INSERT
+    BULK_IMPORT_MAX_ITEMS = int(os.getenv('BULK_IMPORT_MAX_ITEMS', 10000))
+    BULK_PAGE_SIZE = int(os.getenv('BULK_PAGE_SIZE', 1000))
+    
+    # GET /api/books/?ids= and POST /api/books/batch: most ids per request
+    BOOK_BATCH_MAX_IDS = int(os.getenv('BOOK_BATCH_MAX_IDS', 500))
+    
+    # /api/books?filter=: in-process bitmap index (services/bitmap_index.py)
+    BITMAP_INDEX_ENABLED = os.getenv('BITMAP_INDEX_ENABLED', 'True').lower() == 'true'
+    BITMAP_INDEX_REFRESH_SECONDS = float(os.getenv('BITMAP_INDEX_REFRESH_SECONDS', 5))
+    
+    # /books facet counts (database/facets.py): rollup refresh interval (0 = never) and the
+    # largest filtered set counted per request
+    FACET_ROLLUP_REFRESH_SECONDS = float(os.getenv('FACET_ROLLUP_REFRESH_SECONDS', 60))
+    FACET_COUNT_MAX_MATCHES = int(os.getenv('FACET_COUNT_MAX_MATCHES', 50000))
+    
     # App settings
     SECRET_KEY = os.getenv('SECRET_KEY')
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
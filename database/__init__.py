@@ -1,5 +1,7 @@
-from .connection import get_db
+from .connection import get_db, get_pool, get_replicas, close_pool, init_app, on_commit
+from .pool import PoolTimeout
+from .limits import query_limits, set_blueprint_limits, QueryBudgetExceeded
 
 
 
-__all__ = ['get_db']
\ No newline at end of file
+__all__ = ['get_db', 'init_app', 'on_commit', 'get_pool', 'get_replicas', 'close_pool', 'PoolTimeout', 'query_limits', 'set_blueprint_limits', 'QueryBudgetExceeded']
\ No newline at end of file
@@ -0,0 +1,37 @@
+"""Reads of the ``book_changes`` log (migration 0017).
+
+Rows are returned in (txid, id) order, and only for transactions older than
+every running one: a transaction that started earlier but commits later
+would otherwise write rows behind a cursor that has already moved past
+them. A position in the log is the (txid, id) of the last row read.
+"""
+
+CHANGES_QUERY = """
+    SELECT txid, id, book_id, op FROM book_changes
+    WHERE (txid, id) > (%s, %s)
+      AND txid < txid_snapshot_xmin(txid_current_snapshot())
+    ORDER BY txid, id
+    LIMIT %s
+"""
+
+LATEST_POSITION_QUERY = """
+    SELECT txid, id FROM book_changes
+    WHERE txid < txid_snapshot_xmin(txid_current_snapshot())
+    ORDER BY txid DESC, id DESC
+    LIMIT 1
+"""
+
+START = (0, 0)
+
+
+def read_changes(cursor, since=START, limit=1000):
+    """Up to ``limit`` change rows {'txid', 'id', 'book_id', 'op'} after the position ``since``"""
+    cursor.execute(CHANGES_QUERY, (since[0], since[1], limit))
+    return cursor.fetchall()
+
+
+def latest_position(cursor):
+    """Position of the newest finished change; reading from it skips the log written so far"""
+    cursor.execute(LATEST_POSITION_QUERY)
+    row = cursor.fetchone()
+    return (row['txid'], row['id']) if row else START
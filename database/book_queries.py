@@ -0,0 +1,142 @@
+"""SQL builder for book rows with their authors, categories and languages.
+
+Each relation is aggregated by its own correlated ``ARRAY(SELECT ...)``
+subquery instead of LEFT JOINing all three junction tables at once, so a
+book with 5 authors, 4 categories and 2 languages reads 11 junction rows
+rather than building a 40-row cartesian product that ``DISTINCT`` then
+throws away. When a limit is requested the page of books is selected first
+and only those rows are aggregated.
+
+When ``Config.BOOK_SUMMARY_ENABLED`` is set, the rows are read from the
+trigger-maintained ``book_summary`` table instead (aliased as ``books`` so
+the same conditions and ordering apply) and nothing is aggregated at read
+time.
+
+Full-text search (``search=True``) always reads ``book_summary``, whose
+weighted ``search_vector`` (title A, authors B, categories C) is kept up to
+date by a trigger and indexed with GIN.
+"""
+import re
+from config import Config
+
+BOOK_COLUMNS = ('id', 'title', 'publication_year', 'open_library_id', 'cover_id')
+
+# relation -> (junction table, junction column, dimension table)
+RELATIONS = {
+    'categories': ('book_categories', 'category_id', 'categories'),
+    'languages': ('book_languages', 'language_id', 'languages'),
+    'authors': ('book_authors', 'author_id', 'authors')
+}
+ALL_RELATIONS = tuple(RELATIONS)
+
+SEARCH_MATCH = "books.search_vector @@ search_query"
+# Best match first; ``rank`` is the ts_rank column added by book_select(search=True)
+SEARCH_ORDER = ('rank DESC', 'books.title', 'books.id')
+
+_SEARCH_WORD_RE = re.compile(r"\w+")
+
+
+def relation_array(relation, book_ref='books.id'):
+    """Sorted, de-duplicated array of names for one relation of the book ``book_ref``"""
+    junction, column, table = RELATIONS[relation]
+    return (
+        f"ARRAY(SELECT DISTINCT {table}.name::text FROM {junction} "
+        f"JOIN {table} ON {table}.id = {junction}.{column} "
+        f"WHERE {junction}.book_id = {book_ref} ORDER BY 1) AS {relation}"
+    )
+
+
+def relation_exists(relation, condition, book_ref='books.id'):
+    """EXISTS test on one relation; ``condition`` is SQL on the dimension table (e.g. ``LOWER(authors.name) = %s``)"""
+    junction, column, table = RELATIONS[relation]
+    return (
+        f"EXISTS (SELECT 1 FROM {junction} "
+        f"JOIN {table} ON {table}.id = {junction}.{column} "
+        f"WHERE {junction}.book_id = {book_ref} AND {condition})"
+    )
+
+
+def search_tsquery(text, min_length=1):
+    """Turn user input into a prefix-matching tsquery ('word:* & other:*'), or None if it has no words"""
+    words = [word.lower() for word in _SEARCH_WORD_RE.findall(text or '') if len(word) >= min_length]
+    return ' & '.join(f"{word}:*" for word in words) or None
+
+
+def _summary_from(search):
+    if search:
+        return "book_summary AS books CROSS JOIN to_tsquery('simple', %s) AS search_query"
+    return "book_summary AS books"
+
+
+def book_select(where=(), order_by=('books.id',), relations=ALL_RELATIONS,
+                columns=BOOK_COLUMNS, limit=False, offset=False, summary=None, search=False, rank=None):
+    """Build a SELECT of book rows plus one name array per requested relation.
+
+    ``where`` conditions refer to the ``books`` table and are ANDed. With
+    ``limit``/``offset`` the query expects ``LIMIT %s`` / ``OFFSET %s``
+    parameters after the ``where`` parameters. ``summary`` overrides
+    ``Config.BOOK_SUMMARY_ENABLED``. With ``search`` the first parameter is a
+    tsquery from search_tsquery(); only matching books are returned, with a
+    ``rank`` column to order by (see SEARCH_ORDER). A custom ``rank``
+    expression (e.g. a trigram similarity) is selected the same way; its
+    parameters come first. Ranked queries always read ``book_summary``.
+
+    Without ``relations`` nothing is joined or aggregated and the rows come
+    from ``books`` itself, which is narrower than ``book_summary``.
+    """
+    if summary is None:
+        summary = Config.BOOK_SUMMARY_ENABLED
+    if search:
+        rank = "ts_rank(books.search_vector, search_query)"
+        where = [SEARCH_MATCH] + list(where)
+    if rank:
+        summary = True
+    elif not relations:
+        summary = False
+    where_clause = "WHERE " + " AND ".join(where) if where else ""
+    order_clause = "ORDER BY " + ", ".join(order_by) if order_by else ""
+    page_clause = ("LIMIT %s " if limit else "") + ("OFFSET %s" if offset else "")
+    select_list = [f"books.{column}" for column in columns]
+
+    if summary:
+        select_list += [f"books.{relation}" for relation in relations]
+        if rank:
+            select_list.append(f"{rank} AS rank")
+        return f"""
+            SELECT {', '.join(select_list)}
+            FROM {_summary_from(search)}
+            {where_clause}
+            {order_clause}
+            {page_clause}
+        """
+
+    select_list += [relation_array(relation) for relation in relations]
+    if not relations or (not limit and not offset):
+        return f"""
+            SELECT {', '.join(select_list)}
+            FROM books
+            {where_clause}
+            {order_clause}
+            {page_clause}
+        """
+
+    # Select the page of books first so only those rows are aggregated
+    return f"""
+        SELECT {', '.join(select_list)}
+        FROM (
+            SELECT books.* FROM books
+            {where_clause}
+            {order_clause}
+            {page_clause}
+        ) AS books
+        {order_clause}
+    """
+
+
+def book_count(where=(), search=False):
+    """COUNT(*) of the books matching ``where`` (same parameters as book_select)"""
+    if search:
+        where = [SEARCH_MATCH] + list(where)
+    where_clause = "WHERE " + " AND ".join(where) if where else ""
+    source = _summary_from(True) if search else "books"
+    return f"SELECT COUNT(*) AS count FROM {source} {where_clause}"
@@ -0,0 +1,34 @@
+"""Consistency check for the trigger-maintained ``book_summary`` table.
+
+The summary rows are compared against the same aggregates computed live from
+``books`` and the junction tables; any difference is drift that the
+triggers from migration 0005 should have prevented.
+"""
+from .book_queries import BOOK_COLUMNS, ALL_RELATIONS, book_select
+from .connection import get_db
+
+_COMPARED = BOOK_COLUMNS[1:] + ALL_RELATIONS
+
+DRIFT_QUERY = f"""
+    SELECT COALESCE(live.id, summary.id) AS book_id,
+           CASE WHEN summary.id IS NULL THEN 'missing'
+                WHEN live.id IS NULL THEN 'orphaned'
+                ELSE 'stale' END AS problem
+    FROM ({book_select(order_by=(), summary=False)}) AS live
+    FULL OUTER JOIN book_summary AS summary ON summary.id = live.id
+    WHERE summary.id IS NULL OR live.id IS NULL
+       OR ({', '.join(f'live.{column}' for column in _COMPARED)})
+          IS DISTINCT FROM ({', '.join(f'summary.{column}' for column in _COMPARED)})
+    ORDER BY 1
+"""
+
+
+def check_book_summary(repair=False):
+    """Return the drifted rows as [{'book_id', 'problem'}]; with repair=True, also refresh them"""
+    with get_db() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(DRIFT_QUERY)
+            drift = cursor.fetchall()
+            if repair and drift:
+                cursor.execute("SELECT refresh_book_summaries(%s)", ([row['book_id'] for row in drift],))
+    return drift
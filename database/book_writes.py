@@ -0,0 +1,35 @@
+"""Single-round-trip book writes through the ``upsert_book`` database function.
+
+``upsert_book`` (migrations 0011 and 0012) checks for a duplicate title,
+inserts or updates the book, creates missing authors/categories/languages
+and links them, all server-side. On update only the differences are
+written: changed columns, and the junction rows to add or remove. Callers
+get back one row::
+
+    {'book_id': ..., 'status': 'created' | 'updated' | 'duplicate' | 'not_found',
+     'created': {'authors': [{'id', 'name'}], 'categories': [...], 'languages': [...]},
+     'changes': {'fields': ['title', ...], 'authors': {'added': [names], 'removed': [names]}, ...}}
+"""
+
+UPSERT_BOOK = ("SELECT book_id, status, created, changes FROM upsert_book("
+               "%s::integer, %s::text, %s::integer, %s::text, %s::text, %s::text[], %s::text[], %s::text[])")
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def upsert_book(cursor, book_id=None, title=None, publication_year=None, open_library_id=None, cover_id=None,
+                authors=None, categories=None, languages=None):
+    """Insert (book_id None) or update a book in one statement; see the module docstring for the result.
+
+    On update, None fields are left unchanged and an empty name list leaves that relation unchanged.
+    """
+    cursor.execute(UPSERT_BOOK, (book_id, title, publication_year, _text(open_library_id), _text(cover_id),
+                                 authors or [], categories or [], languages or []))
+    return cursor.fetchone()
+
+
+def created_names(result, relation):
+    """[(id, name)] of the ``relation`` rows an upsert_book call created"""
+    return [(row['id'], row['name']) for row in (result['created'] or {}).get(relation, [])]
@@ -0,0 +1,154 @@
+"""Set-based ingestion of many books in one transaction.
+
+Items are normalized in Python the same way ``add_book`` normalizes a single
+book. Then, whatever the batch size:
+
+* each dimension table (authors, categories, languages) resolves all of
+  the batch's names at once through ``database.dimensions``;
+* one statement finds titles that already exist (``books.normalized_title``);
+* ``execute_values`` inserts the books (``ON CONFLICT DO NOTHING``) and the
+  junction rows, in pages of ``Config.BULK_PAGE_SIZE`` rows.
+
+The result has one entry per input item, in input order, with the status
+``created``, ``conflict`` or ``error``.
+"""
+from psycopg2.extras import execute_values
+from config import Config
+from util import normalize_strings
+from .dimensions import get_resolver
+
+# Item key -> dimension table, junction table and its foreign key column
+DIMENSIONS = {
+    'authors': ('authors', 'book_authors', 'author_id'),
+    'categories': ('categories', 'book_categories', 'category_id'),
+    'languages': ('languages', 'book_languages', 'language_id')
+}
+_SINGULAR = {'authors': 'author', 'categories': 'category', 'languages': 'language'}
+
+
+def _names(item, key):
+    """Normalized, de-duplicated names for a dimension, accepting the singular key and a bare string"""
+    values = item.get(key, item.get(_SINGULAR[key], []))
+    if isinstance(values, str):
+        values = [values]
+    if not isinstance(values, list):
+        raise ValueError(f"{key} must be a list of names")
+    names = []
+    for value in values:
+        name = normalize_strings(value) if isinstance(value, str) else None
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _year(value):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError("publication_year must be an integer")
+
+
+def normalize_item(item):
+    """Validated, normalized copy of one incoming book; raises ValueError if it cannot be stored"""
+    if not isinstance(item, dict):
+        raise ValueError("Each item must be a JSON object")
+    title = normalize_strings(item.get('title')) if isinstance(item.get('title'), str) else None
+    if not title:
+        raise ValueError("Title is required")
+    book = {
+        'title': title,
+        'publication_year': _year(item.get('publication_year')),
+        'open_library_id': item.get('open_library_id') or None,
+        'cover_id': item.get('cover_id') or None
+    }
+    for key in DIMENSIONS:
+        book[key] = _names(item, key)
+    return book
+
+
+def bulk_insert_books(cursor, items):
+    """Insert ``items`` (raw dicts) on ``cursor``'s transaction; return (results, created dimension names)
+
+    ``created`` maps each dimension key to {id: name} for the rows this call inserted.
+    """
+    results = [None] * len(items)
+    books = []  # (index, normalized book)
+    seen_titles = {}
+    seen_ol_ids = {}
+    for index, item in enumerate(items):
+        try:
+            book = normalize_item(item)
+        except ValueError as e:
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+            continue
+        if book['title'] in seen_titles:
+            results[index] = {'index': index, 'status': 'conflict',
+                              'error': f"Duplicate of item {seen_titles[book['title']]} in this batch"}
+            continue
+        if book['open_library_id'] and book['open_library_id'] in seen_ol_ids:
+            results[index] = {'index': index, 'status': 'conflict',
+                              'error': f"open_library_id duplicates item {seen_ol_ids[book['open_library_id']]} in this batch"}
+            continue
+        seen_titles[book['title']] = index
+        if book['open_library_id']:
+            seen_ol_ids[book['open_library_id']] = index
+        books.append((index, book))
+
+    created_names = {key: {} for key in DIMENSIONS}
+    if not books:
+        return results, created_names
+
+    # Titles that already exist: probes of the unique normalized_title index. The key is
+    # computed by SQL normalize_title(), which can differ from normalize_strings (e.g. on
+    # non-ASCII whitespace), and the rows are matched back by the exact title sent.
+    cursor.execute(
+        "SELECT titles.title, books.id FROM unnest(%s::text[]) AS titles(title) "
+        "JOIN books ON books.normalized_title = normalize_title(titles.title)",
+        ([book['title'] for _, book in books],)
+    )
+    existing = {row['title']: row['id'] for row in cursor.fetchall()}
+    pending = []
+    for index, book in books:
+        if book['title'] in existing:
+            results[index] = {'index': index, 'status': 'conflict', 'book_id': existing[book['title']],
+                              'error': "Book with this title already exists"}
+        else:
+            pending.append((index, book))
+    if not pending:
+        return results, created_names
+
+    inserted = execute_values(
+        cursor,
+        "INSERT INTO books (title, publication_year, open_library_id, cover_id) VALUES %s "
+        "ON CONFLICT DO NOTHING RETURNING id, title",
+        [(book['title'], book['publication_year'], book['open_library_id'], book['cover_id']) for _, book in pending],
+        page_size=Config.BULK_PAGE_SIZE,
+        fetch=True
+    )
+    # Exact inserted title, unique within the batch (see seen_titles)
+    book_ids = {row['title']: row['id'] for row in inserted}
+
+    created_books = []
+    for index, book in pending:
+        book_id = book_ids.get(book['title'])
+        if book_id is None:
+            # open_library_id taken, or the title was added by a concurrent transaction
+            results[index] = {'index': index, 'status': 'conflict',
+                              'error': "Book with this title or open_library_id already exists"}
+        else:
+            results[index] = {'index': index, 'status': 'created', 'book_id': book_id}
+            created_books.append((book_id, book))
+
+    for key, (table, junction, column) in DIMENSIONS.items():
+        names = {name for _, book in created_books for name in book[key]}
+        created = {}
+        ids = get_resolver(table).resolve(cursor, names, created)
+        created_names[key] = {row_id: name for name, row_id in created.items()}
+        links = {(book_id, ids[name.lower()]) for book_id, book in created_books for name in book[key]}
+        if links:
+            execute_values(cursor, f"INSERT INTO {junction} (book_id, {column}) VALUES %s ON CONFLICT DO NOTHING",
+                           sorted(links), page_size=Config.BULK_PAGE_SIZE)
+
+    return results, created_names
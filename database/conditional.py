@@ -0,0 +1,75 @@
+"""Conditional GETs: ETag / Last-Modified validators and 304 responses.
+
+The validators come from the columns migration 0016 keeps current:
+``books.updated_at`` / ``authors.updated_at`` for single rows and the
+``catalog_version`` counter for listings. Reading them is a primary-key
+probe, so a request whose ``If-None-Match`` (or, without one,
+``If-Modified-Since``) still matches is answered with 304 before the
+aggregate query runs::
+
+    validators = row_validators(cursor, 'books', book_id)
+    if validators and is_not_modified(*validators):
+        return not_modified(*validators)
+    ...
+    return with_validators(jsonify(book), *validators)
+
+ETags are strong: the representation is a pure function of the row version.
+The validators are read before the data, so a response is never tagged with
+a version newer than its content.
+"""
+from datetime import datetime, timedelta, timezone
+from flask import Response, request
+
+ROW_VERSION_TABLES = ('books', 'authors')
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _micros(timestamp):
+    return (timestamp - _EPOCH) // timedelta(microseconds=1)
+
+
+def row_validators(cursor, table, row_id):
+    """(etag, last_modified) of one books/authors row, or None if it does not exist"""
+    if table not in ROW_VERSION_TABLES:
+        raise ValueError(f"{table} has no updated_at column")
+    cursor.execute(f"SELECT updated_at FROM {table} WHERE id = %s", (row_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return f"{table}-{row_id}-{_micros(row['updated_at'])}", row['updated_at']
+
+
+def catalog_validators(cursor, scope):
+    """(etag, last_modified) of a listing, derived from the catalog-wide version counter"""
+    cursor.execute("SELECT version, updated_at FROM catalog_version")
+    row = cursor.fetchone()
+    return f"{scope}-v{row['version']}", row['updated_at']
+
+
+def is_not_modified(etag, last_modified):
+    """Whether the request's validators still match; If-None-Match takes precedence"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        # HTTP dates have whole-second precision
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def with_validators(response, etag, last_modified, vary=()):
+    """Tag a 200 response; clients must revalidate before reusing it.
+
+    ``vary`` names the request headers that select between representations
+    sharing the ETag, so shared caches keep them apart.
+    """
+    response.set_etag(etag)
+    for header in vary:
+        response.vary.add(header)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified(etag, last_modified, vary=()):
+    return with_validators(Response(status=304), etag, last_modified, vary)
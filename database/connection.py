@@ -1,28 +1,269 @@
+import logging
+import threading
+import time
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import cursor as PlainCursor
 from contextlib import contextmanager
+from flask import g, has_app_context, has_request_context, request, session
 from config import Config
+from .pool import ConnectionPool
+from .instrumentation import InstrumentedCursor, add_query_headers
+from . import limits
+from .replicas import ReplicaSet
+
+_pool = None
+_replicas = None
+_pool_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+# Requests with these methods never count as a write for read-your-writes
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# id(conn) -> callbacks waiting for the connection's open outermost transaction to commit
+_commit_callbacks = {}
+
+def connect(**kwargs):
+    """Open a new, unpooled connection to the primary database"""
+    return psycopg2.connect(
+        host=Config.DATABASE_HOST,
+        port=Config.DATABASE_PORT,
+        database=Config.DATABASE_NAME,
+        user=Config.DATABASE_USER,
+        password=Config.DATABASE_PASSWORD,
+        **kwargs
+    )
+
+def _pool_options():
+    return {
+        'min_size': Config.DB_POOL_MIN_SIZE,
+        'max_size': Config.DB_POOL_MAX_SIZE,
+        'max_lifetime': Config.DB_POOL_MAX_LIFETIME,
+        'max_idle': Config.DB_POOL_MAX_IDLE,
+        'timeout': Config.DB_POOL_TIMEOUT,
+        'health_check_interval': Config.DB_POOL_HEALTH_CHECK_INTERVAL
+    }
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(connect, **_pool_options())
+    return _pool
+
+def get_replicas():
+    """Return the process-wide replica set (empty when no replicas are configured)"""
+    global _replicas
+    if _replicas is None:
+        with _pool_lock:
+            if _replicas is None:
+                _replicas = ReplicaSet(
+                    Config.DATABASE_REPLICA_URLS,
+                    _pool_options(),
+                    max_lag=Config.DB_REPLICA_MAX_LAG,
+                    check_interval=Config.DB_REPLICA_LAG_CHECK_INTERVAL,
+                    eject_for=Config.DB_REPLICA_EJECT_SECONDS
+                )
+    return _replicas
+
+def close_pool():
+    """Close the connection pools (e.g. before forking worker processes)"""
+    global _pool, _replicas
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+        if _replicas is not None:
+            _replicas.closeall()
+            _replicas = None
+
+def _release_primary(conn, broken=False):
+    if Config.DB_POOL_ENABLED:
+        get_pool().putconn(conn, discard=broken)
+    else:
+        conn.close()
+
+def _acquire_primary():
+    conn = get_pool().getconn() if Config.DB_POOL_ENABLED else connect()
+    return conn, _release_primary
+
+def _acquire_replica():
+    """(conn, release) from a healthy replica, or None to fall back to the primary"""
+    try:
+        replicas = get_replicas()
+        return replicas.getconn() if replicas else None
+    except Exception as e:
+        logger.warning(f"Replica unavailable, reading from the primary: {e}")
+        return None
+
+def _recently_wrote():
+    """True while this session is inside its read-your-writes window"""
+    if not has_request_context():
+        return False
+    last_write = session.get('_db_last_write')
+    return bool(last_write) and time.time() - last_write < Config.DB_READ_YOUR_WRITES_WINDOW
+
+def _note_write():
+    if has_request_context() and request.method not in SAFE_METHODS and Config.DATABASE_REPLICA_URLS:
+        session['_db_last_write'] = time.time()
+
+def on_commit(conn, callback):
+    """Run ``callback()`` once the outermost get_db() transaction on ``conn`` commits.
+
+    Callbacks registered inside a block that rolls back (including a nested
+    savepoint block) are discarded.
+    """
+    _commit_callbacks.setdefault(id(conn), []).append(callback)
+
+def _run_commit_callbacks(conn):
+    for callback in _commit_callbacks.pop(id(conn), []):
+        try:
+            callback()
+        except Exception:
+            logger.exception("Error in on_commit callback")
+
+def _discard_commit_callbacks(conn, keep=0):
+    callbacks = _commit_callbacks.get(id(conn))
+    if callbacks is not None:
+        del callbacks[keep:]
+        if not callbacks:
+            _commit_callbacks.pop(id(conn), None)
 
 @contextmanager
-def get_db():
-    """Context manager for database connections"""
+def _connection_db(readonly=False):
+    """One connection per block: used outside of a Flask app context (scripts, CLI)"""
     conn = None
+    release = _release_primary
+    broken = False
     try:
-        # Use individual parameters
-        conn = psycopg2.connect(
-            host=Config.DATABASE_HOST,
-            port=Config.DATABASE_PORT,
-            database=Config.DATABASE_NAME,
-            user=Config.DATABASE_USER,
-            password=Config.DATABASE_PASSWORD
-        )
-        conn.cursor_factory = RealDictCursor
+        acquired = _acquire_replica() if readonly else None
+        conn, release = acquired or _acquire_primary()
+        conn.cursor_factory = InstrumentedCursor
         yield conn
         conn.commit()
+        _run_commit_callbacks(conn)
     except Exception as e:
         if conn:
-            conn.rollback()
+            _discard_commit_callbacks(conn)
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
         raise e
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            release(conn, broken=broken)
+
+class _Slot:
+    """A request-scoped connection and how deeply get_db() blocks are nested on it"""
+
+    def __init__(self, conn, release, role):
+        self.conn = conn
+        self.release = release
+        self.role = role
+        self.depth = 0
+
+def _request_slot(readonly):
+    slots = g.setdefault('_db_slots', {})
+    primary = slots.get('primary')
+    # Stay on the primary while one of its blocks is open or the session just wrote
+    if readonly and not (primary and primary.depth) and not _recently_wrote():
+        replica = slots.get('replica')
+        if replica is None:
+            acquired = _acquire_replica()
+            if acquired:
+                replica = slots['replica'] = _Slot(*acquired, role='replica')
+        if replica is not None:
+            return replica
+    if primary is None:
+        primary = slots['primary'] = _Slot(*_acquire_primary(), role='primary')
+    return primary
+
+def _drop_slot(slot):
+    slots = g.get('_db_slots', {})
+    if slots.get(slot.role) is slot:
+        del slots[slot.role]
+        slot.release(slot.conn, broken=True)
+
+@contextmanager
+def _request_db(readonly=False):
+    """Share one lazily acquired connection (per role) across the current request.
+
+    The outermost block is a transaction (commit on success, rollback on
+    error); nested blocks run inside a savepoint instead of a new connection.
+    """
+    slot = _request_slot(readonly)
+    conn = slot.conn
+    conn.cursor_factory = InstrumentedCursor
+
+    depth = slot.depth
+    savepoint = f"get_db_{depth}" if depth else None
+    pending = len(_commit_callbacks.get(id(conn), ()))
+    # Transaction bookkeeping uses a plain cursor so it is not counted as application queries
+    if savepoint:
+        with conn.cursor(cursor_factory=PlainCursor) as cursor:
+            cursor.execute(f"SAVEPOINT {savepoint}")
+    else:
+        limits.apply_statement_timeout(conn)
+    slot.depth = depth + 1
+    try:
+        yield conn
+        if savepoint:
+            with conn.cursor(cursor_factory=PlainCursor) as cursor:
+                cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+        else:
+            conn.commit()
+            if slot.role == 'primary':
+                _note_write()
+            _run_commit_callbacks(conn)
+    except Exception as e:
+        _discard_commit_callbacks(conn, keep=pending)
+        try:
+            if savepoint:
+                with conn.cursor(cursor_factory=PlainCursor) as cursor:
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                    cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+            else:
+                conn.rollback()
+        except psycopg2.Error:
+            # The connection is unusable; hand out a fresh one on the next get_db()
+            _drop_slot(slot)
+        raise e
+    finally:
+        slot.depth = depth
+
+def release_request_db(exception=None):
+    """teardown_appcontext hook: return the request-scoped connections"""
+    slots = g.pop('_db_slots', None) or {}
+    for slot in slots.values():
+        _discard_commit_callbacks(slot.conn)
+        broken = False
+        try:
+            if not slot.conn.closed:
+                slot.conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        slot.release(slot.conn, broken=broken)
+
+@contextmanager
+def get_db(readonly=False):
+    """Context manager for database connections.
+
+    Pass readonly=True for blocks that only read; they are routed to a
+    replica when one is configured and healthy.
+    """
+    if has_app_context():
+        with _request_db(readonly) as conn:
+            yield conn
+    else:
+        with _connection_db(readonly) as conn:
+            yield conn
+
+def init_app(app):
+    """Register the request-scoped connection teardown, query instrumentation and limits on a Flask app"""
+    app.after_request(add_query_headers)
+    # after_request hooks run in reverse order: limits swap the response before headers are added
+    limits.init_app(app)
+    app.teardown_appcontext(release_request_db)
@@ -0,0 +1,173 @@
+"""Name -> id resolution for the dimension tables (authors, categories, languages).
+
+Write paths that link books to authors, categories or languages by name
+from Python (the bulk endpoint, Open Library imports, the seed script) go
+through ``get_resolver(table).resolve(cursor, names)``; single-book writes
+use the ``upsert_book`` database function, which applies the same upsert
+server-side (see ``database.book_writes``). The resolver:
+
+* answers names already seen by this process from a bounded LRU cache
+  (``Config.DIMENSION_CACHE_SIZE`` entries per table, each trusted for
+  ``Config.DIMENSION_CACHE_TTL_SECONDS``);
+* resolves the rest in one statement that looks up the existing rows
+  and inserts the missing ones with ``ON CONFLICT DO NOTHING``, so two
+  requests adding the same new name never collide. A name inserted by a
+  concurrent transaction is picked up by re-running the statement.
+
+Names are matched on ``LOWER(name)``, like the lookups they replace. Only
+rows that existed before the statement are cached: an id inserted by the
+caller's transaction is not known to survive until that transaction
+commits. Renames and deletes made through the blueprints call
+``forget()``; other processes see them once the cached entry expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+from psycopg2.extras import execute_values
+from config import Config
+from .book_queries import RELATIONS
+
+TABLES = ('authors', 'categories', 'languages')
+# Re-runs of the upsert for names another transaction inserted (or deleted) concurrently
+MAX_ATTEMPTS = 3
+
+
+class DimensionResolver:
+    """Cached, race-free name -> id resolution for one dimension table"""
+
+    def __init__(self, table: str, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        if table not in TABLES:
+            raise ValueError(f"Unknown dimension table: {table}")
+        self.table = table
+        self.max_size = Config.DIMENSION_CACHE_SIZE if max_size is None else max_size
+        self.ttl = Config.DIMENSION_CACHE_TTL_SECONDS if ttl is None else ttl
+        self._cache = OrderedDict()  # lower(name) -> (id, cached_at), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    def _cached(self, keys):
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._cache.get(key)
+                if entry is None:
+                    continue
+                if self.ttl and now - entry[1] > self.ttl:
+                    del self._cache[key]
+                    continue
+                self._cache.move_to_end(key)
+                found[key] = entry[0]
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def _store(self, ids):
+        if not self.max_size:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for key, entry_id in ids.items():
+                self._cache[key] = (entry_id, now)
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def forget(self, entry_id: Optional[int] = None):
+        """Drop the cached names of ``entry_id`` (renamed or deleted), or everything when None"""
+        with self._lock:
+            if entry_id is None:
+                self._cache.clear()
+                return
+            for key in [key for key, entry in self._cache.items() if entry[0] == entry_id]:
+                del self._cache[key]
+
+    def _upsert(self, cursor, names):
+        """One round trip: (existing {key: id}, inserted {key: id}) for {key: name}"""
+        keys = sorted(names)
+        cursor.execute(f"""
+            WITH input(key, name) AS (SELECT * FROM unnest(%s::text[], %s::text[])),
+            existing AS (
+                SELECT DISTINCT ON (LOWER(t.name)) LOWER(t.name) AS key, t.id
+                FROM {self.table} AS t JOIN input ON LOWER(t.name) = input.key
+                ORDER BY LOWER(t.name), t.id
+            ),
+            inserted AS (
+                INSERT INTO {self.table} (name)
+                SELECT input.name FROM input WHERE input.key NOT IN (SELECT key FROM existing)
+                ON CONFLICT DO NOTHING
+                RETURNING LOWER(name) AS key, id
+            )
+            SELECT key, id, FALSE AS created FROM existing
+            UNION ALL
+            SELECT key, id, TRUE FROM inserted
+        """, (keys, [names[key] for key in keys]))
+        existing = {}
+        inserted = {}
+        for row in cursor.fetchall():
+            (inserted if row['created'] else existing)[row['key']] = row['id']
+        return existing, inserted
+
+    def resolve(self, cursor, names: Iterable[str], created: Optional[dict] = None) -> Dict[str, int]:
+        """Return {lower(name): id} for ``names``, inserting the missing rows on ``cursor``'s transaction.
+
+        ``cursor`` must return dict rows (the application's default). If ``created``
+        is given, it receives {lower(name): id} for the rows inserted by this call.
+        """
+        pending = {}
+        for name in names:
+            if name and name.lower() not in pending:
+                pending[name.lower()] = name
+        ids = self._cached(list(pending))
+        for key in ids:
+            del pending[key]
+
+        for _ in range(MAX_ATTEMPTS):
+            if not pending:
+                break
+            existing, inserted = self._upsert(cursor, pending)
+            self._store(existing)
+            if created is not None:
+                created.update(inserted)
+            for key, entry_id in {**existing, **inserted}.items():
+                ids[key] = entry_id
+                del pending[key]
+        if pending:
+            raise RuntimeError(f"Could not resolve {self.table}: {', '.join(sorted(pending.values()))}")
+        return ids
+
+    def resolve_one(self, cursor, name: str) -> int:
+        return self.resolve(cursor, [name])[name.lower()]
+
+
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+
+def get_resolver(table: str) -> DimensionResolver:
+    """The process-wide resolver for ``table``"""
+    resolver = _resolvers.get(table)
+    if resolver is None:
+        with _resolvers_lock:
+            resolver = _resolvers.get(table)
+            if resolver is None:
+                resolver = _resolvers[table] = DimensionResolver(table)
+    return resolver
+
+
+def link_book(cursor, book_id: int, relation: str, names: Iterable[str], created: Optional[dict] = None) -> Dict[str, int]:
+    """Resolve ``names`` for ``relation`` (authors, categories or languages) and link them to ``book_id``.
+
+    Existing links are left alone. Returns the resolved {lower(name): id}.
+    """
+    junction, column, table = RELATIONS[relation]
+    ids = get_resolver(table).resolve(cursor, names, created)
+    if ids:
+        execute_values(cursor, f"INSERT INTO {junction} (book_id, {column}) VALUES %s ON CONFLICT DO NOTHING",
+                       [(book_id, entry_id) for entry_id in sorted(set(ids.values()))])
+    return ids
@@ -0,0 +1,233 @@
+"""Facet counts for the /books page.
+
+Counts are disjunctive: each facet is counted over the books matching the
+search and every *other* active filter, so its list shows what picking a
+different value (which replaces the current one) would return.
+
+* A facet with no search and no other filter to apply is read from
+  ``book_facet_counts`` (migration 0021), a rollup of the whole catalog
+  refreshed in the background (``Config.FACET_ROLLUP_REFRESH_SECONDS``) once
+  the catalog version has moved on.
+* Otherwise the facet is aggregated over its matching books as long as the
+  set is selective: at most ``Config.FACET_COUNT_MAX_MATCHES`` books, bounded
+  by the page total or the rollup count of each other filter value. Broader
+  sets list the rollup's values without counts, so a page view never
+  aggregates most of the catalog.
+
+``FACET_LIMITS`` caps the values per facet, most frequent first. The rollup
+rows, the total, the aggregated facets and the page (an indexed LIMIT/OFFSET
+query) are read in one statement, see faceted_page_query.
+"""
+import logging
+import threading
+import time
+from config import Config
+from .book_queries import RELATIONS, book_count, book_select, relation_exists
+from .connection import get_db
+
+# facet -> most values returned, None for all
+FACET_LIMITS = {
+    'category': None,
+    'language': None,
+    'author': 20,
+    'decade': None
+}
+
+# facet -> relation in database.book_queries (decades filter publication_year)
+FACET_RELATIONS = {
+    'category': 'categories',
+    'language': 'languages',
+    'author': 'authors'
+}
+
+# Arbitrary key so only one process refreshes the rollup at a time (migrations use 724_001)
+ROLLUP_LOCK_KEY = 724_002
+
+logger = logging.getLogger(__name__)
+
+_rollup_lock = threading.Lock()
+_rollup_refreshing = False
+_rollup_refreshed_at = 0.0
+
+
+def filter_condition(facet, value):
+    """(condition on ``books``, params) for one active /books filter"""
+    relation = FACET_RELATIONS.get(facet)
+    if relation:
+        return relation_exists(relation, f'{relation}.name = %s'), [value]
+    decade = int(value)
+    return "books.publication_year BETWEEN %s AND %s", [decade, decade + 9]
+
+
+def _rollup_query(active):
+    """Rollup rows to show plus those of the active filter values; parameters: the (facet, value) pairs"""
+    clauses = [f"facet = '{facet}'" if limit is None else f"(facet = '{facet}' AND rank <= {limit})"
+               for facet, limit in FACET_LIMITS.items()]
+    clauses.append("facet = '_version'")
+    clauses += ["(facet = %s AND value = %s)"] * len(active)
+    return f"SELECT facet, value, count, rank FROM book_facet_counts WHERE {' OR '.join(clauses)}"
+
+
+def _counts_query(facet, where=(), search=False):
+    """Value counts of ``facet`` among the books matching ``where`` (book_select parameters)"""
+    matched = book_select(where=where, order_by=(), columns=('id', 'publication_year'), relations=(), search=search)
+    limit = FACET_LIMITS[facet]
+    relation = FACET_RELATIONS.get(facet)
+    if relation:
+        junction, column, table = RELATIONS[relation]
+        value, count = f"{table}.name::text", "COUNT(DISTINCT matched.id)"
+        source = f"JOIN {junction} ON {junction}.book_id = matched.id JOIN {table} ON {table}.id = {junction}.{column}"
+    else:
+        value, count = "((matched.publication_year / 10) * 10)::text", "COUNT(*)"
+        source = "WHERE matched.publication_year IS NOT NULL"
+    return (
+        f"(SELECT {value} AS value, {count} AS count FROM ({matched}) AS matched {source} "
+        f"GROUP BY 1 ORDER BY 2 DESC, 1" + (f" LIMIT {limit})" if limit else ")")
+    )
+
+
+def _ordered(facet, entries):
+    """Most frequent first, decades in order"""
+    if facet == 'decade':
+        return sorted(entries, key=lambda entry: int(entry['value']))
+    return sorted(entries, key=lambda entry: (-entry['count'], entry['value']))
+
+
+def faceted_page_query(active, page_query, page_params, tsquery=None):
+    """(query, params) reading a /books page, its total and its facet counts in one statement.
+
+    ``active`` maps facet -> selected value and ``page_query`` is a book_select
+    of the page over the same search and filters. Which facets are aggregated
+    depends on the total and the rollup, so the choice is made in SQL: each
+    aggregate is gated by its bound and only runs when that is small enough.
+    Read the rows with read_faceted_page.
+    """
+    search = bool(tsquery)
+    search_params = [tsquery] if search else []
+    conditions = {facet: filter_condition(facet, value) for facet, value in active.items()}
+    ctes = [
+        ("total", book_count([condition for condition, _ in conditions.values()], search=search),
+         search_params + [param for _, params in conditions.values() for param in params]),
+        ("rollup", _rollup_query(active), [item for pair in active.items() for item in pair]),
+    ]
+
+    # Facets narrowed by the search or another filter: upper bound of the books each is counted over
+    bounds, counts = [], []
+    search_bound = False
+    for facet in FACET_LIMITS:
+        others = {other: condition for other, condition in conditions.items() if other != facet}
+        if not others and not search:
+            continue
+        terms = ["COALESCE((SELECT count FROM rollup WHERE facet = %s AND value = %s), 0)"] * len(others)
+        term_params = [item for other in others for item in (other, active[other])]
+        if facet not in conditions:
+            terms.append("(SELECT count FROM total)")
+        if not terms:
+            terms.append("(SELECT count FROM search_total)")
+            search_bound = True
+        bounds.append((f"SELECT '{facet}' AS facet, LEAST({', '.join(terms)}) AS bound", term_params))
+        counts.append((
+            f"SELECT 'count', '{facet}', value, count, NULL, NULL "
+            f"FROM {_counts_query(facet, [condition for condition, _ in others.values()], search=search)} AS counted "
+            f"WHERE (SELECT bound FROM bounds WHERE facet = '{facet}') <= %s",
+            search_params + [param for _, params in others.values() for param in params]
+            + [Config.FACET_COUNT_MAX_MATCHES]
+        ))
+    if search_bound:
+        ctes.append(("search_total", book_count(search=True), search_params))
+    if bounds:
+        ctes.append(("bounds", " UNION ALL ".join(query for query, _ in bounds),
+                     [param for _, params in bounds for param in params]))
+
+    selects = [
+        ("SELECT 'total'::text AS kind, NULL::text AS facet, NULL::text AS value, count::bigint, "
+         "NULL::bigint AS rank, NULL::json AS books FROM total", []),
+        ("SELECT 'catalog_version', NULL, NULL, version, NULL, NULL FROM catalog_version", []),
+        ("SELECT 'rollup', facet, value, count, rank, NULL FROM rollup", []),
+    ]
+    if bounds:
+        selects.append(("SELECT 'bound', facet, NULL, bound, NULL, NULL FROM bounds", []))
+    selects += counts
+    selects.append((f"SELECT 'books', NULL, NULL, NULL, NULL, "
+                    f"(SELECT COALESCE(json_agg(page), '[]'::json) FROM ({page_query}) AS page)", list(page_params)))
+
+    query = ("WITH " + ", ".join(f"{name} AS ({cte})" for name, cte, _ in ctes) + " "
+             + " UNION ALL ".join(select for select, _ in selects))
+    params = [param for _, _, cte_params in ctes for param in cte_params]
+    params += [param for _, select_params in selects for param in select_params]
+    return query, params
+
+
+def read_faceted_page(rows):
+    """(total, facets, books) from the rows of a faceted_page_query statement.
+
+    ``facets`` is {facet: [{'value', 'count'}]}; ``count`` is None for the values
+    of a facet whose matching set is too broad to aggregate per request.
+    """
+    total, books = 0, []
+    rollup_version = catalog_version = 0
+    rollup = {facet: [] for facet in FACET_LIMITS}
+    counted = {facet: [] for facet in FACET_LIMITS}
+    bounds = {}
+    for row in rows:
+        kind = row['kind']
+        if kind == 'total':
+            total = row['count']
+        elif kind == 'books':
+            books = row['books']
+        elif kind == 'catalog_version':
+            catalog_version = row['count']
+        elif kind == 'bound':
+            bounds[row['facet']] = row['count']
+        elif kind == 'count':
+            counted[row['facet']].append({'value': row['value'], 'count': row['count']})
+        elif row['facet'] == '_version':
+            rollup_version = row['count']
+        else:
+            limit = FACET_LIMITS[row['facet']]
+            if limit is None or row['rank'] <= limit:
+                rollup[row['facet']].append({'value': row['value'], 'count': row['count']})
+    _refresh_rollup_if_stale(rollup_version, catalog_version)
+
+    facets = {}
+    for facet in FACET_LIMITS:
+        if facet not in bounds:
+            facets[facet] = _ordered(facet, rollup[facet])
+        elif bounds[facet] <= Config.FACET_COUNT_MAX_MATCHES:
+            facets[facet] = _ordered(facet, counted[facet])
+        else:
+            facets[facet] = [{'value': entry['value'], 'count': None} for entry in _ordered(facet, rollup[facet])]
+    return total, facets, books
+
+
+def refresh_facet_rollup():
+    """Recompute book_facet_counts, unless another process is already doing it"""
+    with get_db() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (ROLLUP_LOCK_KEY,))
+            if cursor.fetchone()['locked']:
+                cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY book_facet_counts")
+
+
+def _refresh_rollup_if_stale(rollup_version, catalog_version):
+    global _rollup_refreshing
+    if not Config.FACET_ROLLUP_REFRESH_SECONDS or rollup_version >= catalog_version:
+        return
+    with _rollup_lock:
+        if _rollup_refreshing or time.time() - _rollup_refreshed_at < Config.FACET_ROLLUP_REFRESH_SECONDS:
+            return
+        _rollup_refreshing = True
+    threading.Thread(target=_refresh_in_background, name='facet-rollup-refresh', daemon=True).start()
+
+
+def _refresh_in_background():
+    global _rollup_refreshing, _rollup_refreshed_at
+    try:
+        # Outside of a request get_db() uses its own connection, without the page's statement timeout
+        refresh_facet_rollup()
+    except Exception:
+        logger.exception("Error refreshing facet counts")
+    finally:
+        with _rollup_lock:
+            _rollup_refreshing = False
+            _rollup_refreshed_at = time.time()
@@ -0,0 +1,53 @@
+"""Typo-tolerant matching with pg_trgm.
+
+Terms are compared with ``word_similarity`` (how well the term matches the
+best-matching part of a longer title or name) through the ``<%`` operator,
+which the GIN trigram indexes from migration 0009 serve. The cut-off is set
+per transaction with ``SET LOCAL pg_trgm.word_similarity_threshold``.
+
+The SQL fragments are used with query parameters, so ``%`` operators are
+written as ``%%``.
+"""
+from config import Config
+
+
+def match_condition(column):
+    """``term <% column``: the term (one parameter) word-matches ``column`` above the threshold"""
+    return f"%s <%% {column}"
+
+
+def similarity(column):
+    """0..1 score of the term (one parameter) against ``column``, for ordering"""
+    return f"word_similarity(%s, {column})"
+
+
+def apply_threshold(cursor, threshold=None):
+    """Set the word-similarity cut-off for the rest of the current transaction"""
+    if threshold is None:
+        threshold = Config.FUZZY_MATCH_THRESHOLD
+    cursor.execute("SET LOCAL pg_trgm.word_similarity_threshold = %s", (float(threshold),))
+
+
+def did_you_mean(cursor, term, limit=None):
+    """Closest book titles and author names to ``term`` ("did you mean ...?"), best first"""
+    if not term:
+        return []
+    limit = limit or Config.FUZZY_SUGGESTION_LIMIT
+    apply_threshold(cursor, Config.FUZZY_SUGGESTION_THRESHOLD)
+    cursor.execute(f"""
+        SELECT suggestion, MAX(score) AS score FROM (
+            (SELECT title AS suggestion, {similarity('title')} AS score
+             FROM book_summary WHERE {match_condition('title')}
+             ORDER BY score DESC LIMIT %s)
+            UNION ALL
+            (SELECT name AS suggestion, {similarity('name')} AS score
+             FROM authors WHERE {match_condition('name')}
+             ORDER BY score DESC LIMIT %s)
+        ) AS candidates
+        GROUP BY suggestion
+        ORDER BY score DESC, suggestion
+        LIMIT %s
+    """, (term, term, limit, term, term, limit, limit))
+    suggestions = [row['suggestion'] for row in cursor.fetchall()]
+    apply_threshold(cursor)
+    return suggestions
@@ -0,0 +1,138 @@
+"""Per-request SQL instrumentation.
+
+Every statement run through a ``get_db`` cursor is timed and fingerprinted
+(literals and parameters stripped) and the totals are attributed to the
+current Flask endpoint. ``after_request`` exposes them as ``X-Query-Count`` /
+``X-Query-Time-Ms`` headers and writes one structured log line per request.
+"""
+import json
+import logging
+import re
+import time
+from functools import lru_cache
+from flask import g, has_app_context, request
+from psycopg2.errors import QueryCanceled
+from psycopg2.extras import RealDictCursor
+from config import Config
+from .limits import check_query_budget, note_statement_timeout
+from .slow_queries import log_slow_query
+
+logger = logging.getLogger('books_manager.queries')
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    logger.addHandler(logging.StreamHandler())
+    logger.propagate = False
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%\(\w+\)s|%s")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def _fingerprint(query):
+    query = _STRING_RE.sub('?', query)
+    query = _PLACEHOLDER_RE.sub('?', query)
+    query = _NUMBER_RE.sub('?', query)
+    query = _IN_LIST_RE.sub('(?+)', query)
+    return _WHITESPACE_RE.sub(' ', query).strip().rstrip(';')
+
+
+def fingerprint(query):
+    """Normalize a statement so calls differing only in parameters group together"""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    elif not isinstance(query, str):
+        query = str(query)
+    return _fingerprint(query)
+
+
+def record_query(query, duration, rowcount=None):
+    """Attribute one executed statement to the current request"""
+    if not has_app_context():
+        return
+    stats = g.get('_query_stats')
+    if stats is None:
+        stats = g._query_stats = {'count': 0, 'time': 0.0, 'by_fingerprint': {}}
+    stats['count'] += 1
+    stats['time'] += duration
+    entry = stats['by_fingerprint'].setdefault(fingerprint(query), [0, 0.0])
+    entry[0] += 1
+    entry[1] += duration
+
+
+class InstrumentedCursor(RealDictCursor):
+    """RealDictCursor that enforces the query budget and reports every execute to the request's query stats"""
+
+    def execute(self, query, vars=None):
+        check_query_budget()
+        try:
+            if not Config.SQL_INSTRUMENTATION:
+                return super().execute(query, vars)
+            start = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                duration = time.perf_counter() - start
+                record_query(query, duration, self.rowcount)
+                if Config.SLOW_QUERY_MS and duration * 1000 >= Config.SLOW_QUERY_MS:
+                    log_slow_query(self, query, vars, duration, self.rowcount, fingerprint(query))
+        except QueryCanceled:
+            # Recorded with or without instrumentation, so limits turn it into a 504
+            note_statement_timeout()
+            raise
+
+    def executemany(self, query, vars_list):
+        check_query_budget()
+        try:
+            if not Config.SQL_INSTRUMENTATION:
+                return super().executemany(query, vars_list)
+            start = time.perf_counter()
+            try:
+                return super().executemany(query, vars_list)
+            finally:
+                duration = time.perf_counter() - start
+                record_query(query, duration, self.rowcount)
+                if Config.SLOW_QUERY_MS and duration * 1000 >= Config.SLOW_QUERY_MS:
+                    log_slow_query(self, query, None, duration, self.rowcount, fingerprint(query))
+        except QueryCanceled:
+            # Recorded with or without instrumentation, so limits turn it into a 504
+            note_statement_timeout()
+            raise
+
+
+def query_stats():
+    """Totals for the current request: count, time in ms and per-fingerprint breakdown"""
+    stats = g.get('_query_stats') or {'count': 0, 'time': 0.0, 'by_fingerprint': {}}
+    return {
+        'count': stats['count'],
+        'time_ms': round(stats['time'] * 1000, 2),
+        'by_fingerprint': stats['by_fingerprint']
+    }
+
+
+def add_query_headers(response):
+    """after_request hook: expose per-request query totals and log them"""
+    # Streamed bodies run their queries after this hook, so their totals would read 0
+    if not Config.SQL_INSTRUMENTATION or response.is_streamed:
+        return response
+    stats = query_stats()
+    response.headers['X-Query-Count'] = str(stats['count'])
+    response.headers['X-Query-Time-Ms'] = f"{stats['time_ms']:.2f}"
+    if Config.QUERY_LOG_ENABLED and stats['count']:
+        top = sorted(stats['by_fingerprint'].items(), key=lambda item: item[1][1], reverse=True)
+        logger.info(json.dumps({
+            'event': 'request_queries',
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'query_count': stats['count'],
+            'query_time_ms': stats['time_ms'],
+            'top_queries': [
+                {'fingerprint': fp[:200], 'count': count, 'time_ms': round(total * 1000, 2)}
+                for fp, (count, total) in top[:Config.QUERY_LOG_TOP_N]
+            ]
+        }))
+    return response
@@ -0,0 +1,119 @@
+"""Per-endpoint statement timeouts and query budgets.
+
+Limits are declared per route with ``@query_limits(...)`` or per blueprint
+with ``set_blueprint_limits(...)`` and fall back to
+``Config.DEFAULT_STATEMENT_TIMEOUT_MS`` / ``Config.DEFAULT_MAX_QUERIES``.
+The timeout is applied with ``SET LOCAL statement_timeout`` at the start of
+every transaction ``get_db`` opens; the budget caps the number of statements
+a single request may run. Exceeding either turns the response into a clean
+504 (timeout) or 503 (budget) instead of a hung worker or a generic 500.
+"""
+from flask import current_app, g, has_request_context, jsonify, render_template, request
+from psycopg2.errors import QueryCanceled
+from psycopg2.extensions import cursor as PlainCursor
+from config import Config
+
+_blueprint_limits = {}
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a request issues more statements than its query budget allows."""
+
+
+def query_limits(statement_timeout_ms=None, max_queries=None):
+    """Decorator declaring limits for a single view function"""
+    def decorator(view):
+        view._query_limits = {'statement_timeout_ms': statement_timeout_ms, 'max_queries': max_queries}
+        return view
+    return decorator
+
+
+def set_blueprint_limits(blueprint, statement_timeout_ms=None, max_queries=None):
+    """Declare limits for every route of a blueprint (route-level limits take precedence)"""
+    _blueprint_limits[blueprint.name] = {'statement_timeout_ms': statement_timeout_ms, 'max_queries': max_queries}
+
+
+def current_limits():
+    """Effective limits for the current request"""
+    if not has_request_context():
+        return {'statement_timeout_ms': None, 'max_queries': None}
+    limits = g.get('_query_limits')
+    if limits is None:
+        limits = {
+            'statement_timeout_ms': Config.DEFAULT_STATEMENT_TIMEOUT_MS or None,
+            'max_queries': Config.DEFAULT_MAX_QUERIES or None
+        }
+        layers = [_blueprint_limits.get(request.blueprint)]
+        view = current_app.view_functions.get(request.endpoint)
+        layers.append(getattr(view, '_query_limits', None))
+        for layer in layers:
+            for key, value in (layer or {}).items():
+                if value is not None:
+                    limits[key] = value
+        g._query_limits = limits
+    return limits
+
+
+def apply_statement_timeout(conn):
+    """Issue SET LOCAL statement_timeout for the transaction that is about to start"""
+    timeout = current_limits()['statement_timeout_ms']
+    if timeout:
+        # Plain cursor: limit bookkeeping must not count against the query budget
+        with conn.cursor(cursor_factory=PlainCursor) as cursor:
+            cursor.execute("SET LOCAL statement_timeout = %s", (int(timeout),))
+
+
+def check_query_budget():
+    """Count one statement against the request's budget, raising once it is exhausted"""
+    if not has_request_context():
+        return
+    max_queries = current_limits()['max_queries']
+    count = g.get('_budget_used', 0) + 1
+    g._budget_used = count
+    if max_queries and count > max_queries:
+        g._limit_violation = 'query_budget'
+        raise QueryBudgetExceeded(f"Query budget of {max_queries} statements exceeded for {request.endpoint}")
+
+
+def note_statement_timeout():
+    if has_request_context():
+        g._limit_violation = 'statement_timeout'
+
+
+def _limit_response(violation):
+    if violation == 'statement_timeout':
+        status, message = 504, 'The request took too long to complete. Please try again.'
+    else:
+        status, message = 503, 'The request is too expensive to serve right now. Please narrow it down and try again.'
+    if request.path.startswith('/api/') or request.accept_mimetypes.best == 'application/json':
+        response = jsonify({'error': message, 'reason': violation})
+    else:
+        response = current_app.make_response(render_template('503.html', status=status, message=message))
+    response.status_code = status
+    if status == 503:
+        response.headers['Retry-After'] = '5'
+    return response
+
+
+def enforce_limit_response(response):
+    """after_request hook: routes catch database errors themselves, so swap their response for a 503/504"""
+    violation = g.pop('_limit_violation', None)
+    if violation:
+        return _limit_response(violation)
+    return response
+
+
+def handle_statement_timeout(e):
+    g.pop('_limit_violation', None)
+    return _limit_response('statement_timeout')
+
+
+def handle_budget_exceeded(e):
+    g.pop('_limit_violation', None)
+    return _limit_response('query_budget')
+
+
+def init_app(app):
+    app.register_error_handler(QueryCanceled, handle_statement_timeout)
+    app.register_error_handler(QueryBudgetExceeded, handle_budget_exceeded)
+    app.after_request(enforce_limit_response)
@@ -0,0 +1,153 @@
+"""Versioned schema migrations.
+
+Migrations live in ``database/migrations`` as ``NNNN_description.sql`` and are
+applied in version order; applied versions are recorded in
+``schema_migrations``. A file whose first line is ``-- migrate:no-transaction``
+runs statement by statement in autocommit mode, which is required for
+``CREATE INDEX CONCURRENTLY``. Every other file runs in a single transaction
+together with its version record.
+"""
+import os
+import re
+from psycopg2.extras import RealDictCursor
+from .connection import connect
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+NO_TRANSACTION_MARKER = '-- migrate:no-transaction'
+# Arbitrary key so two runners never apply migrations at the same time
+ADVISORY_LOCK_KEY = 724_001
+
+_FILENAME_RE = re.compile(r'^(\d+)_(\w+)\.sql$')
+_CONCURRENT_INDEX_RE = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)',
+    re.IGNORECASE
+)
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    @property
+    def sql(self):
+        with open(self.path, encoding='utf-8') as f:
+            return f.read()
+
+    @property
+    def transactional(self):
+        return not self.sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+    def statements(self):
+        """Split a no-transaction migration into statements (no dollar-quoted bodies allowed)"""
+        lines = [line for line in self.sql.splitlines() if not line.strip().startswith('--')]
+        return [stmt.strip() for stmt in '\n'.join(lines).split(';') if stmt.strip()]
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Return all migration files sorted by version"""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _FILENAME_RE.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Duplicate migration versions in " + directory)
+    return migrations
+
+
+def _ensure_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version integer PRIMARY KEY,
+                name varchar(255) NOT NULL,
+                applied_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+
+def applied_versions(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row['version'] for row in cursor.fetchall()}
+
+
+def _drop_invalid_index(cursor, index_name):
+    """Drop an index left INVALID by an interrupted CREATE INDEX CONCURRENTLY"""
+    cursor.execute("""
+        SELECT 1 FROM pg_index
+        JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+        WHERE pg_class.relname = %s AND NOT pg_index.indisvalid
+    """, (index_name,))
+    if cursor.fetchone():
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+
+
+def _apply(conn, migration):
+    if migration.transactional:
+        conn.autocommit = False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(migration.sql)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (migration.version, migration.name)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+    else:
+        with conn.cursor() as cursor:
+            for statement in migration.statements():
+                index = _CONCURRENT_INDEX_RE.search(statement)
+                if index:
+                    _drop_invalid_index(cursor, index.group(1))
+                cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (migration.version, migration.name)
+            )
+
+
+def pending_migrations(conn=None):
+    """Return migrations not yet recorded in schema_migrations"""
+    own = conn is None
+    conn = conn or connect(cursor_factory=RealDictCursor)
+    try:
+        conn.autocommit = True
+        _ensure_table(conn)
+        done = applied_versions(conn)
+        return [m for m in load_migrations() if m.version not in done]
+    finally:
+        if own:
+            conn.close()
+
+
+def migrate(target=None, log=print):
+    """Apply pending migrations up to and including ``target``; returns the versions applied"""
+    conn = connect(cursor_factory=RealDictCursor)
+    conn.autocommit = True
+    applied = []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+        try:
+            for migration in pending_migrations(conn):
+                if target is not None and migration.version > target:
+                    break
+                log(f"➡️  Applying {migration.version:04d}_{migration.name}")
+                _apply(conn, migration)
+                applied.append(migration.version)
+        finally:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+    finally:
+        conn.close()
+    return applied
@@ -0,0 +1,11 @@
+-- migrate:no-transaction
+-- The junction-table primary keys lead with book_id, so lookups by the
+-- other side (books of an author/category/language) were sequential scans.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_book_authors_author_id ON book_authors (author_id, book_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_book_categories_category_id ON book_categories (category_id, book_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_book_languages_language_id ON book_languages (language_id, book_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_collection_books_book_id ON collection_books (book_id);
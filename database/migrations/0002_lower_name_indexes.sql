@@ -0,0 +1,9 @@
+-- migrate:no-transaction
+-- Expression indexes for the LOWER(name) = %s lookups in add_book, update_book and the
+-- author/category/language routes.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_authors_lower_name ON authors (LOWER(name));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_categories_lower_name ON categories (LOWER(name));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_languages_lower_name ON languages (LOWER(name));
@@ -0,0 +1,6 @@
+-- migrate:no-transaction
+-- Newest-first listings order by created_at.
+-- collections(user_id) needs no index of its own: the UNIQUE (user_id, name)
+-- constraint already provides a btree that leads with user_id.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_books_created_at ON books (created_at);
@@ -0,0 +1,6 @@
+-- migrate:no-transaction
+-- Keyset pagination of /api/books by (title, id) and the publication-year range filter.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_books_title_id ON books (title, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_books_publication_year ON books (publication_year);
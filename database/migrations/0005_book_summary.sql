@@ -0,0 +1,152 @@
+-- Denormalized one-row-per-book read model: book columns plus pre-aggregated
+-- author/category/language arrays and a lowercased search string.
+-- Kept in sync by statement-level triggers on books and the junction tables
+-- and by row-level triggers on renames in the dimension tables.
+
+CREATE TABLE IF NOT EXISTS book_summary (
+    id integer PRIMARY KEY REFERENCES books(id) ON DELETE CASCADE,
+    title character varying(255) NOT NULL,
+    publication_year integer,
+    open_library_id character varying(50),
+    cover_id character varying(50),
+    categories text[] NOT NULL DEFAULT '{}',
+    languages text[] NOT NULL DEFAULT '{}',
+    authors text[] NOT NULL DEFAULT '{}',
+    search_text text NOT NULL DEFAULT '',
+    refreshed_at timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Same keyset orders as books (see 0004)
+CREATE INDEX IF NOT EXISTS idx_book_summary_title_id ON book_summary (title, id);
+CREATE INDEX IF NOT EXISTS idx_book_summary_publication_year ON book_summary (publication_year);
+
+-- Recompute the summary rows of the given books; rows of deleted books are removed.
+-- The arrays match database.book_queries.relation_array.
+CREATE OR REPLACE FUNCTION refresh_book_summaries(book_ids integer[]) RETURNS void AS $$
+BEGIN
+    IF book_ids IS NULL OR cardinality(book_ids) = 0 THEN
+        RETURN;
+    END IF;
+
+    DELETE FROM book_summary
+    WHERE book_summary.id = ANY(book_ids)
+      AND NOT EXISTS (SELECT 1 FROM books WHERE books.id = book_summary.id);
+
+    INSERT INTO book_summary AS s (id, title, publication_year, open_library_id, cover_id,
+                                   categories, languages, authors, search_text, refreshed_at)
+    SELECT books.id, books.title, books.publication_year, books.open_library_id, books.cover_id,
+           agg.categories, agg.languages, agg.authors,
+           LOWER(concat_ws(' ', books.title, array_to_string(agg.authors, ' '), array_to_string(agg.categories, ' '))),
+           CURRENT_TIMESTAMP
+    FROM books
+    CROSS JOIN LATERAL (
+        SELECT
+            ARRAY(SELECT DISTINCT categories.name::text FROM book_categories
+                  JOIN categories ON categories.id = book_categories.category_id
+                  WHERE book_categories.book_id = books.id ORDER BY 1) AS categories,
+            ARRAY(SELECT DISTINCT languages.name::text FROM book_languages
+                  JOIN languages ON languages.id = book_languages.language_id
+                  WHERE book_languages.book_id = books.id ORDER BY 1) AS languages,
+            ARRAY(SELECT DISTINCT authors.name::text FROM book_authors
+                  JOIN authors ON authors.id = book_authors.author_id
+                  WHERE book_authors.book_id = books.id ORDER BY 1) AS authors
+    ) AS agg
+    WHERE books.id = ANY(book_ids)
+    ON CONFLICT (id) DO UPDATE SET
+        title = EXCLUDED.title,
+        publication_year = EXCLUDED.publication_year,
+        open_library_id = EXCLUDED.open_library_id,
+        cover_id = EXCLUDED.cover_id,
+        categories = EXCLUDED.categories,
+        languages = EXCLUDED.languages,
+        authors = EXCLUDED.authors,
+        search_text = EXCLUDED.search_text,
+        refreshed_at = EXCLUDED.refreshed_at;
+END;
+$$ LANGUAGE plpgsql;
+
+-- books: statement level, so a multi-row INSERT/UPDATE refreshes once.
+-- Deletes need no trigger: the foreign key cascades to book_summary.
+CREATE OR REPLACE FUNCTION book_summary_books_trigger() RETURNS trigger AS $$
+BEGIN
+    PERFORM refresh_book_summaries(ARRAY(SELECT id FROM new_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Junction tables: every affected book_id, before and after the change
+CREATE OR REPLACE FUNCTION book_summary_junction_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_book_summaries(ARRAY(SELECT DISTINCT book_id FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_book_summaries(ARRAY(SELECT DISTINCT book_id FROM old_rows));
+    ELSE
+        PERFORM refresh_book_summaries(ARRAY(
+            SELECT book_id FROM old_rows UNION SELECT book_id FROM new_rows
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Dimension renames: every book linked to the renamed author/category/language
+CREATE OR REPLACE FUNCTION book_summary_dimension_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'authors' THEN
+        PERFORM refresh_book_summaries(ARRAY(SELECT book_id FROM book_authors WHERE author_id = NEW.id));
+    ELSIF TG_TABLE_NAME = 'categories' THEN
+        PERFORM refresh_book_summaries(ARRAY(SELECT book_id FROM book_categories WHERE category_id = NEW.id));
+    ELSE
+        PERFORM refresh_book_summaries(ARRAY(SELECT book_id FROM book_languages WHERE language_id = NEW.id));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS book_summary_insert ON books;
+CREATE TRIGGER book_summary_insert AFTER INSERT ON books
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION book_summary_books_trigger();
+
+DROP TRIGGER IF EXISTS book_summary_update ON books;
+CREATE TRIGGER book_summary_update AFTER UPDATE ON books
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION book_summary_books_trigger();
+
+DO $$
+DECLARE
+    junction text;
+BEGIN
+    FOREACH junction IN ARRAY ARRAY['book_authors', 'book_categories', 'book_languages'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS book_summary_insert ON %I', junction);
+        EXECUTE format('CREATE TRIGGER book_summary_insert AFTER INSERT ON %I
+                        REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION book_summary_junction_trigger()', junction);
+        EXECUTE format('DROP TRIGGER IF EXISTS book_summary_update ON %I', junction);
+        EXECUTE format('CREATE TRIGGER book_summary_update AFTER UPDATE ON %I
+                        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION book_summary_junction_trigger()', junction);
+        EXECUTE format('DROP TRIGGER IF EXISTS book_summary_delete ON %I', junction);
+        EXECUTE format('CREATE TRIGGER book_summary_delete AFTER DELETE ON %I
+                        REFERENCING OLD TABLE AS old_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION book_summary_junction_trigger()', junction);
+    END LOOP;
+END;
+$$;
+
+DO $$
+DECLARE
+    dimension text;
+BEGIN
+    FOREACH dimension IN ARRAY ARRAY['authors', 'categories', 'languages'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS book_summary_rename ON %I', dimension);
+        EXECUTE format('CREATE TRIGGER book_summary_rename AFTER UPDATE OF name ON %I
+                        FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+                        EXECUTE FUNCTION book_summary_dimension_trigger()', dimension);
+    END LOOP;
+END;
+$$;
+
+-- Backfill
+SELECT refresh_book_summaries(ARRAY(SELECT id FROM books));
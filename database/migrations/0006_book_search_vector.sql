@@ -0,0 +1,23 @@
+-- Weighted full-text search document on book_summary:
+-- title (A), author names (B), category names (C).
+-- The 'simple' configuration is used because titles span many languages;
+-- prefix matching in the queries (word:*) stands in for stemming.
+
+ALTER TABLE book_summary ADD COLUMN IF NOT EXISTS search_vector tsvector NOT NULL DEFAULT ''::tsvector;
+
+CREATE OR REPLACE FUNCTION book_summary_search_vector_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('simple', array_to_string(NEW.authors, ' ')), 'B') ||
+        setweight(to_tsvector('simple', array_to_string(NEW.categories, ' ')), 'C');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS book_summary_search_vector ON book_summary;
+CREATE TRIGGER book_summary_search_vector BEFORE INSERT OR UPDATE ON book_summary
+    FOR EACH ROW EXECUTE FUNCTION book_summary_search_vector_trigger();
+
+-- Backfill (the trigger computes the vector)
+UPDATE book_summary SET search_vector = ''::tsvector;
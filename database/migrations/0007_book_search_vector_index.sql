@@ -0,0 +1,4 @@
+-- migrate:no-transaction
+-- GIN index for full-text search on book_summary (see 0006).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_book_summary_search_vector ON book_summary USING gin (search_vector);
@@ -0,0 +1,4 @@
+-- Trigram matching for typo-tolerant title and author search (see database/fuzzy.py).
+-- pg_trgm is a trusted extension, so the database owner can create it.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
@@ -0,0 +1,7 @@
+-- migrate:no-transaction
+-- GIN trigram indexes for the word-similarity (<%) and ILIKE '%term%' searches
+-- on book titles and author names.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_book_summary_title_trgm ON book_summary USING gin (title gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_authors_name_trgm ON authors USING gin (name gin_trgm_ops);
@@ -0,0 +1,29 @@
+-- languages.name gets the UNIQUE constraint authors and categories already have, so
+-- the dimension resolver (database/dimensions.py) can insert missing names with
+-- ON CONFLICT DO NOTHING without two concurrent requests creating the same language.
+-- Existing duplicates (same LOWER(name)) are merged into the lowest id first.
+
+CREATE TEMPORARY TABLE language_duplicates ON COMMIT DROP AS
+    SELECT id, keep_id FROM (
+        SELECT id, MIN(id) OVER (PARTITION BY LOWER(name)) AS keep_id FROM languages
+    ) AS ranked
+    WHERE id <> keep_id;
+
+INSERT INTO book_languages (book_id, language_id)
+    SELECT book_languages.book_id, language_duplicates.keep_id
+    FROM book_languages JOIN language_duplicates ON language_duplicates.id = book_languages.language_id
+    ON CONFLICT DO NOTHING;
+
+DELETE FROM book_languages USING language_duplicates
+    WHERE book_languages.language_id = language_duplicates.id;
+
+DELETE FROM languages USING language_duplicates
+    WHERE languages.id = language_duplicates.id;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'languages_name_key') THEN
+        ALTER TABLE languages ADD CONSTRAINT languages_name_key UNIQUE (name);
+    END IF;
+END
+$$;
@@ -0,0 +1,133 @@
+-- Single-round-trip book writes (see database/book_writes.py): duplicate-title
+-- detection, the book insert/update, dimension upserts and junction links in one call.
+
+-- Link a book to the named authors, categories or languages (matched on LOWER(name)),
+-- creating the missing names. With replace_existing, links to names not in the list
+-- are removed. Returns the dimension rows created here as [{"id", "name"}].
+CREATE OR REPLACE FUNCTION link_book_names(p_book_id integer, p_relation text, p_names text[],
+                                           replace_existing boolean) RETURNS jsonb AS $$
+DECLARE
+    dimension_table text;
+    junction_table text;
+    junction_column text;
+    created jsonb;
+    ids integer[];
+BEGIN
+    CASE p_relation
+        WHEN 'authors' THEN
+            dimension_table := 'authors'; junction_table := 'book_authors'; junction_column := 'author_id';
+        WHEN 'categories' THEN
+            dimension_table := 'categories'; junction_table := 'book_categories'; junction_column := 'category_id';
+        WHEN 'languages' THEN
+            dimension_table := 'languages'; junction_table := 'book_languages'; junction_column := 'language_id';
+        ELSE
+            RAISE EXCEPTION 'Unknown book relation: %', p_relation;
+    END CASE;
+
+    -- ON CONFLICT DO NOTHING waits out a concurrent insert of the same name instead of failing
+    EXECUTE format($sql$
+        WITH input AS (
+            SELECT DISTINCT ON (LOWER(n)) n AS name FROM unnest($1) AS n
+            WHERE btrim(n) <> '' ORDER BY LOWER(n)
+        ),
+        inserted AS (
+            INSERT INTO %1$I (name)
+            SELECT input.name FROM input
+            WHERE NOT EXISTS (SELECT 1 FROM %1$I AS t WHERE LOWER(t.name) = LOWER(input.name))
+            ON CONFLICT DO NOTHING
+            RETURNING id, name
+        )
+        SELECT COALESCE(jsonb_agg(jsonb_build_object('id', id, 'name', name) ORDER BY id), '[]'::jsonb) FROM inserted
+    $sql$, dimension_table) INTO created USING p_names;
+
+    -- A new statement, so names committed concurrently since the insert are visible too
+    EXECUTE format($sql$
+        SELECT COALESCE(array_agg(id), '{}') FROM (
+            SELECT DISTINCT ON (LOWER(t.name)) t.id FROM %1$I AS t
+            WHERE LOWER(t.name) IN (SELECT LOWER(n) FROM unnest($1) AS n)
+            ORDER BY LOWER(t.name), t.id
+        ) AS matched
+    $sql$, dimension_table) INTO ids USING p_names;
+
+    IF replace_existing THEN
+        EXECUTE format('DELETE FROM %I WHERE book_id = $1 AND %I <> ALL($2)', junction_table, junction_column)
+            USING p_book_id, ids;
+    END IF;
+    EXECUTE format('INSERT INTO %I (book_id, %I) SELECT $1, unnest($2) ON CONFLICT DO NOTHING',
+                   junction_table, junction_column)
+        USING p_book_id, ids;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Insert (p_book_id NULL) or update a book.
+-- On update, NULL fields are left unchanged and a NULL or empty name list leaves
+-- that relation unchanged; a non-empty list replaces it.
+-- status: 'created', 'updated', 'duplicate' (book_id is the book that already has
+-- the title; nothing was written) or 'not_found'.
+-- created: dimension rows created by this call, {"authors": [...], "categories": [...], "languages": [...]}.
+CREATE OR REPLACE FUNCTION upsert_book(p_book_id integer, p_title text, p_publication_year integer,
+                                       p_open_library_id text, p_cover_id text,
+                                       p_authors text[], p_categories text[], p_languages text[])
+RETURNS TABLE (book_id integer, status text, created jsonb) AS $$
+#variable_conflict use_column
+DECLARE
+    target_id integer := p_book_id;
+    duplicate_id integer;
+    created_names jsonb := '{}'::jsonb;
+BEGIN
+    IF p_book_id IS NULL AND (p_title IS NULL OR btrim(p_title) = '') THEN
+        RAISE EXCEPTION 'Title is required';
+    END IF;
+
+    IF p_book_id IS NOT NULL THEN
+        PERFORM 1 FROM books WHERE books.id = p_book_id FOR UPDATE;
+        IF NOT FOUND THEN
+            RETURN QUERY SELECT p_book_id, 'not_found'::text, '{}'::jsonb;
+            RETURN;
+        END IF;
+    END IF;
+
+    IF p_title IS NOT NULL THEN
+        SELECT books.id INTO duplicate_id FROM books
+        WHERE LOWER(REGEXP_REPLACE(books.title, '\s+', ' ', 'g')) = LOWER(REGEXP_REPLACE(btrim(p_title), '\s+', ' ', 'g'))
+          AND books.id IS DISTINCT FROM p_book_id
+        LIMIT 1;
+        IF duplicate_id IS NOT NULL THEN
+            RETURN QUERY SELECT duplicate_id, 'duplicate'::text, '{}'::jsonb;
+            RETURN;
+        END IF;
+    END IF;
+
+    IF p_book_id IS NULL THEN
+        INSERT INTO books (title, publication_year, open_library_id, cover_id)
+        VALUES (p_title, p_publication_year, p_open_library_id, p_cover_id)
+        RETURNING books.id INTO target_id;
+    ELSIF num_nonnulls(p_title, p_publication_year, p_open_library_id, p_cover_id) > 0 THEN
+        UPDATE books SET
+            title = COALESCE(p_title, books.title),
+            publication_year = COALESCE(p_publication_year, books.publication_year),
+            open_library_id = COALESCE(p_open_library_id, books.open_library_id),
+            cover_id = COALESCE(p_cover_id, books.cover_id)
+        WHERE books.id = p_book_id;
+    END IF;
+
+    IF cardinality(p_languages) > 0 THEN
+        created_names := created_names || jsonb_build_object('languages',
+            link_book_names(target_id, 'languages', p_languages, p_book_id IS NOT NULL));
+    END IF;
+    IF cardinality(p_categories) > 0 THEN
+        created_names := created_names || jsonb_build_object('categories',
+            link_book_names(target_id, 'categories', p_categories, p_book_id IS NOT NULL));
+    END IF;
+    IF cardinality(p_authors) > 0 THEN
+        created_names := created_names || jsonb_build_object('authors',
+            link_book_names(target_id, 'authors', p_authors, p_book_id IS NOT NULL));
+    END IF;
+
+    RETURN QUERY SELECT target_id,
+                        CASE WHEN p_book_id IS NULL THEN 'created' ELSE 'updated' END,
+                        created_names;
+END;
+$$ LANGUAGE plpgsql;
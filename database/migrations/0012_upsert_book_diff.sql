@@ -0,0 +1,174 @@
+-- upsert_book only writes what changed and reports it (see database/book_writes.py):
+-- relation lists are diffed against the current links, so only the added and removed
+-- junction rows are touched, and the books row is updated only if a field differs.
+
+-- Returns {"created": [{"id", "name"}], "added": [names], "removed": [names]}.
+-- Without replace_existing, links to names not in the list are kept.
+CREATE OR REPLACE FUNCTION link_book_names(p_book_id integer, p_relation text, p_names text[],
+                                           replace_existing boolean) RETURNS jsonb AS $$
+DECLARE
+    dimension_table text;
+    junction_table text;
+    junction_column text;
+    created jsonb;
+    wanted_ids integer[];
+    current_ids integer[];
+    to_add integer[];
+    to_remove integer[] := '{}';
+    added_names jsonb := '[]'::jsonb;
+    removed_names jsonb := '[]'::jsonb;
+BEGIN
+    CASE p_relation
+        WHEN 'authors' THEN
+            dimension_table := 'authors'; junction_table := 'book_authors'; junction_column := 'author_id';
+        WHEN 'categories' THEN
+            dimension_table := 'categories'; junction_table := 'book_categories'; junction_column := 'category_id';
+        WHEN 'languages' THEN
+            dimension_table := 'languages'; junction_table := 'book_languages'; junction_column := 'language_id';
+        ELSE
+            RAISE EXCEPTION 'Unknown book relation: %', p_relation;
+    END CASE;
+
+    -- ON CONFLICT DO NOTHING waits out a concurrent insert of the same name instead of failing
+    EXECUTE format($sql$
+        WITH input AS (
+            SELECT DISTINCT ON (LOWER(n)) n AS name FROM unnest($1) AS n
+            WHERE btrim(n) <> '' ORDER BY LOWER(n)
+        ),
+        inserted AS (
+            INSERT INTO %1$I (name)
+            SELECT input.name FROM input
+            WHERE NOT EXISTS (SELECT 1 FROM %1$I AS t WHERE LOWER(t.name) = LOWER(input.name))
+            ON CONFLICT DO NOTHING
+            RETURNING id, name
+        )
+        SELECT COALESCE(jsonb_agg(jsonb_build_object('id', id, 'name', name) ORDER BY id), '[]'::jsonb) FROM inserted
+    $sql$, dimension_table) INTO created USING p_names;
+
+    -- A new statement, so names committed concurrently since the insert are visible too
+    EXECUTE format($sql$
+        SELECT COALESCE(array_agg(id), '{}') FROM (
+            SELECT DISTINCT ON (LOWER(t.name)) t.id FROM %1$I AS t
+            WHERE LOWER(t.name) IN (SELECT LOWER(n) FROM unnest($1) AS n)
+            ORDER BY LOWER(t.name), t.id
+        ) AS matched
+    $sql$, dimension_table) INTO wanted_ids USING p_names;
+
+    EXECUTE format('SELECT COALESCE(array_agg(%I), ''{}'') FROM %I WHERE book_id = $1', junction_column, junction_table)
+        INTO current_ids USING p_book_id;
+
+    to_add := ARRAY(SELECT unnest(wanted_ids) EXCEPT SELECT unnest(current_ids));
+    IF replace_existing THEN
+        to_remove := ARRAY(SELECT unnest(current_ids) EXCEPT SELECT unnest(wanted_ids));
+    END IF;
+
+    IF cardinality(to_remove) > 0 THEN
+        EXECUTE format('DELETE FROM %I WHERE book_id = $1 AND %I = ANY($2)', junction_table, junction_column)
+            USING p_book_id, to_remove;
+        EXECUTE format('SELECT jsonb_agg(name::text ORDER BY name) FROM %I WHERE id = ANY($1)', dimension_table)
+            INTO removed_names USING to_remove;
+    END IF;
+    IF cardinality(to_add) > 0 THEN
+        EXECUTE format('INSERT INTO %I (book_id, %I) SELECT $1, unnest($2) ON CONFLICT DO NOTHING',
+                       junction_table, junction_column)
+            USING p_book_id, to_add;
+        EXECUTE format('SELECT jsonb_agg(name::text ORDER BY name) FROM %I WHERE id = ANY($1)', dimension_table)
+            INTO added_names USING to_add;
+    END IF;
+
+    RETURN jsonb_build_object('created', created, 'added', added_names, 'removed', removed_names);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Insert (p_book_id NULL) or update a book.
+-- On update, NULL fields are left unchanged and a NULL or empty name list leaves
+-- that relation unchanged; a non-empty list replaces it.
+-- status: 'created', 'updated', 'duplicate' (book_id is the book that already has
+-- the title; nothing was written) or 'not_found'.
+-- created: dimension rows created by this call, {"authors": [...], "categories": [...], "languages": [...]}.
+-- changes: {"fields": [changed book columns], "<relation>": {"added": [names], "removed": [names]}}.
+DROP FUNCTION IF EXISTS upsert_book(integer, text, integer, text, text, text[], text[], text[]);
+CREATE FUNCTION upsert_book(p_book_id integer, p_title text, p_publication_year integer,
+                            p_open_library_id text, p_cover_id text,
+                            p_authors text[], p_categories text[], p_languages text[])
+RETURNS TABLE (book_id integer, status text, created jsonb, changes jsonb) AS $$
+#variable_conflict use_column
+DECLARE
+    target_id integer := p_book_id;
+    duplicate_id integer;
+    current_book books%ROWTYPE;
+    changed_fields text[] := '{}';
+    created_names jsonb := '{}'::jsonb;
+    relation_changes jsonb := '{}'::jsonb;
+    linked jsonb;
+    relation text;
+    relation_names text[];
+BEGIN
+    IF p_book_id IS NULL AND (p_title IS NULL OR btrim(p_title) = '') THEN
+        RAISE EXCEPTION 'Title is required';
+    END IF;
+
+    IF p_book_id IS NOT NULL THEN
+        SELECT * INTO current_book FROM books WHERE books.id = p_book_id FOR UPDATE;
+        IF NOT FOUND THEN
+            RETURN QUERY SELECT p_book_id, 'not_found'::text, '{}'::jsonb, '{}'::jsonb;
+            RETURN;
+        END IF;
+    END IF;
+
+    IF p_title IS NOT NULL THEN
+        SELECT books.id INTO duplicate_id FROM books
+        WHERE LOWER(REGEXP_REPLACE(books.title, '\s+', ' ', 'g')) = LOWER(REGEXP_REPLACE(btrim(p_title), '\s+', ' ', 'g'))
+          AND books.id IS DISTINCT FROM p_book_id
+        LIMIT 1;
+        IF duplicate_id IS NOT NULL THEN
+            RETURN QUERY SELECT duplicate_id, 'duplicate'::text, '{}'::jsonb, '{}'::jsonb;
+            RETURN;
+        END IF;
+    END IF;
+
+    IF p_book_id IS NULL THEN
+        INSERT INTO books (title, publication_year, open_library_id, cover_id)
+        VALUES (p_title, p_publication_year, p_open_library_id, p_cover_id)
+        RETURNING books.id INTO target_id;
+    ELSE
+        IF p_title IS NOT NULL AND p_title IS DISTINCT FROM current_book.title THEN
+            changed_fields := changed_fields || 'title'::text;
+        END IF;
+        IF p_publication_year IS NOT NULL AND p_publication_year IS DISTINCT FROM current_book.publication_year THEN
+            changed_fields := changed_fields || 'publication_year'::text;
+        END IF;
+        IF p_open_library_id IS NOT NULL AND p_open_library_id IS DISTINCT FROM current_book.open_library_id THEN
+            changed_fields := changed_fields || 'open_library_id'::text;
+        END IF;
+        IF p_cover_id IS NOT NULL AND p_cover_id IS DISTINCT FROM current_book.cover_id THEN
+            changed_fields := changed_fields || 'cover_id'::text;
+        END IF;
+        IF cardinality(changed_fields) > 0 THEN
+            UPDATE books SET
+                title = COALESCE(p_title, books.title),
+                publication_year = COALESCE(p_publication_year, books.publication_year),
+                open_library_id = COALESCE(p_open_library_id, books.open_library_id),
+                cover_id = COALESCE(p_cover_id, books.cover_id)
+            WHERE books.id = p_book_id;
+        END IF;
+    END IF;
+
+    FOREACH relation IN ARRAY ARRAY['languages', 'categories', 'authors'] LOOP
+        relation_names := CASE relation WHEN 'languages' THEN p_languages
+                                        WHEN 'categories' THEN p_categories
+                                        ELSE p_authors END;
+        IF cardinality(relation_names) > 0 THEN
+            linked := link_book_names(target_id, relation, relation_names, p_book_id IS NOT NULL);
+            created_names := created_names || jsonb_build_object(relation, linked->'created');
+            relation_changes := relation_changes || jsonb_build_object(relation,
+                jsonb_build_object('added', linked->'added', 'removed', linked->'removed'));
+        END IF;
+    END LOOP;
+
+    RETURN QUERY SELECT target_id,
+                        CASE WHEN p_book_id IS NULL THEN 'created' ELSE 'updated' END,
+                        created_names,
+                        jsonb_build_object('fields', to_jsonb(changed_fields)) || relation_changes;
+END;
+$$ LANGUAGE plpgsql;
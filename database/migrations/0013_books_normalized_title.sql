@@ -0,0 +1,41 @@
+-- Stored normalized title: util.normalize_strings semantics (whitespace runs collapsed
+-- to one space, trimmed, lowercased), so duplicate checks are an index probe on
+-- books.normalized_title (unique index in 0014) instead of a regex over every row.
+
+CREATE OR REPLACE FUNCTION normalize_title(title text) RETURNS text AS $$
+    SELECT lower(btrim(regexp_replace(title, '\s+', ' ', 'g')))
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Books whose titles only differ in case or spacing are merged into the lowest id:
+-- their authors, categories, languages and collection entries move over, then the
+-- duplicates are deleted (the foreign keys cascade the rest).
+CREATE TEMPORARY TABLE book_duplicates ON COMMIT DROP AS
+    SELECT id, keep_id FROM (
+        SELECT id, MIN(id) OVER (PARTITION BY normalize_title(title)) AS keep_id FROM books
+    ) AS ranked
+    WHERE id <> keep_id;
+
+INSERT INTO book_authors (book_id, author_id)
+    SELECT book_duplicates.keep_id, book_authors.author_id
+    FROM book_authors JOIN book_duplicates ON book_duplicates.id = book_authors.book_id
+    ON CONFLICT DO NOTHING;
+
+INSERT INTO book_categories (book_id, category_id)
+    SELECT book_duplicates.keep_id, book_categories.category_id
+    FROM book_categories JOIN book_duplicates ON book_duplicates.id = book_categories.book_id
+    ON CONFLICT DO NOTHING;
+
+INSERT INTO book_languages (book_id, language_id)
+    SELECT book_duplicates.keep_id, book_languages.language_id
+    FROM book_languages JOIN book_duplicates ON book_duplicates.id = book_languages.book_id
+    ON CONFLICT DO NOTHING;
+
+INSERT INTO collection_books (collection_id, book_id, added_at)
+    SELECT collection_books.collection_id, book_duplicates.keep_id, collection_books.added_at
+    FROM collection_books JOIN book_duplicates ON book_duplicates.id = collection_books.book_id
+    ON CONFLICT DO NOTHING;
+
+DELETE FROM books USING book_duplicates WHERE books.id = book_duplicates.id;
+
+ALTER TABLE books ADD COLUMN IF NOT EXISTS normalized_title text
+    GENERATED ALWAYS AS (normalize_title(title)) STORED;
@@ -0,0 +1,4 @@
+-- migrate:no-transaction
+-- Unique normalized title: duplicate detection by index probe and ON CONFLICT (normalized_title).
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_books_normalized_title ON books (normalized_title);
@@ -0,0 +1,112 @@
+-- Duplicate detection in upsert_book becomes an index probe on books.normalized_title
+-- (0013/0014): inserts use ON CONFLICT (normalized_title), updates check the index and
+-- report a concurrent duplicate instead of failing. Same signature and results as 0012.
+
+-- Insert (p_book_id NULL) or update a book.
+-- On update, NULL fields are left unchanged and a NULL or empty name list leaves
+-- that relation unchanged; a non-empty list replaces it.
+-- status: 'created', 'updated', 'duplicate' (book_id is the book that already has
+-- the title; nothing was written) or 'not_found'.
+-- created: dimension rows created by this call, {"authors": [...], "categories": [...], "languages": [...]}.
+-- changes: {"fields": [changed book columns], "<relation>": {"added": [names], "removed": [names]}}.
+CREATE OR REPLACE FUNCTION upsert_book(p_book_id integer, p_title text, p_publication_year integer,
+                                       p_open_library_id text, p_cover_id text,
+                                       p_authors text[], p_categories text[], p_languages text[])
+RETURNS TABLE (book_id integer, status text, created jsonb, changes jsonb) AS $$
+#variable_conflict use_column
+DECLARE
+    target_id integer := p_book_id;
+    duplicate_id integer;
+    violated_index text;
+    current_book books%ROWTYPE;
+    changed_fields text[] := '{}';
+    created_names jsonb := '{}'::jsonb;
+    relation_changes jsonb := '{}'::jsonb;
+    linked jsonb;
+    relation text;
+    relation_names text[];
+BEGIN
+    IF p_book_id IS NULL AND (p_title IS NULL OR btrim(p_title) = '') THEN
+        RAISE EXCEPTION 'Title is required';
+    END IF;
+
+    IF p_book_id IS NOT NULL THEN
+        SELECT * INTO current_book FROM books WHERE books.id = p_book_id FOR UPDATE;
+        IF NOT FOUND THEN
+            RETURN QUERY SELECT p_book_id, 'not_found'::text, '{}'::jsonb, '{}'::jsonb;
+            RETURN;
+        END IF;
+    END IF;
+
+    IF p_book_id IS NULL THEN
+        INSERT INTO books (title, publication_year, open_library_id, cover_id)
+        VALUES (p_title, p_publication_year, p_open_library_id, p_cover_id)
+        ON CONFLICT (normalized_title) DO NOTHING
+        RETURNING books.id INTO target_id;
+        IF target_id IS NULL THEN
+            SELECT books.id INTO duplicate_id FROM books WHERE books.normalized_title = normalize_title(p_title);
+            RETURN QUERY SELECT duplicate_id, 'duplicate'::text, '{}'::jsonb, '{}'::jsonb;
+            RETURN;
+        END IF;
+    ELSE
+        IF p_title IS NOT NULL THEN
+            SELECT books.id INTO duplicate_id FROM books
+            WHERE books.normalized_title = normalize_title(p_title) AND books.id <> p_book_id;
+            IF duplicate_id IS NOT NULL THEN
+                RETURN QUERY SELECT duplicate_id, 'duplicate'::text, '{}'::jsonb, '{}'::jsonb;
+                RETURN;
+            END IF;
+        END IF;
+
+        IF p_title IS NOT NULL AND p_title IS DISTINCT FROM current_book.title THEN
+            changed_fields := changed_fields || 'title'::text;
+        END IF;
+        IF p_publication_year IS NOT NULL AND p_publication_year IS DISTINCT FROM current_book.publication_year THEN
+            changed_fields := changed_fields || 'publication_year'::text;
+        END IF;
+        IF p_open_library_id IS NOT NULL AND p_open_library_id IS DISTINCT FROM current_book.open_library_id THEN
+            changed_fields := changed_fields || 'open_library_id'::text;
+        END IF;
+        IF p_cover_id IS NOT NULL AND p_cover_id IS DISTINCT FROM current_book.cover_id THEN
+            changed_fields := changed_fields || 'cover_id'::text;
+        END IF;
+        IF cardinality(changed_fields) > 0 THEN
+            BEGIN
+                UPDATE books SET
+                    title = COALESCE(p_title, books.title),
+                    publication_year = COALESCE(p_publication_year, books.publication_year),
+                    open_library_id = COALESCE(p_open_library_id, books.open_library_id),
+                    cover_id = COALESCE(p_cover_id, books.cover_id)
+                WHERE books.id = p_book_id;
+            EXCEPTION WHEN unique_violation THEN
+                -- A concurrent transaction took the title between the check and the update
+                GET STACKED DIAGNOSTICS violated_index = CONSTRAINT_NAME;
+                IF violated_index <> 'idx_books_normalized_title' THEN
+                    RAISE;
+                END IF;
+                SELECT books.id INTO duplicate_id FROM books
+                WHERE books.normalized_title = normalize_title(p_title) AND books.id <> p_book_id;
+                RETURN QUERY SELECT duplicate_id, 'duplicate'::text, '{}'::jsonb, '{}'::jsonb;
+                RETURN;
+            END;
+        END IF;
+    END IF;
+
+    FOREACH relation IN ARRAY ARRAY['languages', 'categories', 'authors'] LOOP
+        relation_names := CASE relation WHEN 'languages' THEN p_languages
+                                        WHEN 'categories' THEN p_categories
+                                        ELSE p_authors END;
+        IF cardinality(relation_names) > 0 THEN
+            linked := link_book_names(target_id, relation, relation_names, p_book_id IS NOT NULL);
+            created_names := created_names || jsonb_build_object(relation, linked->'created');
+            relation_changes := relation_changes || jsonb_build_object(relation,
+                jsonb_build_object('added', linked->'added', 'removed', linked->'removed'));
+        END IF;
+    END LOOP;
+
+    RETURN QUERY SELECT target_id,
+                        CASE WHEN p_book_id IS NULL THEN 'created' ELSE 'updated' END,
+                        created_names,
+                        jsonb_build_object('fields', to_jsonb(changed_fields)) || relation_changes;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,192 @@
+-- Validators for conditional GETs (see database/conditional.py):
+-- * books.updated_at / authors.updated_at change whenever the row's API representation
+--   can change: its own columns, its junction rows, a rename of a linked
+--   author/category/language, and for authors the title of one of their books;
+-- * catalog_version.version is bumped once by every transaction that writes to the
+--   catalog tables, for the list endpoints.
+
+ALTER TABLE books ADD COLUMN IF NOT EXISTS updated_at timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE authors ADD COLUMN IF NOT EXISTS updated_at timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+-- clock_timestamp(), not now(): two transactions updating the same row one after the
+-- other must not end up with the same value.
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Bump updated_at of rows whose representation changed through another table.
+-- Rows already written by this transaction are skipped: their updated_at was set then
+-- and no client has seen them yet (this keeps bulk inserts from rewriting every new book).
+-- Rows are locked in id order so concurrent touches of overlapping sets cannot deadlock.
+CREATE OR REPLACE FUNCTION touch_updated_at(target regclass, ids integer[]) RETURNS void AS $$
+BEGIN
+    IF ids IS NULL OR cardinality(ids) = 0 THEN
+        RETURN;
+    END IF;
+    EXECUTE format($sql$
+        UPDATE %1$s SET updated_at = clock_timestamp()
+        WHERE id IN (
+            SELECT id FROM %1$s
+            WHERE id = ANY($1) AND xmin <> (txid_current() %% 4294967296)::text::xid
+            ORDER BY id FOR UPDATE
+        )
+    $sql$, target) USING ids;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS set_updated_at ON books;
+CREATE TRIGGER set_updated_at BEFORE UPDATE ON books
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS set_updated_at ON authors;
+CREATE TRIGGER set_updated_at BEFORE UPDATE ON authors
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+-- Junction tables: the affected books, and for book_authors the affected authors
+CREATE OR REPLACE FUNCTION updated_at_junction_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM touch_updated_at('books', ARRAY(SELECT DISTINCT book_id FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM touch_updated_at('books', ARRAY(SELECT DISTINCT book_id FROM old_rows));
+    ELSE
+        PERFORM touch_updated_at('books', ARRAY(SELECT book_id FROM old_rows UNION SELECT book_id FROM new_rows));
+    END IF;
+
+    IF TG_TABLE_NAME = 'book_authors' THEN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM touch_updated_at('authors', ARRAY(SELECT DISTINCT author_id FROM new_rows));
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM touch_updated_at('authors', ARRAY(SELECT DISTINCT author_id FROM old_rows));
+        ELSE
+            PERFORM touch_updated_at('authors', ARRAY(SELECT author_id FROM old_rows UNION SELECT author_id FROM new_rows));
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    junction text;
+BEGIN
+    FOREACH junction IN ARRAY ARRAY['book_authors', 'book_categories', 'book_languages'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS updated_at_insert ON %I', junction);
+        EXECUTE format('CREATE TRIGGER updated_at_insert AFTER INSERT ON %I
+                        REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION updated_at_junction_trigger()', junction);
+        EXECUTE format('DROP TRIGGER IF EXISTS updated_at_update ON %I', junction);
+        EXECUTE format('CREATE TRIGGER updated_at_update AFTER UPDATE ON %I
+                        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION updated_at_junction_trigger()', junction);
+        EXECUTE format('DROP TRIGGER IF EXISTS updated_at_delete ON %I', junction);
+        EXECUTE format('CREATE TRIGGER updated_at_delete AFTER DELETE ON %I
+                        REFERENCING OLD TABLE AS old_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION updated_at_junction_trigger()', junction);
+    END LOOP;
+END;
+$$;
+
+-- Dimension renames: every book linked to the renamed author/category/language
+CREATE OR REPLACE FUNCTION updated_at_dimension_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'authors' THEN
+        PERFORM touch_updated_at('books', ARRAY(SELECT book_id FROM book_authors WHERE author_id = NEW.id));
+    ELSIF TG_TABLE_NAME = 'categories' THEN
+        PERFORM touch_updated_at('books', ARRAY(SELECT book_id FROM book_categories WHERE category_id = NEW.id));
+    ELSE
+        PERFORM touch_updated_at('books', ARRAY(SELECT book_id FROM book_languages WHERE language_id = NEW.id));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    dimension text;
+BEGIN
+    FOREACH dimension IN ARRAY ARRAY['authors', 'categories', 'languages'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS updated_at_rename ON %I', dimension);
+        EXECUTE format('CREATE TRIGGER updated_at_rename AFTER UPDATE OF name ON %I
+                        FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+                        EXECUTE FUNCTION updated_at_dimension_trigger()', dimension);
+    END LOOP;
+END;
+$$;
+
+-- Book retitles: the book's authors (their representation lists the titles)
+CREATE OR REPLACE FUNCTION updated_at_book_title_trigger() RETURNS trigger AS $$
+BEGIN
+    PERFORM touch_updated_at('authors', ARRAY(
+        SELECT DISTINCT book_authors.author_id
+        FROM new_rows JOIN old_rows ON old_rows.id = new_rows.id
+        JOIN book_authors ON book_authors.book_id = new_rows.id
+        WHERE new_rows.title IS DISTINCT FROM old_rows.title
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS updated_at_title ON books;
+CREATE TRIGGER updated_at_title AFTER UPDATE ON books
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION updated_at_book_title_trigger();
+
+-- Touching books.updated_at must not refresh book_summary a second time: the summary
+-- update trigger from 0005 now only refreshes rows whose summarized columns changed.
+CREATE OR REPLACE FUNCTION book_summary_books_update_trigger() RETURNS trigger AS $$
+BEGIN
+    PERFORM refresh_book_summaries(ARRAY(
+        SELECT new_rows.id FROM new_rows JOIN old_rows ON old_rows.id = new_rows.id
+        WHERE (new_rows.title, new_rows.publication_year, new_rows.open_library_id, new_rows.cover_id)
+              IS DISTINCT FROM (old_rows.title, old_rows.publication_year, old_rows.open_library_id, old_rows.cover_id)
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS book_summary_update ON books;
+CREATE TRIGGER book_summary_update AFTER UPDATE ON books
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION book_summary_books_update_trigger();
+
+-- Catalog-wide version, a single row so the bump commits (or rolls back) with the data
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id boolean PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version bigint NOT NULL DEFAULT 1,
+    updated_at timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO catalog_version DEFAULT VALUES ON CONFLICT DO NOTHING;
+
+-- Deferred to commit time, so the row lock is taken last and held only while the
+-- transaction commits; a statement-level trigger would hold it from the first write on
+-- and deadlock against row locks taken later. Constraint triggers are row level, so
+-- the first row of the transaction does the bump and the rest return early.
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('catalog.version_bumped', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM set_config('catalog.version_bumped', 'on', true);
+    UPDATE catalog_version SET version = version + 1, updated_at = clock_timestamp();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    catalog_table text;
+BEGIN
+    FOREACH catalog_table IN ARRAY ARRAY['books', 'authors', 'categories', 'languages',
+                                         'book_authors', 'book_categories', 'book_languages'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS catalog_version_bump ON %I', catalog_table);
+        EXECUTE format('CREATE CONSTRAINT TRIGGER catalog_version_bump
+                        AFTER INSERT OR UPDATE OR DELETE ON %I
+                        DEFERRABLE INITIALLY DEFERRED
+                        FOR EACH ROW EXECUTE FUNCTION bump_catalog_version()', catalog_table);
+    END LOOP;
+END;
+$$;
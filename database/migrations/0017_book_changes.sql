@@ -0,0 +1,49 @@
+-- Change log behind GET /api/books/changes: one row per written book, 'upsert' or
+-- 'delete'. Junction changes and renames of linked authors/categories/languages
+-- update books.updated_at (migration 0016), so triggers on books alone see every
+-- change to a book's representation.
+--
+-- Rows are read in (txid, id) order and only once txid is older than every running
+-- transaction, so a reader never skips a change that commits after a later one.
+
+CREATE TABLE IF NOT EXISTS book_changes (
+    id bigserial PRIMARY KEY,
+    txid bigint NOT NULL DEFAULT txid_current(),
+    book_id integer NOT NULL,
+    op text NOT NULL CHECK (op IN ('upsert', 'delete')),
+    changed_at timestamp with time zone NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE INDEX IF NOT EXISTS idx_book_changes_txid_id ON book_changes (txid, id);
+
+CREATE OR REPLACE FUNCTION book_changes_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO book_changes (book_id, op) SELECT id, 'delete' FROM old_rows ORDER BY id;
+    ELSE
+        INSERT INTO book_changes (book_id, op) SELECT id, 'upsert' FROM new_rows ORDER BY id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS book_changes_insert ON books;
+CREATE TRIGGER book_changes_insert AFTER INSERT ON books
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION book_changes_trigger();
+
+DROP TRIGGER IF EXISTS book_changes_update ON books;
+CREATE TRIGGER book_changes_update AFTER UPDATE ON books
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION book_changes_trigger();
+
+DROP TRIGGER IF EXISTS book_changes_delete ON books;
+CREATE TRIGGER book_changes_delete AFTER DELETE ON books
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION book_changes_trigger();
+
+-- Backfill, so a client can build its copy of the catalog from the feed alone
+INSERT INTO book_changes (book_id, op)
+    SELECT id, 'upsert' FROM books
+    WHERE NOT EXISTS (SELECT 1 FROM book_changes)
+    ORDER BY id;
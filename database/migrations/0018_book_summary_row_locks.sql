@@ -0,0 +1,54 @@
+-- refresh_book_summaries (0005) locks the books it recomputes before reading them,
+-- so concurrent writers to the same book's relations refresh one after the other and
+-- the last refresh always sees every committed change.
+
+CREATE OR REPLACE FUNCTION refresh_book_summaries(book_ids integer[]) RETURNS void AS $$
+BEGIN
+    IF book_ids IS NULL OR cardinality(book_ids) = 0 THEN
+        RETURN;
+    END IF;
+
+    -- Serialize refreshes of the same book. Without the lock, two transactions changing
+    -- different relations of a book at once each aggregate from a snapshot without the
+    -- other's change, and the second upsert writes stale arrays. The next statement runs
+    -- with a fresh snapshot, so a writer that waited here sees the first one's commit.
+    -- FOR NO KEY UPDATE does not conflict with the FOR KEY SHARE locks that junction
+    -- inserts take on books; id order keeps overlapping refreshes from deadlocking.
+    PERFORM 1 FROM books WHERE books.id = ANY(book_ids) ORDER BY books.id FOR NO KEY UPDATE;
+
+    DELETE FROM book_summary
+    WHERE book_summary.id = ANY(book_ids)
+      AND NOT EXISTS (SELECT 1 FROM books WHERE books.id = book_summary.id);
+
+    INSERT INTO book_summary AS s (id, title, publication_year, open_library_id, cover_id,
+                                   categories, languages, authors, search_text, refreshed_at)
+    SELECT books.id, books.title, books.publication_year, books.open_library_id, books.cover_id,
+           agg.categories, agg.languages, agg.authors,
+           LOWER(concat_ws(' ', books.title, array_to_string(agg.authors, ' '), array_to_string(agg.categories, ' '))),
+           CURRENT_TIMESTAMP
+    FROM books
+    CROSS JOIN LATERAL (
+        SELECT
+            ARRAY(SELECT DISTINCT categories.name::text FROM book_categories
+                  JOIN categories ON categories.id = book_categories.category_id
+                  WHERE book_categories.book_id = books.id ORDER BY 1) AS categories,
+            ARRAY(SELECT DISTINCT languages.name::text FROM book_languages
+                  JOIN languages ON languages.id = book_languages.language_id
+                  WHERE book_languages.book_id = books.id ORDER BY 1) AS languages,
+            ARRAY(SELECT DISTINCT authors.name::text FROM book_authors
+                  JOIN authors ON authors.id = book_authors.author_id
+                  WHERE book_authors.book_id = books.id ORDER BY 1) AS authors
+    ) AS agg
+    WHERE books.id = ANY(book_ids)
+    ON CONFLICT (id) DO UPDATE SET
+        title = EXCLUDED.title,
+        publication_year = EXCLUDED.publication_year,
+        open_library_id = EXCLUDED.open_library_id,
+        cover_id = EXCLUDED.cover_id,
+        categories = EXCLUDED.categories,
+        languages = EXCLUDED.languages,
+        authors = EXCLUDED.authors,
+        search_text = EXCLUDED.search_text,
+        refreshed_at = EXCLUDED.refreshed_at;
+END;
+$$ LANGUAGE plpgsql;
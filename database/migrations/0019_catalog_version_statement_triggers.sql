@@ -0,0 +1,89 @@
+-- catalog_version (0016) was bumped by a deferred row-level constraint trigger on every
+-- catalog table, so a 10k-book bulk insert queued tens of thousands of deferred events
+-- to bump one counter. Now a statement-level trigger notes the first write of each
+-- transaction by queueing one row in catalog_version_bumps, and only that row carries
+-- the deferred trigger: one deferred event per transaction, however much it writes.
+
+CREATE TABLE IF NOT EXISTS catalog_version_bumps (
+    txid bigint PRIMARY KEY DEFAULT txid_current()
+);
+
+-- Deferred to commit time, so the catalog_version row lock is taken last and held only
+-- while the transaction commits (see 0016).
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = clock_timestamp();
+    DELETE FROM catalog_version_bumps WHERE txid = NEW.txid;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS catalog_version_bump ON catalog_version_bumps;
+CREATE CONSTRAINT TRIGGER catalog_version_bump
+    AFTER INSERT ON catalog_version_bumps
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION bump_catalog_version();
+
+-- Statements that changed no rows do not count. The flag is transaction-local and
+-- rolls back with a savepoint, together with the queued row.
+CREATE OR REPLACE FUNCTION note_catalog_write() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('catalog.version_bumped', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        PERFORM 1 FROM old_rows LIMIT 1;
+    ELSE
+        PERFORM 1 FROM new_rows LIMIT 1;
+    END IF;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    PERFORM set_config('catalog.version_bumped', 'on', true);
+    INSERT INTO catalog_version_bumps DEFAULT VALUES;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow one event per trigger, hence three triggers per table
+DO $$
+DECLARE
+    catalog_table text;
+BEGIN
+    FOREACH catalog_table IN ARRAY ARRAY['books', 'authors', 'categories', 'languages',
+                                         'book_authors', 'book_categories', 'book_languages'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS catalog_version_bump ON %I', catalog_table);
+        EXECUTE format('DROP TRIGGER IF EXISTS catalog_version_insert ON %I', catalog_table);
+        EXECUTE format('CREATE TRIGGER catalog_version_insert AFTER INSERT ON %I
+                        REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION note_catalog_write()', catalog_table);
+        EXECUTE format('DROP TRIGGER IF EXISTS catalog_version_update ON %I', catalog_table);
+        EXECUTE format('CREATE TRIGGER catalog_version_update AFTER UPDATE ON %I
+                        REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION note_catalog_write()', catalog_table);
+        EXECUTE format('DROP TRIGGER IF EXISTS catalog_version_delete ON %I', catalog_table);
+        EXECUTE format('CREATE TRIGGER catalog_version_delete AFTER DELETE ON %I
+                        REFERENCING OLD TABLE AS old_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION note_catalog_write()', catalog_table);
+    END LOOP;
+END;
+$$;
+
+-- touch_updated_at (0016) took FOR UPDATE row locks, which conflict with the FOR KEY SHARE
+-- locks that concurrent junction inserts hold on the same books and could deadlock;
+-- FOR NO KEY UPDATE is all an updated_at write needs.
+CREATE OR REPLACE FUNCTION touch_updated_at(target regclass, ids integer[]) RETURNS void AS $$
+BEGIN
+    IF ids IS NULL OR cardinality(ids) = 0 THEN
+        RETURN;
+    END IF;
+    EXECUTE format($sql$
+        UPDATE %1$s SET updated_at = clock_timestamp()
+        WHERE id IN (
+            SELECT id FROM %1$s
+            WHERE id = ANY($1) AND xmin <> (txid_current() %% 4294967296)::text::xid
+            ORDER BY id FOR NO KEY UPDATE
+        )
+    $sql$, target) USING ids;
+END;
+$$ LANGUAGE plpgsql;
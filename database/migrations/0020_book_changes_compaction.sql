@@ -0,0 +1,33 @@
+-- Keep book_changes (0017) compact: one row per book, its latest upsert or tombstone.
+-- Every write replaces the book's previous entry, so a client syncing from the start
+-- reads one entry per book however many times the books were written (an author rename
+-- touching thousands of books no longer grows the log by thousands of rows each time).
+--
+-- Dropping an entry is safe for every cursor: entries are served only once their txid
+-- is older than every running transaction, so the replacing entry, written with the
+-- writer's own txid, sorts after every position a reader has been given. A reader who
+-- had not reached the old entry gets the new one instead. Both commit atomically, and the books rows are locked by the statement that fired the
+-- trigger, so two writers never compact the same book at once.
+
+CREATE INDEX IF NOT EXISTS idx_book_changes_book_id ON book_changes (book_id);
+
+CREATE OR REPLACE FUNCTION book_changes_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM book_changes WHERE book_id IN (SELECT id FROM old_rows);
+        INSERT INTO book_changes (book_id, op) SELECT id, 'delete' FROM old_rows ORDER BY id;
+    ELSE
+        DELETE FROM book_changes WHERE book_id IN (SELECT id FROM new_rows);
+        INSERT INTO book_changes (book_id, op) SELECT id, 'upsert' FROM new_rows ORDER BY id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Compact the history written so far
+DELETE FROM book_changes
+WHERE EXISTS (
+    SELECT 1 FROM book_changes AS newer
+    WHERE newer.book_id = book_changes.book_id
+      AND (newer.txid, newer.id) > (book_changes.txid, book_changes.id)
+);
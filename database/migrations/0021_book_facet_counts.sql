@@ -0,0 +1,35 @@
+-- Rollup of the /books facet counts over the whole catalog (database/facets.py).
+-- Unfiltered counts, and the counts of a facet whose own filter is the only one
+-- active, are read from here instead of aggregating every book on each page view.
+-- Refreshed concurrently, at most every FACET_ROLLUP_REFRESH_SECONDS, once the
+-- catalog version has moved past the one recorded in the '_version' row.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS book_facet_counts AS
+WITH counts AS (
+    SELECT 'category' AS facet, categories.name::text AS value, COUNT(DISTINCT book_categories.book_id) AS count
+    FROM book_categories JOIN categories ON categories.id = book_categories.category_id
+    GROUP BY categories.name
+    UNION ALL
+    SELECT 'language', languages.name::text, COUNT(DISTINCT book_languages.book_id)
+    FROM book_languages JOIN languages ON languages.id = book_languages.language_id
+    GROUP BY languages.name
+    UNION ALL
+    SELECT 'author', authors.name::text, COUNT(DISTINCT book_authors.book_id)
+    FROM book_authors JOIN authors ON authors.id = book_authors.author_id
+    GROUP BY authors.name
+    UNION ALL
+    SELECT 'decade', ((books.publication_year / 10) * 10)::text, COUNT(*)
+    FROM books WHERE books.publication_year IS NOT NULL
+    GROUP BY 2
+)
+SELECT facet, value, count, row_number() OVER (PARTITION BY facet ORDER BY count DESC, value) AS rank
+FROM counts
+UNION ALL
+-- Catalog version the counts were computed at (same snapshot)
+SELECT '_version', '', catalog_version.version, 1 FROM catalog_version;
+
+-- Unique index: required by REFRESH MATERIALIZED VIEW CONCURRENTLY, and the lookup of
+-- the active filter values
+CREATE UNIQUE INDEX IF NOT EXISTS idx_book_facet_counts_facet_value ON book_facet_counts (facet, value);
+-- Most frequent values first, for facets with a limit (authors)
+CREATE INDEX IF NOT EXISTS idx_book_facet_counts_facet_rank ON book_facet_counts (facet, rank);
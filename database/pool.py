@@ -0,0 +1,159 @@
+import threading
+import time
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the pool timeout."""
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers when it was opened and last returned to the pool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+
+
+class ConnectionPool:
+    """Thread-safe bounded connection pool.
+
+    Connections are health-checked on checkout, retired once they exceed
+    ``max_lifetime`` seconds and reaped after ``max_idle`` seconds in the pool
+    (never below ``min_size``).
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, max_lifetime=1800,
+                 max_idle=300, timeout=30, health_check_interval=30):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = []  # LIFO stack so hot connections are reused first
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        for _ in range(min_size):
+            conn = self._open()
+            self._idle.append(conn)
+
+    def _open(self):
+        conn = self._connect(connection_factory=PooledConnection)
+        self._size += 1
+        return conn
+
+    def _discard(self, conn):
+        self._size -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn, now):
+        return self.max_lifetime and now - conn.created_at > self.max_lifetime
+
+    def _healthy(self, conn, now):
+        if conn.closed:
+            return False
+        if now - conn.last_used_at < self.health_check_interval:
+            return True
+        try:
+            # Plain cursor: the connection's factory may count queries against the request's budget
+            with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _reap_idle(self, now):
+        """Close idle connections past max_idle, keeping at least min_size open."""
+        if not self.max_idle:
+            return
+        keep = []
+        # Oldest idle connections sit at the bottom of the stack
+        for conn in self._idle:
+            if self._size > self.min_size and now - conn.last_used_at > self.max_idle:
+                self._discard(conn)
+            else:
+                keep.append(conn)
+        self._idle = keep
+
+    def _checkout(self, deadline):
+        """Pop an unexpired idle connection, or reserve a slot for a new one (returns None)."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                now = time.monotonic()
+                self._reap_idle(now)
+                while self._idle:
+                    conn = self._idle.pop()
+                    if self._expired(conn, now):
+                        self._discard(conn)
+                        continue
+                    return conn
+                if self._size < self.max_size:
+                    # Reserve the slot while connecting outside the lock
+                    self._size += 1
+                    return None
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection")
+                self._cond.wait(remaining)
+
+    def getconn(self):
+        """Check a healthy connection out of the pool, opening one if below max_size."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn = self._checkout(deadline)
+            if conn is None:
+                break
+            # The health check round trip runs outside the lock so it never blocks other checkouts
+            if self._healthy(conn, time.monotonic()):
+                return conn
+            with self._cond:
+                self._discard(conn)
+                self._cond.notify()
+        try:
+            conn = self._connect(connection_factory=PooledConnection)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, discarding it if broken, expired or mid-transaction."""
+        with self._cond:
+            now = time.monotonic()
+            if (discard or self._closed or conn.closed
+                    or conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+                    or self._expired(conn, now)):
+                self._discard(conn)
+            else:
+                conn.last_used_at = now
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            for conn in self._idle:
+                self._discard(conn)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {'size': self._size, 'idle': len(self._idle), 'max_size': self.max_size}
@@ -0,0 +1,111 @@
+import itertools
+import logging
+import threading
+import time
+import psycopg2
+import psycopg2.extensions
+from .pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind the primary; 0 when it has replayed everything it received
+LAG_QUERY = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag
+"""
+
+
+class Replica:
+    """A read replica with its own pool and lag-based ejection state."""
+
+    def __init__(self, dsn, pool_options):
+        self.dsn = dsn
+        # Connect lazily so an unreachable replica is ejected on first use instead of failing startup
+        self.pool = ConnectionPool(self._connect, **{**pool_options, 'min_size': 0})
+        self.ejected_until = 0.0
+        self.lag_checked_at = 0.0
+        self.lag = None
+
+    def _connect(self, **kwargs):
+        return psycopg2.connect(self.dsn, options='-c default_transaction_read_only=on', **kwargs)
+
+    def __repr__(self):
+        return f"<Replica {self.dsn.split('@')[-1]}>"
+
+
+class ReplicaSet:
+    """Round-robin over read replicas, ejecting any that lag more than max_lag seconds."""
+
+    def __init__(self, dsns, pool_options, max_lag=5, check_interval=5, eject_for=30):
+        self.replicas = [Replica(dsn, pool_options) for dsn in dsns]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.eject_for = eject_for
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def _eject(self, replica, reason):
+        replica.ejected_until = time.monotonic() + self.eject_for
+        logger.warning(f"Ejecting {replica} for {self.eject_for}s: {reason}")
+
+    def _check_lag(self, replica, conn):
+        """Measure replication lag at most every check_interval seconds; False if too far behind."""
+        now = time.monotonic()
+        if now - replica.lag_checked_at < self.check_interval:
+            return True
+        replica.lag_checked_at = now
+        # Plain cursor, so the probe is not counted against the request's query budget
+        with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cursor:
+            cursor.execute(LAG_QUERY)
+            lag = cursor.fetchone()[0]
+        conn.rollback()
+        replica.lag = float(lag)
+        if replica.lag > self.max_lag:
+            self._eject(replica, f"replication lag {replica.lag:.1f}s > {self.max_lag}s")
+            return False
+        return True
+
+    def getconn(self):
+        """Return (conn, release) from the next healthy replica, or None if all are ejected."""
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = self.replicas[next(self._counter) % len(self.replicas)]
+            if replica.ejected_until > time.monotonic():
+                continue
+            conn = None
+            try:
+                conn = replica.pool.getconn()
+                if not self._check_lag(replica, conn):
+                    replica.pool.putconn(conn)
+                    continue
+            except Exception as e:
+                if conn is not None:
+                    replica.pool.putconn(conn, discard=True)
+                self._eject(replica, e)
+                continue
+
+            def release(c, broken=False, pool=replica.pool):
+                pool.putconn(c, discard=broken)
+            return conn, release
+        return None
+
+    def closeall(self):
+        for replica in self.replicas:
+            replica.pool.closeall()
+
+    def stats(self):
+        now = time.monotonic()
+        return [
+            {
+                'replica': repr(replica),
+                'lag': replica.lag,
+                'ejected': replica.ejected_until > now,
+                **replica.pool.stats()
+            }
+            for replica in self.replicas
+        ]
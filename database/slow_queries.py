@@ -0,0 +1,141 @@
+"""Slow-query log with sampled EXPLAIN capture.
+
+Statements slower than ``Config.SLOW_QUERY_MS`` are written as JSON lines to a
+rotating file. A sampled fraction of slow SELECTs is re-planned with
+``EXPLAIN (FORMAT JSON)`` on a side connection by a background worker so the
+request that hit the slow query is not delayed further.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from flask import has_request_context, request
+from config import Config
+
+_EXPLAINABLE_RE = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+_logger = None
+_logger_lock = threading.Lock()
+_explain_queue = queue.Queue(maxsize=100)
+_worker = None
+
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                log_dir = os.path.dirname(Config.SLOW_QUERY_LOG_FILE)
+                if log_dir:
+                    os.makedirs(log_dir, exist_ok=True)
+                handler = RotatingFileHandler(
+                    Config.SLOW_QUERY_LOG_FILE,
+                    maxBytes=Config.SLOW_QUERY_LOG_MAX_BYTES,
+                    backupCount=Config.SLOW_QUERY_LOG_BACKUPS,
+                    encoding='utf-8'
+                )
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                logger = logging.getLogger('books_manager.slow_queries')
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.addHandler(handler)
+                _logger = logger
+    return _logger
+
+
+def _write(entry):
+    _get_logger().info(json.dumps(entry, default=str))
+
+
+def _explain(sql):
+    # Imported here: connection imports instrumentation, which imports this module
+    from .connection import connect
+    conn = connect()
+    try:
+        conn.set_session(readonly=True)
+        with conn.cursor() as cursor:
+            cursor.execute("SET statement_timeout = %s", (Config.SLOW_QUERY_EXPLAIN_TIMEOUT_MS,))
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql)
+            return cursor.fetchone()[0]
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def _explain_worker():
+    while True:
+        entry, sql = _explain_queue.get()
+        try:
+            entry['plan'] = _explain(sql)
+        except Exception as e:
+            entry['plan_error'] = str(e)
+        try:
+            _write(entry)
+        except Exception as e:
+            print(f"Error writing slow query log: {e}")
+        finally:
+            _explain_queue.task_done()
+
+
+def _queue_explain(entry, sql):
+    global _worker
+    if _worker is None:
+        with _logger_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_explain_worker, name='slow-query-explain', daemon=True)
+                _worker.start()
+    try:
+        _explain_queue.put_nowait((entry, sql))
+        return True
+    except queue.Full:
+        return False
+
+
+def log_slow_query(cursor, query, vars, duration, rowcount, fingerprint):
+    """Record a statement that exceeded the slow-query threshold"""
+    entry = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'fingerprint': fingerprint,
+        'endpoint': request.endpoint if has_request_context() else None,
+        'path': request.path if has_request_context() else None,
+        'duration_ms': round(duration * 1000, 2),
+        'rowcount': rowcount
+    }
+    try:
+        if (_EXPLAINABLE_RE.match(fingerprint) and not cursor.name
+                and random.random() < Config.SLOW_QUERY_EXPLAIN_SAMPLE_RATE):
+            sql = cursor.mogrify(query, vars).decode('utf-8', 'replace')
+            if _queue_explain(entry, sql):
+                return
+        _write(entry)
+    except Exception as e:
+        print(f"Error writing slow query log: {e}")
+
+
+def read_slow_queries(limit=100):
+    """Return the most recent slow-query entries (newest first) from the log and its backups"""
+    entries = []
+    paths = [Config.SLOW_QUERY_LOG_FILE] + [
+        f"{Config.SLOW_QUERY_LOG_FILE}.{i}" for i in range(1, Config.SLOW_QUERY_LOG_BACKUPS + 1)
+    ]
+    for path in paths:
+        if len(entries) >= limit or not os.path.exists(path):
+            break
+        with open(path, encoding='utf-8') as f:
+            lines = f.readlines()
+        for line in reversed(lines):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('plan') is not None:
+                entry['plan_text'] = json.dumps(entry['plan'], indent=2)
+            entries.append(entry)
+            if len(entries) >= limit:
+                break
+    return entries
@@ -1,8 +1,12 @@
 from flask import Flask, render_template, url_for, redirect, jsonify, request, session, flash
-from routes import books_api, categories_api, authors_api, users_api, collections_api, languages_api
+from routes import books_api, categories_api, authors_api, users_api, collections_api, languages_api, suggest_api
 from routes.frontend_api import frontend_api
 from routes.auth import auth, get_current_user, is_logged_in, login_required, admin_required, is_admin, can_edit_collection
-from database import get_db
+from database import get_db, init_app as init_db, query_limits
+from database.book_queries import SEARCH_ORDER, book_count, book_select, relation_exists, search_tsquery
+from database.facets import faceted_page_query, filter_condition, read_faceted_page
+from database.fuzzy import apply_threshold, did_you_mean, match_condition, similarity
+from database.slow_queries import read_slow_queries
 import requests
 from datetime import datetime
 import random
@@ -16,6 +20,9 @@ app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HT
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
+# Request-scoped database connection
+init_db(app)
+
 # Register blueprints
 app.register_blueprint(books_api)
 app.register_blueprint(categories_api)
@@ -23,6 +30,7 @@ app.register_blueprint(languages_api)
 app.register_blueprint(collections_api)
 app.register_blueprint(users_api)
 app.register_blueprint(authors_api)
+app.register_blueprint(suggest_api)
 app.register_blueprint(frontend_api)
 app.register_blueprint(auth)
 
@@ -39,35 +47,9 @@ def inject_auth():
 def get_books_data():
     """Fetch books data from the database"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
-                cursor.execute("""SELECT 
-                               books.id,
-                               books.title,
-                               books.publication_year,
-                               books.open_library_id,
-                               books.cover_id,
-                               COALESCE(
-                                   ARRAY_AGG(DISTINCT categories.name) FILTER (WHERE categories.name IS NOT NULL), 
-                                   ARRAY[]::text[]
-                               ) AS categories,
-                               COALESCE(
-                                   ARRAY_AGG(DISTINCT languages.name) FILTER (WHERE languages.name IS NOT NULL), 
-                                   ARRAY[]::text[]
-                               ) AS languages,
-                               COALESCE(
-                                   ARRAY_AGG(DISTINCT authors.name) FILTER (WHERE authors.name IS NOT NULL), 
-                                   ARRAY[]::text[]
-                               ) AS authors
-                               FROM books
-                               LEFT JOIN book_languages ON books.id = book_languages.book_id
-                               LEFT JOIN languages ON book_languages.language_id = languages.id
-                               LEFT JOIN book_authors ON books.id = book_authors.book_id
-                               LEFT JOIN authors ON book_authors.author_id = authors.id
-                               LEFT JOIN book_categories ON books.id = book_categories.book_id
-                               LEFT JOIN categories ON book_categories.category_id = categories.id
-                               GROUP BY books.id, books.title, books.publication_year, books.open_library_id, books.cover_id
-                               ORDER BY books.id""")
+                cursor.execute(book_select())
                 return cursor.fetchall()
     except Exception as e:
         print(f"Error fetching books: {e}")
@@ -76,7 +58,7 @@ def get_books_data():
 def get_categories_data():
     """Fetch categories data from the database"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
                 cursor.execute("SELECT * FROM categories ORDER BY name")
                 return cursor.fetchall()
@@ -87,7 +69,7 @@ def get_categories_data():
 def get_authors_data():
     """Fetch authors data from the database"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
                 cursor.execute("""
                     SELECT 
@@ -113,7 +95,7 @@ def get_authors_data():
 def get_statistics():
     """Get application statistics"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
                 stats = {}
                 
@@ -155,6 +137,23 @@ def organize_books_by_category(books, categories):
     
     return books_by_category
 
+class Pagination:
+    """Simple pagination object for the paged HTML listings"""
+    def __init__(self, page, per_page, total):
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.pages = (total - 1) // per_page + 1 if total > 0 else 0
+        self.has_prev = page > 1
+        self.has_next = page < self.pages
+        self.prev_num = page - 1 if self.has_prev else None
+        self.next_num = page + 1 if self.has_next else None
+    
+    def iter_pages(self):
+        start = max(1, self.page - 2)
+        end = min(self.pages + 1, self.page + 3)
+        return range(start, end)
+
 @app.route('/')
 def home():
     try:
@@ -202,35 +201,9 @@ def home():
 def book_detail(book_id):
     """Individual book detail page"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
-                cursor.execute("""SELECT 
-                               books.id,
-                               books.title,
-                               books.publication_year,
-                               books.open_library_id,
-                               books.cover_id,
-                               COALESCE(
-                                   ARRAY_AGG(DISTINCT categories.name) FILTER (WHERE categories.name IS NOT NULL), 
-                                   ARRAY[]::text[]
-                               ) AS categories,
-                               COALESCE(
-                                   ARRAY_AGG(DISTINCT languages.name) FILTER (WHERE languages.name IS NOT NULL), 
-                                   ARRAY[]::text[]
-                               ) AS languages,
-                               COALESCE(
-                                   ARRAY_AGG(DISTINCT authors.name) FILTER (WHERE authors.name IS NOT NULL), 
-                                   ARRAY[]::text[]
-                               ) AS authors
-                               FROM books
-                               LEFT JOIN book_languages ON books.id = book_languages.book_id
-                               LEFT JOIN languages ON book_languages.language_id = languages.id
-                               LEFT JOIN book_authors ON books.id = book_authors.book_id
-                               LEFT JOIN authors ON book_authors.author_id = authors.id
-                               LEFT JOIN book_categories ON books.id = book_categories.book_id
-                               LEFT JOIN categories ON book_categories.category_id = categories.id
-                               WHERE books.id = %s
-                               GROUP BY books.id, books.title, books.publication_year, books.open_library_id, books.cover_id""", (book_id,))
+                cursor.execute(book_select(where=["books.id = %s"], order_by=()), (book_id,))
                 book = cursor.fetchone()
                 if book:
                     return render_template('book_detail.html', book=book)
@@ -250,18 +223,11 @@ def admin_dashboard():
                 # Fetch all data for the admin panel
                 
                 # Books
-                cursor.execute("""
-                    SELECT b.id, b.title, b.publication_year, b.cover_id,
-                           ARRAY_AGG(DISTINCT a.name) FILTER (WHERE a.name IS NOT NULL) as authors,
-                           ARRAY_AGG(DISTINCT c.name) FILTER (WHERE c.name IS NOT NULL) as categories
-                    FROM books b
-                    LEFT JOIN book_authors ba ON b.id = ba.book_id
-                    LEFT JOIN authors a ON ba.author_id = a.id
-                    LEFT JOIN book_categories bc ON b.id = bc.book_id
-                    LEFT JOIN categories c ON bc.category_id = c.id
-                    GROUP BY b.id
-                    ORDER BY b.title
-                """)
+                cursor.execute(book_select(
+                    columns=('id', 'title', 'publication_year', 'cover_id'),
+                    relations=('authors', 'categories'),
+                    order_by=('books.title',)
+                ))
                 books = cursor.fetchall()
 
                 # Authors
@@ -323,116 +289,70 @@ def admin_dashboard():
                              authors=authors,
                              categories=categories,
                              languages=languages,
-                             users=users)
+                             users=users,
+                             slow_queries=read_slow_queries(limit=100))
         
     except Exception as e:
         print(f"Admin dashboard error: {e}")
         return render_template('admin_enhanced.html', stats={}, error=str(e))
 
 @app.route('/books')
+@query_limits(statement_timeout_ms=2000, max_queries=10)
 def all_books():
-    """All books page with search and pagination"""
+    """All books page with search, facet filters, facet counts and pagination"""
     try:
         page = request.args.get('page', 1, type=int)
         search = request.args.get('search', '').strip()
-        category = request.args.get('category', '').strip()
+        filters = {name: request.args.get(name, '').strip() for name in ('category', 'language', 'author', 'decade')}
+        active = {name: value for name, value in filters.items() if value and (name != 'decade' or value.isdigit())}
         per_page = 20
         
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
                 # Build the query based on filters
                 where_conditions = []
                 params = []
                 
-                if search:
-                    where_conditions.append("""
-                        (books.title ILIKE %s 
-                         OR authors.name ILIKE %s 
-                         OR categories.name ILIKE %s)
-                    """)
-                    search_param = f'%{search}%'
-                    params.extend([search_param, search_param, search_param])
+                # Ranked full-text search over title, authors and categories
+                tsquery = search_tsquery(search)
+                if tsquery:
+                    params.append(tsquery)
                 
-                if category:
-                    where_conditions.append("categories.name = %s")
-                    params.append(category)
-                
-                where_clause = ""
-                if where_conditions:
-                    where_clause = "WHERE " + " AND ".join(where_conditions)
-                
-                # Get total count
-                count_query = f"""
-                    SELECT COUNT(DISTINCT books.id)
-                    FROM books
-                    LEFT JOIN book_authors ON books.id = book_authors.book_id
-                    LEFT JOIN authors ON book_authors.author_id = authors.id
-                    LEFT JOIN book_categories ON books.id = book_categories.book_id
-                    LEFT JOIN categories ON book_categories.category_id = categories.id
-                    {where_clause}
-                """
-                cursor.execute(count_query, params)
-                result = cursor.fetchone()
-                total = list(result.values())[0] if result else 0
+                for name, value in active.items():
+                    condition, condition_params = filter_condition(name, value)
+                    where_conditions.append(condition)
+                    params.extend(condition_params)
                 
                 # Get books for current page
                 offset = (page - 1) * per_page
-                books_query = f"""
-                    SELECT DISTINCT books.id, books.title, books.publication_year, books.cover_id,
-                           COALESCE(
-                               ARRAY_AGG(DISTINCT authors.name) FILTER (WHERE authors.name IS NOT NULL), 
-                               ARRAY[]::text[]
-                           ) AS authors,
-                           COALESCE(
-                               ARRAY_AGG(DISTINCT categories.name) FILTER (WHERE categories.name IS NOT NULL), 
-                               ARRAY[]::text[]
-                           ) AS categories
-                    FROM books
-                    LEFT JOIN book_authors ON books.id = book_authors.book_id
-                    LEFT JOIN authors ON book_authors.author_id = authors.id
-                    LEFT JOIN book_categories ON books.id = book_categories.book_id
-                    LEFT JOIN categories ON book_categories.category_id = categories.id
-                    {where_clause}
-                    GROUP BY books.id, books.title, books.publication_year, books.cover_id
-                    ORDER BY books.title
-                    LIMIT %s OFFSET %s
-                """
-                cursor.execute(books_query, params + [per_page, offset])
-                books = cursor.fetchall()
-                
-                # Get categories for filter dropdown
-                cursor.execute("SELECT id, name FROM categories ORDER BY name")
-                categories = cursor.fetchall()
+                books_query = book_select(
+                    where=where_conditions,
+                    order_by=SEARCH_ORDER if tsquery else ('books.title', 'books.id'),
+                    relations=('authors', 'categories'),
+                    columns=('id', 'title', 'publication_year', 'cover_id'),
+                    limit=True,
+                    offset=True,
+                    search=bool(tsquery)
+                )
                 
-                # Simple pagination object
-                class Pagination:
-                    def __init__(self, page, per_page, total):
-                        self.page = page
-                        self.per_page = per_page
-                        self.total = total
-                        self.pages = (total - 1) // per_page + 1 if total > 0 else 0
-                        self.has_prev = page > 1
-                        self.has_next = page < self.pages
-                        self.prev_num = page - 1 if self.has_prev else None
-                        self.next_num = page + 1 if self.has_next else None
-                    
-                    def iter_pages(self):
-                        start = max(1, self.page - 2)
-                        end = min(self.pages + 1, self.page + 3)
-                        return range(start, end)
+                # Page, total count and facet counts in one round trip
+                cursor.execute(*faceted_page_query(active, books_query, params + [per_page, offset], tsquery=tsquery))
+                total, facets, books = read_faceted_page(cursor.fetchall())
                 
                 pagination = Pagination(page, per_page, total)
                 
                 return render_template('all_books.html', 
                                      books=books, 
-                                     categories=categories,
+                                     facets=facets,
+                                     filters={name: value for name, value in filters.items() if value},
                                      pagination=pagination)
                 
     except Exception as e:
         print(f"All books error: {e}")
-        return render_template('all_books.html', books=[], categories=[], error=str(e))
+        return render_template('all_books.html', books=[], facets={}, filters={}, error=str(e))
 
 @app.route('/authors')
+@query_limits(statement_timeout_ms=2000, max_queries=10)
 def all_authors():
     """All authors page with search and pagination"""
     try:
@@ -440,7 +360,7 @@ def all_authors():
         search = request.args.get('search', '').strip()
         per_page = 20
         
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
                 # Build the query based on search
                 where_clause = ""
@@ -476,23 +396,6 @@ def all_authors():
                 cursor.execute(authors_query, params + [per_page, offset])
                 authors = cursor.fetchall()
                 
-                # Simple pagination object
-                class Pagination:
-                    def __init__(self, page, per_page, total):
-                        self.page = page
-                        self.per_page = per_page
-                        self.total = total
-                        self.pages = (total - 1) // per_page + 1 if total > 0 else 0
-                        self.has_prev = page > 1
-                        self.has_next = page < self.pages
-                        self.prev_num = page - 1 if self.has_prev else None
-                        self.next_num = page + 1 if self.has_next else None
-                    
-                    def iter_pages(self):
-                        start = max(1, self.page - 2)
-                        end = min(self.pages + 1, self.page + 3)
-                        return range(start, end)
-                
                 pagination = Pagination(page, per_page, total)
                 
                 return render_template('all_authors.html', 
@@ -928,29 +831,24 @@ def search_books_for_collection(collection_id):
                 if not can_edit_collection(collection['user_id']):
                     return "<div class='alert alert-danger'>Permission denied</div>"
                 
-                # Search books not in this collection
+                # Search books not in this collection: substring or typo-tolerant
+                # (trigram) match on the title or an author name
                 search_pattern = f"%{query}%"
-                cursor.execute("""
-                    SELECT DISTINCT b.id, b.title, b.publication_year, b.cover_id,
-                           ARRAY_AGG(DISTINCT a.name) FILTER (WHERE a.name IS NOT NULL) as authors
-                    FROM books b
-                    LEFT JOIN book_authors ba ON b.id = ba.book_id
-                    LEFT JOIN authors a ON ba.author_id = a.id
-                    WHERE b.id NOT IN (
-                        SELECT book_id FROM collection_books WHERE collection_id = %s
-                    )
-                    AND (
-                        LOWER(b.title) LIKE LOWER(%s) OR
-                        EXISTS (
-                            SELECT 1 FROM book_authors ba2 
-                            JOIN authors a2 ON ba2.author_id = a2.id 
-                            WHERE ba2.book_id = b.id AND LOWER(a2.name) LIKE LOWER(%s)
-                        )
-                    )
-                    GROUP BY b.id, b.title, b.publication_year, b.cover_id
-                    ORDER BY b.title
-                    LIMIT 20
-                """, (collection_id, search_pattern, search_pattern))
+                apply_threshold(cursor)
+                author_match = relation_exists('authors', f"(authors.name ILIKE %s OR {match_condition('authors.name')})")
+                author_names = "array_to_string(books.authors, ' ')"
+                books_query = book_select(
+                    where=[
+                        "NOT EXISTS (SELECT 1 FROM collection_books WHERE collection_id = %s AND book_id = books.id)",
+                        f"(books.title ILIKE %s OR {match_condition('books.title')} OR {author_match})"
+                    ],
+                    order_by=('rank DESC', 'books.title', 'books.id'),
+                    relations=('authors',),
+                    columns=('id', 'title', 'publication_year', 'cover_id'),
+                    rank=f"GREATEST({similarity('books.title')}, {similarity(author_names)})",
+                    limit=True
+                )
+                cursor.execute(books_query, (query, query, collection_id, search_pattern, query, search_pattern, query, 20))
                 
                 books = cursor.fetchall()
                 
@@ -971,8 +869,9 @@ def search_books_for_collection(collection_id):
                     title_display = book['title'][:40] + '...' if len(book['title']) > 40 else book['title']
                     
                     cover_html = ''
-                    if book['cover_url']:
-                        cover_html = f'<img src="{book["cover_url"]}" alt="{book["title"]}" class="img-fluid" style="max-height: 180px; max-width: 120px; object-fit: cover;">'
+                    if book['cover_id']:
+                        cover_url = f"https://covers.openlibrary.org/b/id/{book['cover_id']}-M.jpg"
+                        cover_html = f'<img src="{cover_url}" alt="{book["title"]}" class="img-fluid" style="max-height: 180px; max-width: 120px; object-fit: cover;">'
                     else:
                         cover_html = '<div class="text-center text-muted"><i class="fas fa-book" style="font-size: 3rem; opacity: 0.3;"></i><br><small>No Cover</small></div>'
                     
@@ -1052,8 +951,9 @@ def load_more_books_for_collection(collection_id):
                     title_display = book['title'][:40] + '...' if len(book['title']) > 40 else book['title']
                     
                     cover_html = ''
-                    if book['cover_url']:
-                        cover_html = f'<img src="{book["cover_url"]}" alt="{book["title"]}" class="img-fluid" style="max-height: 180px; max-width: 120px; object-fit: cover;">'
+                    if book['cover_id']:
+                        cover_url = f"https://covers.openlibrary.org/b/id/{book['cover_id']}-M.jpg"
+                        cover_html = f'<img src="{cover_url}" alt="{book["title"]}" class="img-fluid" style="max-height: 180px; max-width: 120px; object-fit: cover;">'
                     else:
                         cover_html = '<div class="text-center text-muted"><i class="fas fa-book" style="font-size: 3rem; opacity: 0.3;"></i><br><small>No Cover</small></div>'
                     
@@ -1087,15 +987,40 @@ def load_more_books_for_collection(collection_id):
         return "<div class='alert alert-danger'>Error loading more books</div>"
 
 @app.route('/search')
+@query_limits(statement_timeout_ms=2000, max_queries=10)
 def search():
-    """Search functionality"""
-    query = request.args.get('q', '')
+    """Ranked full-text search over book titles, authors and categories"""
+    query = request.args.get('q', '').strip()
     if not query:
         return redirect(url_for('home'))
     
-    # Implementation for search functionality
-    # This would use your existing search API endpoints
-    return render_template('search_results.html', query=query)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = 20
+    tsquery = search_tsquery(query)
+    if not tsquery:
+        return render_template('search_results.html', query=query, results=[], pagination=Pagination(page, per_page, 0))
+    
+    try:
+        with get_db(readonly=True) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(book_count(search=True), (tsquery,))
+                total = cursor.fetchone()['count']
+                
+                cursor.execute(
+                    book_select(order_by=SEARCH_ORDER, search=True, limit=True, offset=True),
+                    (tsquery, per_page, (page - 1) * per_page)
+                )
+                results = cursor.fetchall()
+                suggestions = did_you_mean(cursor, query) if not total else []
+        
+        return render_template('search_results.html', 
+                             query=query, 
+                             results=results, 
+                             suggestions=suggestions,
+                             pagination=Pagination(page, per_page, total))
+    except Exception as e:
+        print(f"Search error: {e}")
+        return render_template('search_results.html', query=query, results=[], error=str(e))
 
 if __name__ == '__main__':
     app.run(debug=True)
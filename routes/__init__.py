@@ -4,6 +4,7 @@ from .authors_api import authors_api
 from .users_api import users_api
 from .collections_api import collections_api
 from .languages_api import languages_api
+from .suggest_api import suggest_api
 from .auth import auth
 
 
@@ -1,16 +1,25 @@
+from functools import partial
 from flask import Blueprint, jsonify, request
-from database import get_db
+from database import get_db, on_commit, set_blueprint_limits
+from database.conditional import catalog_validators, is_not_modified, not_modified, row_validators, with_validators
+from database.dimensions import get_resolver
+from database.fuzzy import apply_threshold, match_condition, similarity
 from util import normalize_strings
 from services.open_library_service import OpenLibraryService
+from services.suggest_index import note_deleted, note_saved
 from models import handle_database_error, handle_validation_error, handle_not_found_error, handle_conflict_error
 
 authors_api = Blueprint('authors_api', __name__, url_prefix='/api/authors')
+set_blueprint_limits(authors_api, statement_timeout_ms=5000, max_queries=50)
 
 @authors_api.route('/', methods=['GET'])
 def get_authors():
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
+                validators = catalog_validators(cursor, 'authors')
+                if is_not_modified(*validators):
+                    return not_modified(*validators)
                 cursor.execute("""
                     SELECT 
                         authors.id, 
@@ -27,7 +36,7 @@ def get_authors():
                     ORDER BY authors.id;
                 """)
                 authors = cursor.fetchall()
-                return jsonify(authors)
+                return with_validators(jsonify(authors), *validators)
     except Exception as e:
         return handle_database_error(e, "fetching authors")
 
@@ -58,6 +67,7 @@ def create_author():
                 
                 cursor.execute("INSERT INTO authors (name, image_url) VALUES (%s, %s) RETURNING id;", (name, image))
                 new_id = cursor.fetchone()['id']
+                on_commit(conn, partial(note_saved, 'author', new_id, name))
                 return jsonify({'id': new_id, 'name': name, 'image_url': image, 'message': 'Author added successfully'}), 201
     except Exception as e:
         return handle_database_error(e, "adding new author")
@@ -65,8 +75,13 @@ def create_author():
 @authors_api.route('/<int:author_id>', methods=['GET'])
 def get_author(author_id):
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
+                validators = row_validators(cursor, 'authors', author_id)
+                if validators is None:
+                    return handle_not_found_error("Author")
+                if is_not_modified(*validators):
+                    return not_modified(*validators)
                 cursor.execute("""
                     SELECT 
                         authors.id, 
@@ -84,7 +99,7 @@ def get_author(author_id):
                 """, (author_id,))
                 author = cursor.fetchone()
                 if author:
-                    return jsonify(author)
+                    return with_validators(jsonify(author), *validators)
                 else:
                     return handle_not_found_error("Author")
     except Exception as e:
@@ -98,24 +113,31 @@ def search_authors():
         
     name = normalize_strings(name)
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
-                cursor.execute("""
+                # Substring or typo-tolerant (trigram) match, both served by the trigram index
+                apply_threshold(cursor)
+                cursor.execute(f"""
+                    WITH matched AS (
+                        SELECT id, name, {similarity('name')} AS similarity
+                        FROM authors
+                        WHERE name ILIKE %s OR {match_condition('name')}
+                    )
                     SELECT 
-                        authors.id, 
-                        authors.name, 
+                        matched.id, 
+                        matched.name, 
+                        matched.similarity,
                         COUNT(books.id) as book_count,
                         COALESCE(
                             ARRAY_AGG(books.title) FILTER (WHERE books.title IS NOT NULL), 
                             ARRAY[]::text[]
                         ) as book_titles
-                    FROM authors
-                    LEFT JOIN book_authors ON authors.id = book_authors.author_id
+                    FROM matched
+                    LEFT JOIN book_authors ON matched.id = book_authors.author_id
                     LEFT JOIN books ON book_authors.book_id = books.id
-                    WHERE LOWER(authors.name) LIKE LOWER(%s)
-                    GROUP BY authors.id, authors.name
-                    ORDER BY authors.id;
-                """, (f'%{name}%',))
+                    GROUP BY matched.id, matched.name, matched.similarity
+                    ORDER BY matched.similarity DESC, matched.id;
+                """, (name, f'%{name}%', name))
                 authors = cursor.fetchall()
                 return jsonify(authors)
     except Exception as e:
@@ -145,6 +167,8 @@ def update_author(author_id):
                     return handle_conflict_error('Another author with this name already exists', conflict_author['id'])
                 
                 cursor.execute("UPDATE authors SET name = %s WHERE id = %s;", (name, author_id))
+                on_commit(conn, partial(note_saved, 'author', author_id, name))
+                on_commit(conn, partial(get_resolver('authors').forget, author_id))
                 return jsonify({'id': author_id, 'name': name, 'message': 'Author updated successfully'})
     except Exception as e:
         return handle_database_error(e, "updating author")
@@ -169,6 +193,7 @@ def add_author():
                 
                 cursor.execute("INSERT INTO authors (name) VALUES (%s) RETURNING id;", (name,))
                 new_id = cursor.fetchone()['id']
+                on_commit(conn, partial(note_saved, 'author', new_id, name))
                 return jsonify({'id': new_id, 'name': name, 'message': 'Author added successfully'}), 201
     except Exception as e:
         return handle_database_error(e, "adding new author")
@@ -189,6 +214,8 @@ def delete_author(author_id):
                 
                 cursor.execute("DELETE FROM book_authors WHERE author_id = %s;", (author_id,))
                 cursor.execute("DELETE FROM authors WHERE id = %s;", (author_id,))
+                on_commit(conn, partial(note_deleted, 'author', author_id))
+                on_commit(conn, partial(get_resolver('authors').forget, author_id))
                 return jsonify({'message': 'Author deleted successfully'})
     except Exception as e:
         return handle_database_error(e, "deleting author")
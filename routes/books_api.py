@@ -1,83 +1,452 @@
-from flask import Blueprint, jsonify, request
-from database import get_db
+import base64
+import json
+import logging
+from functools import partial
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from config import Config
+from database import get_db, on_commit, query_limits, set_blueprint_limits
+from database.book_queries import ALL_RELATIONS, BOOK_COLUMNS, SEARCH_ORDER, book_select, relation_exists, search_tsquery
+from database.book_writes import created_names, upsert_book
+from database.book_changes import START, read_changes
+from database.bulk_books import bulk_insert_books
+from database.conditional import catalog_validators, is_not_modified, not_modified, row_validators, with_validators
+from database.fuzzy import apply_threshold, did_you_mean, match_condition, similarity
 from util import normalize_strings
+from services.bitmap_index import combine, expression_sql, get_bitmap_index, parse_filter
 from services.open_library_service import OpenLibraryService
+from services.suggest_index import note_deleted, note_saved
 
 books_api = Blueprint('books_api', __name__, url_prefix='/api/books')
+set_blueprint_limits(books_api, statement_timeout_ms=5000, max_queries=200)
+
+logger = logging.getLogger(__name__)
+
+# Keyset sort orders: columns of the (unique) sort key, ascending
+SORT_KEYS = {
+    'id': ['id'],
+    'title': ['title', 'id']
+}
+# Type of each sort key column, checked when a cursor is decoded
+SORT_KEY_TYPES = {'id': int, 'title': str}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# GET /changes page size
+DEFAULT_CHANGES_PAGE_SIZE = 200
+
+# Relations whose names are offered by /api/suggest
+SUGGEST_KINDS = {'authors': 'author', 'categories': 'category'}
+
+# Relationship filters: request arg -> relation name in database.book_queries
+RELATION_FILTERS = {
+    'category': 'categories',
+    'language': 'languages',
+    'author': 'authors'
+}
+
+def encode_cursor(sort, values):
+    payload = json.dumps({'s': sort, 'k': values}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, sort):
+    """Decode an opaque ``next`` cursor; raises ValueError if it is malformed or for another sort."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(payload, dict) or not isinstance(payload.get('k'), list):
+        raise ValueError("Invalid cursor")
+    values = payload['k']
+    if payload.get('s') != sort or len(values) != len(SORT_KEYS[sort]):
+        raise ValueError("Cursor does not match the requested sort")
+    for key, value in zip(SORT_KEYS[sort], values):
+        # bool is an int subclass, but never a valid id
+        if not isinstance(value, SORT_KEY_TYPES[key]) or isinstance(value, bool):
+            raise ValueError("Invalid cursor")
+    return values
+
+def build_book_filters(args):
+    """Translate category/language/author/year_from/year_to args into SQL conditions on ``books``."""
+    conditions = []
+    params = []
+    for arg, relation in RELATION_FILTERS.items():
+        names = [normalize_strings(name) for name in args.getlist(arg) if name and name.strip()]
+        if names:
+            # Any of the given names matches (e.g. ?category=fantasy&category=drama)
+            conditions.append(relation_exists(relation, f"LOWER({relation}.name) = ANY(%s)"))
+            params.append(names)
+    year_from = args.get('year_from', type=int)
+    year_to = args.get('year_to', type=int)
+    if year_from is not None:
+        conditions.append("books.publication_year >= %s")
+        params.append(year_from)
+    if year_to is not None:
+        conditions.append("books.publication_year <= %s")
+        params.append(year_to)
+    return conditions, params
+
+def build_filter_expression(args):
+    """Parse ?filter= (see services.bitmap_index) and AND in the category/language/author/year args.
+
+    Raises ValueError for a malformed expression.
+    """
+    terms = [parse_filter(args.get('filter'))]
+    for arg in RELATION_FILTERS:
+        names = [normalize_strings(name) for name in args.getlist(arg) if name and name.strip()]
+        if names:
+            terms.append(('term', arg, tuple(names)))
+    year_from = args.get('year_from', type=int)
+    year_to = args.get('year_to', type=int)
+    if year_from is not None or year_to is not None:
+        terms.append(('term', 'year', ((year_from if year_from is not None else 0,
+                                        year_to if year_to is not None else 9999),)))
+    return combine(*terms)
+
+def build_fieldset(args):
+    """Parse ?fields= (book columns) and ?include= (relations); returns (columns, relations).
+
+    Without either, every column and relation is returned. ``fields`` may also
+    name relations; with ``fields`` but no ``include``, only the relations named
+    there are returned. ``id`` is always included. Raises ValueError for unknown names.
+    """
+    fields = [name.strip() for name in args.get('fields', '').split(',') if name.strip()]
+    include = [name.strip() for name in args.get('include', '').split(',') if name.strip()]
+    unknown = [name for name in fields if name not in BOOK_COLUMNS + ALL_RELATIONS]
+    unknown += [name for name in include if name not in ALL_RELATIONS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)} (fields: {', '.join(BOOK_COLUMNS + ALL_RELATIONS)}; "
+                         f"include: {', '.join(ALL_RELATIONS)})")
+    if not fields:
+        return BOOK_COLUMNS, tuple(name for name in ALL_RELATIONS if name in include or not include)
+    columns = tuple(name for name in BOOK_COLUMNS if name == 'id' or name in fields)
+    relations = tuple(name for name in ALL_RELATIONS if name in fields or name in include)
+    return columns, relations
+
+def parse_book_ids(values):
+    """Book ids, in request order, from ints or comma-separated strings; raises ValueError"""
+    ids = []
+    for value in values:
+        parts = value.split(',') if isinstance(value, str) else [value]
+        for part in parts:
+            if isinstance(part, str) and part.strip().isdigit():
+                ids.append(int(part))
+            elif isinstance(part, int) and not isinstance(part, bool):
+                ids.append(part)
+            elif not (isinstance(part, str) and not part.strip()):
+                raise ValueError(f"Invalid book id: {part}")
+    if not ids:
+        raise ValueError("ids is required")
+    if len(ids) > Config.BOOK_BATCH_MAX_IDS:
+        raise ValueError(f"At most {Config.BOOK_BATCH_MAX_IDS} ids per request")
+    return ids
+
+def fetch_books_by_ids(cursor, ids, args):
+    """One ``= ANY`` query for ``ids``; rows come back in request order, missing ids as not-found markers"""
+    columns, relations = build_fieldset(args)
+    cursor.execute(book_select(where=["books.id = ANY(%s)"], order_by=(), relations=relations, columns=columns),
+                   (sorted(set(ids)),))
+    found = {book['id']: book for book in cursor.fetchall()}
+    return [found.get(book_id) or {'id': book_id, 'error': 'Book not found'} for book_id in ids]
+
+def decode_change_cursor(cursor):
+    """(txid, id) of a /changes cursor; no cursor starts from the beginning of the log"""
+    if not cursor:
+        return START
+    try:
+        txid, change_id = (int(part) for part in cursor.split('.'))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    return txid, change_id
+
+def _books_by_ids_response(books):
+    missing = [book['id'] for book in books if 'error' in book]
+    return {'data': books, 'missing': missing}
+
+def build_books_page_query(args, paginate=True):
+    """Build the keyset-paginated, filtered book listing; returns (query, params, sort, limit)."""
+    sort = args.get('sort', 'id')
+    if sort not in SORT_KEYS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_KEYS)}")
+    keys = SORT_KEYS[sort]
+    limit = min(max(args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    conditions, params = build_book_filters(args)
+    cursor = args.get('cursor')
+    if cursor and paginate:
+        values = decode_cursor(cursor, sort)
+        columns = ', '.join(f"books.{key}" for key in keys)
+        placeholders = ', '.join(['%s'] * len(keys))
+        conditions.append(f"({columns}) > ({placeholders})")
+        params.extend(values)
+
+    # Fetch one extra row to know whether there is a next page. A page also
+    # selects its sort key, which the next cursor is built from.
+    columns, relations = build_fieldset(args)
+    if paginate:
+        columns = tuple(column for column in BOOK_COLUMNS if column in columns or column in keys)
+    query = book_select(
+        where=conditions,
+        order_by=[f"books.{key}" for key in keys],
+        relations=relations,
+        columns=columns,
+        limit=paginate
+    )
+    if paginate:
+        params.append(limit + 1)
+    return query, params, sort, limit
+
+def _wants_stream():
+    """Streaming is requested with ?format=ndjson, ?stream=1 or an NDJSON Accept header."""
+    if request.args.get('format') == 'ndjson' or request.args.get('stream'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+def _stream_rows(query, params=None):
+    """Stream query results through a named server-side cursor, one chunk at a time.
+
+    The status is sent before the rows, so a failure mid-stream is reported in-band:
+    NDJSON ends with an {"error": ...} line, and a JSON array ends with an
+    {"error": ...} element and no closing bracket, so it does not parse as complete.
+    """
+    ndjson = request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson'
+    dumps = current_app.json.dumps
+
+    def generate():
+        first = True
+        if not ndjson:
+            yield '['
+        try:
+            with get_db(readonly=True) as conn:
+                with conn.cursor(name='stream_rows') as cursor:
+                    cursor.itersize = Config.STREAM_CHUNK_SIZE
+                    cursor.execute(query, params)
+                    for row in cursor:
+                        if ndjson:
+                            yield dumps(row) + '\n'
+                        else:
+                            yield (dumps(row) if first else ',' + dumps(row))
+                        first = False
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            logger.exception("Error streaming rows")
+            if ndjson:
+                yield dumps({"error": str(e)}) + '\n'
+            else:
+                # Leave the array unterminated so a truncated result never parses as complete
+                yield dumps({"error": str(e)}) if first else ',' + dumps({"error": str(e)})
+            return
+        if not ndjson:
+            yield ']'
+
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
 
 @books_api.route('/', methods=['GET'])
 def get_books():
-    """Fetch all books from the database."""
+    """Fetch one keyset-paginated page of books, optionally filtered.
+
+    Query args: limit, cursor (the ``next`` value of the previous page), sort (id|title),
+    category, language, author (repeatable) and year_from / year_to, fields / include
+    (see build_fieldset). Streaming (?format=ndjson or ?stream=1) returns every
+    matching book instead of a page. With ids (comma-separated), those books are
+    returned instead, in the given order (see get_books_batch). With filter, an
+    AND/OR/NOT expression, pages come from the bitmap index (see _get_filtered_books).
+    """
+    if 'ids' in request.args:
+        return _get_books_by_ids()
+    if 'filter' in request.args:
+        return _get_filtered_books()
     try:
-        with get_db() as conn:
+        try:
+            query, params, sort, limit = build_books_page_query(request.args, paginate=not _wants_stream())
+            columns, _ = build_fieldset(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
-                cursor.execute("""SELECT 
-                               books.id,
-                               books.title,
-                               books.publication_year,
-                               books.open_library_id,
-                               books.cover_id,
-                               COALESCE(
-                                   ARRAY_AGG(DISTINCT categories.name) FILTER (WHERE categories.name IS NOT NULL), 
-                                   ARRAY[]::text[]
-                               ) AS categories,
-                               COALESCE(
-                                   ARRAY_AGG(DISTINCT languages.name) FILTER (WHERE languages.name IS NOT NULL), 
-                                   ARRAY[]::text[]
-                               ) AS languages,
-                               COALESCE(
-                                   ARRAY_AGG(DISTINCT authors.name) FILTER (WHERE authors.name IS NOT NULL), 
-                                   ARRAY[]::text[]
-                               ) AS authors
-                               FROM books
-                               LEFT JOIN book_languages ON books.id = book_languages.book_id
-                               LEFT JOIN languages ON book_languages.language_id = languages.id
-                               LEFT JOIN book_authors ON books.id = book_authors.book_id
-                               LEFT JOIN authors ON book_authors.author_id = authors.id
-                               LEFT JOIN book_categories ON books.id = book_categories.book_id
-                               LEFT JOIN categories ON book_categories.category_id = categories.id
-                               GROUP BY books.id, books.title, books.publication_year, books.open_library_id, books.cover_id
-                               ORDER BY books.id""")
+                validators = catalog_validators(cursor, 'books')
+                # The Accept header picks NDJSON over a page, under the same ETag
+                if is_not_modified(*validators):
+                    return not_modified(*validators, vary=('Accept',))
+                if _wants_stream():
+                    return with_validators(_stream_rows(query, params), *validators, vary=('Accept',))
+                cursor.execute(query, params)
                 books = cursor.fetchall()
-                return jsonify(books)
+
+        next_cursor = None
+        if len(books) > limit:
+            books = books[:limit]
+            next_cursor = encode_cursor(sort, [books[-1][key] for key in SORT_KEYS[sort]])
+        unrequested = [key for key in SORT_KEYS[sort] if key not in columns]
+        if unrequested:
+            books = [{key: value for key, value in book.items() if key not in unrequested} for book in books]
+        return with_validators(jsonify({'data': books, 'next': next_cursor, 'limit': limit}), *validators,
+                               vary=('Accept',))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _get_books_by_ids():
+    try:
+        ids = parse_book_ids(request.args.getlist('ids'))
+        build_fieldset(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        with get_db(readonly=True) as conn:
+            with conn.cursor() as cursor:
+                validators = catalog_validators(cursor, 'books')
+                if is_not_modified(*validators):
+                    return not_modified(*validators)
+                books = fetch_books_by_ids(cursor, ids, request.args)
+        return with_validators(jsonify(_books_by_ids_response(books)), *validators)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _get_filtered_books():
+    """Page of books matching ?filter=, sorted by id.
+
+    The matching ids come from the in-process bitmap index and only the page is
+    read, with one = ANY query that also re-checks the expression. Until the
+    index is built, or with BITMAP_INDEX_ENABLED off, the expression runs as SQL
+    instead.
+    """
+    try:
+        if request.args.get('sort', 'id') != 'id':
+            raise ValueError("filter results are sorted by id")
+        if _wants_stream():
+            raise ValueError("filter results cannot be streamed")
+        expression = build_filter_expression(request.args)
+        columns, relations = build_fieldset(request.args)
+        cursor_arg = request.args.get('cursor')
+        after = decode_cursor(cursor_arg, 'id')[0] if cursor_arg else 0
+        if after < 0:
+            raise ValueError("Invalid cursor")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    try:
+        index = get_bitmap_index() if Config.BITMAP_INDEX_ENABLED else None
+        with get_db(readonly=True) as conn:
+            with conn.cursor() as cursor:
+                if index is None:
+                    condition, params = expression_sql(expression)
+                    cursor.execute(book_select(where=[condition, "books.id > %s"], order_by=['books.id'],
+                                               relations=relations, columns=columns, limit=True),
+                                   params + [after, limit + 1])
+                    books = cursor.fetchall()
+                    ids = [book['id'] for book in books]
+                else:
+                    ids = index.page(index.evaluate(expression), after, limit + 1)
+                    books = []
+                    if ids:
+                        # The index may lag behind recent writes, so the page is re-checked against the
+                        # expression: books deleted or no longer matching since it last caught up are
+                        # left out (the page can come back short; next still follows the index)
+                        condition, params = expression_sql(expression)
+                        cursor.execute(book_select(where=["books.id = ANY(%s)", condition], order_by=['books.id'],
+                                                   relations=relations, columns=columns),
+                                       [ids[:limit]] + params)
+                        books = cursor.fetchall()
+
+        next_cursor = encode_cursor('id', [ids[limit - 1]]) if len(ids) > limit else None
+        return jsonify({'data': books[:limit], 'next': next_cursor, 'limit': limit})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@books_api.route('/changes', methods=['GET'])
+def get_book_changes():
+    """Changes to the catalog since a cursor, oldest first, for incremental sync.
+
+    Query args: since (the ``next`` value of the previous call; omit it to read the
+    whole catalog), limit, fields / include. Returns {"changes": [...], "next", "has_more"}
+    with one entry per changed book: {"op": "upsert", "id", "book": {...}} or
+    {"op": "delete", "id"}. Keep calling with ``next`` while has_more is true.
+    """
+    try:
+        since = decode_change_cursor(request.args.get('since'))
+        build_fieldset(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    limit = min(max(request.args.get('limit', DEFAULT_CHANGES_PAGE_SIZE, type=int), 1), Config.BOOK_BATCH_MAX_IDS)
+
+    try:
+        with get_db(readonly=True) as conn:
+            with conn.cursor() as cursor:
+                rows = read_changes(cursor, since, limit + 1)
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+
+                # A book changed several times in this page is reported once, where it last changed
+                latest = {}
+                for row in rows:
+                    latest.pop(row['book_id'], None)
+                    latest[row['book_id']] = row['op']
+                upserts = [book_id for book_id, op in latest.items() if op == 'upsert']
+                books = {}
+                if upserts:
+                    books = {book['id']: book for book in fetch_books_by_ids(cursor, upserts, request.args)
+                             if 'error' not in book}
+
+        changes = []
+        for book_id in latest:
+            if book_id in books:
+                changes.append({'op': 'upsert', 'id': book_id, 'book': books[book_id]})
+            else:
+                # Deleted, possibly by a change later in the log
+                changes.append({'op': 'delete', 'id': book_id})
+        next_cursor = f"{rows[-1]['txid']}.{rows[-1]['id']}" if rows else f"{since[0]}.{since[1]}"
+        return jsonify({'changes': changes, 'next': next_cursor, 'has_more': has_more})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@books_api.route('/batch', methods=['POST'])
+def get_books_batch():
+    """Fetch many books by id in one query: {"ids": [1, 2, 3]}, for lists too long for ?ids=.
+
+    Returns {"data": [...], "missing": [ids]}: one entry per requested id, in request
+    order, ``{"id": ..., "error": "Book not found"}`` for ids that do not exist.
+    fields / include query args apply as on GET.
+    """
+    data = request.get_json(silent=True)
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list):
+        return jsonify({"error": "Expected a JSON object with an ids array"}), 400
+    try:
+        ids = parse_book_ids(ids)
+        build_fieldset(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        with get_db(readonly=True) as conn:
+            with conn.cursor() as cursor:
+                books = fetch_books_by_ids(cursor, ids, request.args)
+        return jsonify(_books_by_ids_response(books))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @books_api.route('/<int:book_id>', methods=['GET'])
 def get_book(book_id):
+    """Fetch one book; fields / include select its columns and relations (see build_fieldset)."""
     try:
-        with get_db() as conn:
+        columns, relations = build_fieldset(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
-                cursor.execute("""SELECT 
-                                       books.id,
-                               books.title,
-                               books.publication_year,
-                               books.open_library_id,
-                               books.cover_id,
-                               COALESCE(
-                                   ARRAY_AGG(DISTINCT categories.name) FILTER (WHERE categories.name IS NOT NULL), 
-                                   ARRAY[]::text[]
-                               ) AS categories,
-                               COALESCE(
-                                   ARRAY_AGG(DISTINCT languages.name) FILTER (WHERE languages.name IS NOT NULL), 
-                                   ARRAY[]::text[]
-                               ) AS languages,
-                               COALESCE(
-                                   ARRAY_AGG(DISTINCT authors.name) FILTER (WHERE authors.name IS NOT NULL), 
-                                   ARRAY[]::text[]
-                               ) AS authors
-                               FROM books
-                               LEFT JOIN book_languages ON books.id = book_languages.book_id
-                               LEFT JOIN languages ON book_languages.language_id = languages.id
-                               LEFT JOIN book_authors ON books.id = book_authors.book_id
-                               LEFT JOIN authors ON book_authors.author_id = authors.id
-                               LEFT JOIN book_categories ON books.id = book_categories.book_id
-                               LEFT JOIN categories ON book_categories.category_id = categories.id
-                               WHERE books.id = %s
-                               GROUP BY books.id, books.title, books.publication_year, books.open_library_id, books.cover_id""", (book_id,))
+                validators = row_validators(cursor, 'books', book_id)
+                if validators is None:
+                    return jsonify({"error": "Book not found"}), 404
+                if is_not_modified(*validators):
+                    return not_modified(*validators)
+                cursor.execute(book_select(where=["books.id = %s"], order_by=(), relations=relations, columns=columns),
+                               (book_id,))
                 book = cursor.fetchone()
                 if book:
-                    return jsonify(book)
+                    return with_validators(jsonify(book), *validators)
                 else:
                     return jsonify({"error": "Book not found"}), 404
     except Exception as e:
@@ -85,53 +454,61 @@ def get_book(book_id):
 
 @books_api.route('/title/<string:book_title>', methods=['GET'])
 def get_book_by_title(book_title):
-    """Fetch books by title with minimum word length filtering."""
+    """Full-text search on title, authors and categories, best match first.
+
+    Every word (longer than 1 character) must match, as a prefix. Paginate with
+    ?limit= (default 50, max 200) and ?offset=. Without matches the first page
+    falls back to trigram similarity on the title, and a 404 carries
+    "did you mean" suggestions.
+    """
     try:
         if not book_title:
             return jsonify({"error": "Invalid book title"}), 400
         
-        book_title = normalize_strings(book_title)
-        
-        # Split into words and filter out single characters
-        words = [word for word in book_title.split() if len(word) > 1]
-        
-        if not words:
+        tsquery = search_tsquery(book_title, min_length=2)
+        if not tsquery:
             return jsonify({"error": "Search term must contain words with more than 1 character"}), 400
         
-        with get_db() as conn:
+        limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
-                # Build dynamic query for multiple words
-                conditions = []
-                params = []
-                
-                for word in words:
-                    conditions.append("LOWER(title) LIKE %s")
-                    params.append(f"%{word}%")
+                query = book_select(order_by=SEARCH_ORDER, search=True, limit=True, offset=True)
+                cursor.execute(query, (tsquery, limit, offset))
+                books = cursor.fetchall()
                 
-                # Join conditions with AND (all words must be present)
-                query = """SELECT 
-                               books.id,
-                               books.title,
-                               books.publication_year,
-                               books.open_library_id,
-                               books.cover_id,
-                               languages.name AS language,
-                               authors.name
-                               FROM books
-                               JOIN book_languages ON books.id = book_languages.book_id
-                               JOIN languages ON book_languages.language_id = languages.id
-                               LEFT JOIN book_authors ON books.id = book_authors.book_id
-                               LEFT JOIN authors ON book_authors.author_id = authors.id WHERE """ + " AND ".join(conditions)
-                cursor.execute(query, params)
+                # No exact word matches: fall back to typo-tolerant title matching
+                term = normalize_strings(book_title)
+                if not books and offset == 0:
+                    apply_threshold(cursor)
+                    query = book_select(
+                        where=[match_condition('books.title')],
+                        order_by=('rank DESC', 'books.id'),
+                        rank=similarity('books.title'),
+                        limit=True
+                    )
+                    cursor.execute(query, (term, term, limit))
+                    books = cursor.fetchall()
                 
-                books = cursor.fetchall()
                 if books:
                     return jsonify(books)
                 else:
-                    return jsonify({"error": "No books found matching the search criteria"}), 404
+                    return jsonify({
+                        "error": "No books found matching the search criteria",
+                        "suggestions": did_you_mean(cursor, term)
+                    }), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
+def _note_upsert(conn, result, title=None):
+    """Queue suggest index updates for a book written with upsert_book and the names it created."""
+    if title:
+        on_commit(conn, partial(note_saved, 'book', result['book_id'], title))
+    for relation, kind in SUGGEST_KINDS.items():
+        for entry_id, name in created_names(result, relation):
+            on_commit(conn, partial(note_saved, kind, entry_id, name))
+
 @books_api.route('/', methods=['POST'])
 def add_book():
     """Add a new book to the database."""
@@ -169,66 +546,14 @@ def add_book():
         
         with get_db() as conn:
             with conn.cursor() as cursor:
-                # Check if book exists
-                cursor.execute("SELECT * FROM books WHERE LOWER(REGEXP_REPLACE(title, '\s+', ' ', 'g')) = %s", (normalize_strings(title),))
-                existing_book = cursor.fetchone()
-                if existing_book:
+                # Duplicate check, insert and linking of every name in one round trip
+                result = upsert_book(cursor, title=title, publication_year=publication_year,
+                                     open_library_id=open_library_id, cover_id=cover_id,
+                                     authors=authors, categories=categories, languages=languages)
+                if result['status'] == 'duplicate':
                     return jsonify({"error": "Book with this title already exists"}), 409
-                
-                # Insert book
-                cursor.execute(
-                    "INSERT INTO books (title, publication_year, open_library_id, cover_id) VALUES (%s, %s, %s, %s) RETURNING id",
-                    (title, publication_year, open_library_id, cover_id)
-                )
-                new_book_id = cursor.fetchone()["id"]
-                
-                # Handle languages - insert each language as a separate record
-                for language in languages:
-                    if language:  # Only process non-empty languages
-                        # Check if language exists
-                        cursor.execute("SELECT id FROM languages WHERE LOWER(name) = %s", (language.lower(),))
-                        language_result = cursor.fetchone()
-                        if language_result:
-                            language_id = language_result["id"]
-                        else:
-                            # Insert new language
-                            cursor.execute("INSERT INTO languages (name) VALUES (%s) RETURNING id", (language,))
-                            language_id = cursor.fetchone()["id"]
-                        
-                        # Link book to language via junction table
-                        cursor.execute("INSERT INTO book_languages (book_id, language_id) VALUES (%s, %s)", (new_book_id, language_id))
-                
-                # Handle categories - insert each category as a separate record
-                for category in categories:
-                    if category:  # Only process non-empty categories
-                        # Check if category exists
-                        cursor.execute("SELECT id FROM categories WHERE LOWER(name) = %s", (category.lower(),))
-                        category_result = cursor.fetchone()
-                        if category_result:
-                            category_id = category_result["id"]
-                        else:
-                            # Insert new category
-                            cursor.execute("INSERT INTO categories (name) VALUES (%s) RETURNING id", (category,))
-                            category_id = cursor.fetchone()["id"]
-                        
-                        # Link book to category via junction table
-                        cursor.execute("INSERT INTO book_categories (book_id, category_id) VALUES (%s, %s)", (new_book_id, category_id))
-                
-                # Handle authors - insert each author as a separate record
-                for author in authors:
-                    if author:  # Only process non-empty authors
-                        # Check if author exists
-                        cursor.execute("SELECT id FROM authors WHERE LOWER(name) = %s", (author.lower(),))
-                        author_result = cursor.fetchone()
-                        if author_result:
-                            author_id = author_result["id"]
-                        else:
-                            # Insert new author
-                            cursor.execute("INSERT INTO authors (name) VALUES (%s) RETURNING id", (author,))
-                            author_id = cursor.fetchone()["id"]
-
-                        # Link book to author via junction table
-                        cursor.execute("INSERT INTO book_authors (book_id, author_id) VALUES (%s, %s)", (new_book_id, author_id))
+                new_book_id = result['book_id']
+                _note_upsert(conn, result, title)
 
                 return jsonify({"message": "Book added successfully", "book_id": new_book_id}), 201
 
@@ -236,6 +561,70 @@ def add_book():
         return jsonify({"error": str(e)}), 500
     
     
+def _read_bulk_items():
+    """Items of a bulk request: a JSON array body, or NDJSON (one object per line).
+
+    NDJSON lines that are not valid JSON become ``{"_parse_error": ...}`` placeholders
+    so they are reported against their position. Returns (items, error message).
+    """
+    max_items = Config.BULK_IMPORT_MAX_ITEMS
+    if request.mimetype == 'application/json':
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            return None, "Body must be a JSON array of books (or NDJSON, one book per line)"
+        if len(items) > max_items:
+            return None, f"At most {max_items} books per request"
+        return items, None
+
+    items = []
+    loads = current_app.json.loads
+    for line in request.stream:
+        line = line.strip()
+        if not line:
+            continue
+        if len(items) >= max_items:
+            return None, f"At most {max_items} books per request"
+        try:
+            items.append(loads(line))
+        except ValueError as e:
+            items.append({'_parse_error': f"Invalid JSON: {e}"})
+    return items, None
+
+@books_api.route('/bulk', methods=['POST'])
+@query_limits(statement_timeout_ms=60000, max_queries=1000)
+def add_books_bulk():
+    """Add many books in one transaction; responds with one result per item, in input order."""
+    try:
+        items, error = _read_bulk_items()
+        if error:
+            return jsonify({"error": error}), 400
+        if not items:
+            return jsonify({"error": "No books in request body"}), 400
+
+        parse_errors = {index: item['_parse_error'] for index, item in enumerate(items)
+                        if isinstance(item, dict) and '_parse_error' in item}
+        with get_db() as conn:
+            with conn.cursor() as cursor:
+                results, created_names = bulk_insert_books(
+                    cursor, [None if index in parse_errors else item for index, item in enumerate(items)])
+                for index, message in parse_errors.items():
+                    results[index] = {'index': index, 'status': 'error', 'error': message}
+
+                for result in results:
+                    if result['status'] == 'created':
+                        title = normalize_strings(items[result['index']]['title'])
+                        on_commit(conn, partial(note_saved, 'book', result['book_id'], title))
+                for kind, key in (('author', 'authors'), ('category', 'categories')):
+                    for entry_id, name in created_names[key].items():
+                        on_commit(conn, partial(note_saved, kind, entry_id, name))
+
+        counts = {status: sum(1 for result in results if result['status'] == status)
+                  for status in ('created', 'conflict', 'error')}
+        return jsonify({**counts, "results": results}), 201 if counts['created'] else 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @books_api.route('/<int:book_id>', methods=['DELETE'])
 def delete_book(book_id):
     """Delete a book by its ID."""
@@ -245,6 +634,7 @@ def delete_book(book_id):
                 cursor.execute("DELETE FROM books WHERE id = %s", (book_id,))
                 if cursor.rowcount == 0:
                     return jsonify({"error": "Book not found"}), 404
+                on_commit(conn, partial(note_deleted, 'book', book_id))
                 return jsonify({"message": "Book deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -281,78 +671,17 @@ def update_book(book_id):
         
         with get_db() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM books WHERE id = %s", (book_id,))
-                existing_book = cursor.fetchone()
-                if not existing_book:
+                # Existence and title checks, the update and relation replacement in one round trip
+                result = upsert_book(cursor, book_id=book_id, title=title, publication_year=publication_year,
+                                     open_library_id=open_library_id, cover_id=cover_id,
+                                     authors=authors, categories=categories, languages=languages)
+                if result['status'] == 'not_found':
                     return jsonify({"error": "Book not found"}), 404
-                
-                update_fields = []
-                update_values = []
-                if title:
-                    # Check if another book (not this one) has the same title
-                    cursor.execute("SELECT * FROM books WHERE LOWER(REGEXP_REPLACE(title, '\s+', ' ', 'g')) = %s AND id != %s", (normalize_strings(title), book_id))
-                    title_conflict = cursor.fetchone()
-                    if title_conflict:
-                        return jsonify({"error": "Another book with this title already exists"}), 409
-                    update_fields.append("title = %s")
-                    update_values.append(title)
-                if publication_year is not None:
-                    update_fields.append("publication_year = %s")
-                    update_values.append(publication_year)
-                if cover_id is not None:
-                    update_fields.append("cover_id = %s")
-                    update_values.append(cover_id)
-                if open_library_id is not None:
-                    update_fields.append("open_library_id = %s")
-                    update_values.append(open_library_id)
-                
-                # Handle languages update - remove old and add new
-                if languages:
-                    cursor.execute("DELETE FROM book_languages WHERE book_id = %s", (book_id,))
-                    for language in languages:
-                        if language:
-                            cursor.execute("SELECT id FROM languages WHERE LOWER(name) = %s", (language.lower(),))
-                            language_result = cursor.fetchone()
-                            if language_result:
-                                language_id = language_result["id"]
-                            else:
-                                cursor.execute("INSERT INTO languages (name) VALUES (%s) RETURNING id", (language,))
-                                language_id = cursor.fetchone()["id"]
-                            cursor.execute("INSERT INTO book_languages (book_id, language_id) VALUES (%s, %s)", (book_id, language_id))
-                
-                # Handle categories update - remove old and add new
-                if categories:
-                    cursor.execute("DELETE FROM book_categories WHERE book_id = %s", (book_id,))
-                    for category in categories:
-                        if category:
-                            cursor.execute("SELECT id FROM categories WHERE LOWER(name) = %s", (category.lower(),))
-                            category_result = cursor.fetchone()
-                            if category_result:
-                                category_id = category_result["id"]
-                            else:
-                                cursor.execute("INSERT INTO categories (name) VALUES (%s) RETURNING id", (category,))
-                                category_id = cursor.fetchone()["id"]
-                            cursor.execute("INSERT INTO book_categories (book_id, category_id) VALUES (%s, %s)", (book_id, category_id))
-                
-                # Handle authors update - remove old and add new
-                if authors:
-                    cursor.execute("DELETE FROM book_authors WHERE book_id = %s", (book_id,))
-                    for author in authors:
-                        if author:
-                            cursor.execute("SELECT id FROM authors WHERE LOWER(name) = %s", (author.lower(),))
-                            author_result = cursor.fetchone()
-                            if author_result:
-                                author_id = author_result["id"]
-                            else:
-                                cursor.execute("INSERT INTO authors (name) VALUES (%s) RETURNING id", (author,))
-                                author_id = cursor.fetchone()["id"]
-                            cursor.execute("INSERT INTO book_authors (book_id, author_id) VALUES (%s, %s)", (book_id, author_id))
-                
-                if update_fields:
-                    query = "UPDATE books SET " + ", ".join(update_fields) + " WHERE id = %s"
-                    cursor.execute(query, (*update_values, book_id))
+                if result['status'] == 'duplicate':
+                    return jsonify({"error": "Another book with this title already exists"}), 409
+                _note_upsert(conn, result, title)
                     
-                return jsonify({"message": "Book updated successfully"}), 200
+                return jsonify({"message": "Book updated successfully", "changes": result['changes']}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -403,59 +732,14 @@ def _add_book_to_db(book_data):
     
     with get_db() as conn:
         with conn.cursor() as cursor:
-            # Check if book exists
-            cursor.execute("SELECT * FROM books WHERE LOWER(REGEXP_REPLACE(title, '\s+', ' ', 'g')) = %s", (normalize_strings(title),))
-            existing_book = cursor.fetchone()
-            if existing_book:
+            result = upsert_book(cursor, title=title, publication_year=publication_year,
+                                 open_library_id=open_library_id, cover_id=cover_id,
+                                 authors=authors, categories=categories, languages=languages)
+            if result['status'] == 'duplicate':
                 raise ValueError("Book already exists")
-            
-            # Insert book
-            cursor.execute(
-                "INSERT INTO books (title, publication_year, open_library_id, cover_id) VALUES (%s, %s, %s, %s) RETURNING id",
-                (title, publication_year, open_library_id, cover_id)
-            )
-            new_book_id = cursor.fetchone()["id"]
-            
-            # Handle languages array
-            for language in languages:
-                if language:
-                    cursor.execute("SELECT id FROM languages WHERE LOWER(name) = %s", (language.lower(),))
-                    language_result = cursor.fetchone()
-                    if language_result:
-                        language_id = language_result["id"]
-                    else:
-                        cursor.execute("INSERT INTO languages (name) VALUES (%s) RETURNING id", (language,))
-                        language_id = cursor.fetchone()["id"]
-                    
-                    cursor.execute("INSERT INTO book_languages (book_id, language_id) VALUES (%s, %s)", (new_book_id, language_id))
-            
-            # Handle authors array
-            for author in authors:
-                if author:
-                    cursor.execute("SELECT id FROM authors WHERE LOWER(name) = %s", (author.lower(),))
-                    author_result = cursor.fetchone()
-                    if author_result:
-                        author_id = author_result["id"]
-                    else:
-                        cursor.execute("INSERT INTO authors (name) VALUES (%s) RETURNING id", (author,))
-                        author_id = cursor.fetchone()["id"]
-                    
-                    cursor.execute("INSERT INTO book_authors (book_id, author_id) VALUES (%s, %s)", (new_book_id, author_id))
-            
-            # Handle categories array
-            for category in categories:
-                if category:
-                    cursor.execute("SELECT id FROM categories WHERE LOWER(name) = %s", (category.lower(),))
-                    category_result = cursor.fetchone()
-                    if category_result:
-                        category_id = category_result["id"]
-                    else:
-                        cursor.execute("INSERT INTO categories (name) VALUES (%s) RETURNING id", (category,))
-                        category_id = cursor.fetchone()["id"]
-                    
-                    cursor.execute("INSERT INTO book_categories (book_id, category_id) VALUES (%s, %s)", (new_book_id, category_id))
+            _note_upsert(conn, result, title)
 
-            return new_book_id
+            return result['book_id']
 
 @books_api.route('/import/<string:title>', methods=['POST'])
 def import_book_from_open_library(title):
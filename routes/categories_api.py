@@ -1,7 +1,11 @@
+from functools import partial
 from flask import Blueprint, jsonify, request
-from database import get_db
+from database import get_db, on_commit
+from database.conditional import catalog_validators, is_not_modified, not_modified, with_validators
+from database.dimensions import get_resolver
 from util import normalize_strings
 from services.open_library_service import OpenLibraryService
+from services.suggest_index import note_deleted, note_saved
 
 categories_api = Blueprint('categories_api', __name__, url_prefix='/api/categories')
 
@@ -17,8 +21,12 @@ def get_categories():
         # Calculate offset
         offset = (page - 1) * per_page
         
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
+                validators = catalog_validators(cursor, 'categories')
+                if is_not_modified(*validators):
+                    return not_modified(*validators)
+
                 # Build WHERE clause for search
                 where_clause = ""
                 search_params = []
@@ -53,7 +61,7 @@ def get_categories():
                 # Calculate pagination info
                 total_pages = (total_count + per_page - 1) // per_page
                 
-                return jsonify({
+                return with_validators(jsonify({
                     'data': categories,
                     'pagination': {
                         'page': page,
@@ -63,7 +71,7 @@ def get_categories():
                         'has_prev': page > 1,
                         'has_next': page < total_pages
                     }
-                })
+                }), *validators)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -71,7 +79,7 @@ def get_categories():
 def get_category(category_id):
     """Fetch a single category by its ID."""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
                 cursor.execute("SELECT * FROM categories WHERE id = %s", (category_id,))
                 category = cursor.fetchone()
@@ -111,6 +119,7 @@ def add_category():
             with conn.cursor() as cursor:
                 cursor.execute("INSERT INTO categories (name) VALUES (%s) RETURNING id", (name,))
                 new_category_id = cursor.fetchone()["id"]
+                on_commit(conn, partial(note_saved, 'category', new_category_id, name))
                 return jsonify({"message": "Category added", "category_id": new_category_id}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -130,6 +139,8 @@ def update_category(category_id):
                 cursor.execute("UPDATE categories SET name = %s WHERE id = %s", (name, category_id))
                 if cursor.rowcount == 0:
                     return jsonify({"error": "Category not found"}), 404
+                on_commit(conn, partial(note_saved, 'category', category_id, name))
+                on_commit(conn, partial(get_resolver('categories').forget, category_id))
                 return jsonify({"message": "Category updated"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -143,6 +154,8 @@ def delete_category(category_id):
                 cursor.execute("DELETE FROM categories WHERE id = %s", (category_id,))
                 if cursor.rowcount == 0:
                     return jsonify({"error": "Category not found"}), 404
+                on_commit(conn, partial(note_deleted, 'category', category_id))
+                on_commit(conn, partial(get_resolver('categories').forget, category_id))
                 return jsonify({"message": "Category deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -152,7 +165,7 @@ def delete_category(category_id):
 def get_books_by_category(category_id):
     """Fetch all books for a specific category."""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             with conn.cursor() as cursor:
                 cursor.execute("""
                     SELECT b.* 
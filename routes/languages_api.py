@@ -1,5 +1,8 @@
+from functools import partial
 from flask import Blueprint, jsonify, request
-from database import get_db
+from database import get_db, on_commit
+from database.conditional import catalog_validators, is_not_modified, not_modified, with_validators
+from database.dimensions import get_resolver
 from util import normalize_strings
 
 languages_api = Blueprint('languages_api', __name__, url_prefix='/api/languages')
@@ -18,6 +21,10 @@ def get_languages():
         
         with get_db() as conn:
             with conn.cursor() as cursor:
+                validators = catalog_validators(cursor, 'languages')
+                if is_not_modified(*validators):
+                    return not_modified(*validators)
+
                 # Build WHERE clause for search
                 where_clause = ""
                 search_params = []
@@ -53,7 +60,7 @@ def get_languages():
                 # Calculate pagination info
                 total_pages = (total_count + per_page - 1) // per_page
                 
-                return jsonify({
+                return with_validators(jsonify({
                     'data': languages,
                     'pagination': {
                         'page': page,
@@ -63,7 +70,7 @@ def get_languages():
                         'has_prev': page > 1,
                         'has_next': page < total_pages
                     }
-                })
+                }), *validators)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -115,6 +122,7 @@ def update_language(language_id):
                 cursor.execute("UPDATE languages SET name = %s WHERE id = %s", (name, language_id))
                 if cursor.rowcount == 0:
                     return jsonify({"error": "Language not found"}), 404
+                on_commit(conn, partial(get_resolver('languages').forget, language_id))
                 return jsonify({"message": "Language updated"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -128,6 +136,7 @@ def delete_language(language_id):
                 cursor.execute("DELETE FROM languages WHERE id = %s", (language_id,))
                 if cursor.rowcount == 0:
                     return jsonify({"error": "Language not found"}), 404
+                on_commit(conn, partial(get_resolver('languages').forget, language_id))
                 return jsonify({"message": "Language deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
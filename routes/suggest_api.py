@@ -0,0 +1,22 @@
+from flask import Blueprint, jsonify, request
+from services.suggest_index import KINDS, TOP_K, get_suggest_index
+
+suggest_api = Blueprint('suggest_api', __name__, url_prefix='/api/suggest')
+
+@suggest_api.route('/', methods=['GET'])
+def suggest():
+    """Autocomplete book titles, author names and category names by prefix.
+
+    Query args: q (the prefix), limit (default and max 10) and type
+    (book|author|category, repeatable; default all).
+    """
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', TOP_K, type=int), 1), TOP_K)
+    kinds = tuple(request.args.getlist('type')) or KINDS
+    if any(kind not in KINDS for kind in kinds):
+        return jsonify({"error": f"type must be one of: {', '.join(KINDS)}"}), 400
+    try:
+        suggestions = get_suggest_index().suggest(query, limit=limit, kinds=kinds)
+        return jsonify({'query': query, 'suggestions': suggestions})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark combined catalog filters: the bitmap index against the SQL path.
+
+Builds a synthetic catalog in a scratch schema (the real tables are never
+touched, see benchmark_book_queries.py), loads a services.bitmap_index
+BitmapIndex from it, checks that both paths find the same books for every
+expression, then times one page (plus the total match count) per path.
+
+Usage:
+    python scripts/benchmark_bitmap_filters.py
+    python scripts/benchmark_bitmap_filters.py --books 200000 --authors 2 --categories 3 --languages 1
+"""
+import os
+import sys
+import argparse
+import statistics
+import time
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from psycopg2.extras import RealDictCursor
+from benchmark_book_queries import SETUP
+from database.connection import connect
+from database.book_queries import book_select
+from services.bitmap_index import BitmapIndex, SOURCE_COLUMNS, expression_sql, parse_filter
+
+SCHEMA = 'bench_bitmap_filters'
+
+# Synthetic names: 'category 1'..'category 200', 'language 1'..'language 40', years 1900-2024
+EXPRESSIONS = [
+    'category:"category 1","category 2" AND language:"language 3" AND year:1950-1980',
+    'category:"category 5" OR category:"category 6" AND NOT language:"language 1"',
+    '(category:"category 7" OR language:"language 8") AND NOT year:1900-1990',
+    'author:"author 42" OR author:"author 43"',
+    'NOT (category:"category 1" OR category:"category 2" OR category:"category 3")',
+]
+
+def sql_queries(expression, page_size):
+    condition, params = expression_sql(expression)
+    page = book_select(where=[condition], order_by=['books.id'], limit=True, summary=False)
+    count = f"SELECT COUNT(*) AS count FROM books WHERE {condition}"
+    return (page, params + [page_size]), (count, params)
+
+def run_sql(cursor, page, count):
+    cursor.execute(*page)
+    rows = cursor.fetchall()
+    cursor.execute(*count)
+    return [row['id'] for row in rows], cursor.fetchone()['count']
+
+def run_bitmap(cursor, index, expression, page_size):
+    bits = index.evaluate(expression)
+    ids = index.page(bits, 0, page_size)
+    cursor.execute(book_select(where=["books.id = ANY(%s)"], order_by=['books.id'], summary=False), (ids,))
+    rows = cursor.fetchall()
+    return [row['id'] for row in rows], bits.bit_count()
+
+def median_ms(run, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=1000000, help='number of synthetic books')
+    parser.add_argument('--authors', type=int, default=2, help='authors per book')
+    parser.add_argument('--categories', type=int, default=3, help='categories per book')
+    parser.add_argument('--languages', type=int, default=1, help='languages per book')
+    parser.add_argument('--page-size', type=int, default=50, help='rows per page')
+    parser.add_argument('--runs', type=int, default=5, help='timed runs per query (median is reported)')
+    parser.add_argument('--keep', action='store_true', help=f'keep the {SCHEMA} schema afterwards')
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            print(f"🔧 Building {args.books} books with {args.authors} authors, {args.categories} "
+                  f"categories and {args.languages} languages each in schema {SCHEMA}...")
+            cursor.execute(SETUP.format(schema=SCHEMA), vars(args))
+            conn.commit()
+            cursor.execute(f"SET search_path TO {SCHEMA}")
+
+            start = time.perf_counter()
+            index = BitmapIndex()
+            cursor.execute(book_select(order_by=(), columns=SOURCE_COLUMNS, summary=False))
+            index.load(cursor.fetchall())
+            stats = index.stats()
+            print(f"📇 Bitmap index: {stats['books']} books loaded in {time.perf_counter() - start:.1f}s; "
+                  + ', '.join(f"{facet} {counts['values']} values ({counts['dense']} dense)"
+                              for facet, counts in stats['facets'].items()))
+
+            print(f"\n{'matches':>9} {'sql ms':>9} {'bitmap ms':>10} {'speedup':>8}  expression")
+            for text in EXPRESSIONS:
+                expression = parse_filter(text)
+                page, count = sql_queries(expression, args.page_size)
+                sql_result = run_sql(cursor, page, count)
+                bitmap_result = run_bitmap(cursor, index, expression, args.page_size)
+                if sql_result != bitmap_result:
+                    print(f"❌ {text}: bitmap {bitmap_result[1]} matches, SQL {sql_result[1]}")
+                    return 1
+                sql_ms = median_ms(lambda: run_sql(cursor, page, count), args.runs)
+                bitmap_ms = median_ms(lambda: run_bitmap(cursor, index, expression, args.page_size), args.runs)
+                print(f"{sql_result[1]:>9} {sql_ms:>9.2f} {bitmap_ms:>10.2f} {sql_ms / bitmap_ms:>7.1f}x  {text}")
+            conn.rollback()
+        print("\n✅ Results identical for every expression")
+    except Exception:
+        print("❌ Benchmark failed:")
+        traceback.print_exc()
+        return 1
+    finally:
+        if not args.keep:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        conn.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark the legacy fan-out book query against database.book_queries.
+
+Builds a synthetic catalog in a scratch schema (the real tables are never
+touched), checks both queries return identical rows, then times them and
+prints the buffer usage reported by EXPLAIN (ANALYZE, BUFFERS).
+
+Usage:
+    python scripts/benchmark_book_queries.py
+    python scripts/benchmark_book_queries.py --books 50000 --authors 5 --categories 4 --languages 2
+"""
+import os
+import sys
+import argparse
+import statistics
+import time
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from psycopg2.extras import RealDictCursor
+from database.connection import connect
+from database.book_queries import book_select
+
+SCHEMA = 'bench_book_queries'
+
+LEGACY_QUERY = """SELECT
+    books.id, books.title, books.publication_year, books.open_library_id, books.cover_id,
+    COALESCE(ARRAY_AGG(DISTINCT categories.name) FILTER (WHERE categories.name IS NOT NULL), ARRAY[]::text[]) AS categories,
+    COALESCE(ARRAY_AGG(DISTINCT languages.name) FILTER (WHERE languages.name IS NOT NULL), ARRAY[]::text[]) AS languages,
+    COALESCE(ARRAY_AGG(DISTINCT authors.name) FILTER (WHERE authors.name IS NOT NULL), ARRAY[]::text[]) AS authors
+    FROM books
+    LEFT JOIN book_languages ON books.id = book_languages.book_id
+    LEFT JOIN languages ON book_languages.language_id = languages.id
+    LEFT JOIN book_authors ON books.id = book_authors.book_id
+    LEFT JOIN authors ON book_authors.author_id = authors.id
+    LEFT JOIN book_categories ON books.id = book_categories.book_id
+    LEFT JOIN categories ON book_categories.category_id = categories.id
+    {where}
+    GROUP BY books.id, books.title, books.publication_year, books.open_library_id, books.cover_id
+    ORDER BY books.id
+    {limit}"""
+
+SETUP = """
+    DROP SCHEMA IF EXISTS {schema} CASCADE;
+    CREATE SCHEMA {schema};
+    SET search_path TO {schema};
+    CREATE TABLE books (id serial PRIMARY KEY, title varchar(255), publication_year int,
+                        cover_id varchar(50), open_library_id varchar(50) UNIQUE);
+    CREATE TABLE authors (id serial PRIMARY KEY, name varchar(255) UNIQUE);
+    CREATE TABLE categories (id serial PRIMARY KEY, name varchar(255) UNIQUE);
+    CREATE TABLE languages (id serial PRIMARY KEY, name varchar(255));
+    CREATE TABLE book_authors (book_id int REFERENCES books(id), author_id int REFERENCES authors(id),
+                               PRIMARY KEY (book_id, author_id));
+    CREATE TABLE book_categories (book_id int REFERENCES books(id), category_id int REFERENCES categories(id),
+                                  PRIMARY KEY (book_id, category_id));
+    CREATE TABLE book_languages (book_id int REFERENCES books(id), language_id int REFERENCES languages(id),
+                                 PRIMARY KEY (book_id, language_id));
+
+    INSERT INTO books (title, publication_year, cover_id, open_library_id)
+        SELECT 'book ' || i, 1900 + i %% 125, i::text, 'OL' || i || 'W' FROM generate_series(1, %(books)s) i;
+    INSERT INTO authors (name) SELECT 'author ' || i FROM generate_series(1, GREATEST(%(books)s / 2, %(authors)s)) i;
+    INSERT INTO categories (name) SELECT 'category ' || i FROM generate_series(1, 200) i;
+    INSERT INTO languages (name) SELECT 'language ' || i FROM generate_series(1, 40) i;
+    INSERT INTO book_authors SELECT b, 1 + (b * 7 + k) %% GREATEST(%(books)s / 2, %(authors)s)
+        FROM generate_series(1, %(books)s) b, generate_series(1, %(authors)s) k;
+    INSERT INTO book_categories SELECT b, 1 + (b * 13 + k) %% 200
+        FROM generate_series(1, %(books)s) b, generate_series(1, %(categories)s) k;
+    INSERT INTO book_languages SELECT b, 1 + (b * 3 + k) %% 40
+        FROM generate_series(1, %(books)s) b, generate_series(1, %(languages)s) k;
+    ANALYZE;
+"""
+
+def build_cases(page_size):
+    """(name, legacy SQL, builder SQL, params) for each shape the application runs"""
+    return [
+        ('single book', LEGACY_QUERY.format(where="WHERE books.id = %s", limit=""),
+         book_select(where=["books.id = %s"], summary=False), (42,)),
+        (f'page of {page_size}', LEGACY_QUERY.format(where="", limit="LIMIT %s"),
+         book_select(limit=True, summary=False), (page_size,)),
+        ('full listing', LEGACY_QUERY.format(where="", limit=""),
+         book_select(summary=False), None)
+    ]
+
+def time_query(cursor, query, params, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def shared_buffers(cursor, query, params):
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+    plan = cursor.fetchone()['QUERY PLAN'][0]['Plan']
+    return plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=20000, help='number of synthetic books')
+    parser.add_argument('--authors', type=int, default=5, help='authors per book')
+    parser.add_argument('--categories', type=int, default=4, help='categories per book')
+    parser.add_argument('--languages', type=int, default=2, help='languages per book')
+    parser.add_argument('--page-size', type=int, default=50, help='rows in the paged case')
+    parser.add_argument('--runs', type=int, default=5, help='timed runs per query (median is reported)')
+    parser.add_argument('--keep', action='store_true', help=f'keep the {SCHEMA} schema afterwards')
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            print(f"🔧 Building {args.books} books with {args.authors} authors, {args.categories} "
+                  f"categories and {args.languages} languages each in schema {SCHEMA}...")
+            cursor.execute(SETUP.format(schema=SCHEMA), vars(args))
+            conn.commit()
+
+            print(f"\n{'case':<16} {'legacy ms':>10} {'builder ms':>11} {'speedup':>8} {'legacy buf':>11} {'builder buf':>12}")
+            for name, legacy, builder, params in build_cases(args.page_size):
+                cursor.execute(legacy, params)
+                legacy_rows = cursor.fetchall()
+                cursor.execute(builder, params)
+                if cursor.fetchall() != legacy_rows:
+                    print(f"❌ {name}: builder rows differ from the legacy query")
+                    return 1
+                legacy_ms = time_query(cursor, legacy, params, args.runs)
+                builder_ms = time_query(cursor, builder, params, args.runs)
+                print(f"{name:<16} {legacy_ms:>10.2f} {builder_ms:>11.2f} {legacy_ms / builder_ms:>7.1f}x "
+                      f"{shared_buffers(cursor, legacy, params):>11} {shared_buffers(cursor, builder, params):>12}")
+            conn.rollback()
+        print("\n✅ Results identical for every case")
+    except Exception:
+        print("❌ Benchmark failed:")
+        traceback.print_exc()
+        return 1
+    finally:
+        if not args.keep:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        conn.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Report drift between book_summary and the live books/junction tables.
+
+Usage:
+    python scripts/check_book_summary.py            # report only (exit code 1 on drift)
+    python scripts/check_book_summary.py --repair   # report and refresh the drifted rows
+"""
+import os
+import sys
+import argparse
+import traceback
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.book_summary import check_book_summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repair', action='store_true', help='refresh every drifted summary row')
+    parser.add_argument('--show', type=int, default=20, help='number of drifted book ids to list')
+    args = parser.parse_args()
+
+    try:
+        drift = check_book_summary(repair=args.repair)
+    except Exception:
+        print("❌ Consistency check failed:")
+        traceback.print_exc()
+        return 2
+
+    if not drift:
+        print("✅ book_summary is consistent")
+        return 0
+
+    counts = Counter(row['problem'] for row in drift)
+    print(f"❌ {len(drift)} drifted row(s): " + ", ".join(f"{count} {problem}" for problem, count in counts.items()))
+    for row in drift[:args.show]:
+        print(f"   book {row['book_id']}: {row['problem']}")
+    if args.repair:
+        print(f"🎉 Refreshed {len(drift)} row(s)")
+        return 0
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Apply pending schema migrations from database/migrations.
+
+Usage:
+    python scripts/migrate.py              # apply everything pending
+    python scripts/migrate.py --list       # show applied / pending versions
+    python scripts/migrate.py --to 3       # apply up to version 3
+"""
+import os
+import sys
+import argparse
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.migrate import load_migrations, pending_migrations, migrate
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--list', action='store_true', help='list migrations and exit')
+    parser.add_argument('--to', type=int, help='apply migrations up to this version')
+    args = parser.parse_args()
+
+    try:
+        if args.list:
+            pending = {m.version for m in pending_migrations()}
+            for migration in load_migrations():
+                status = 'pending' if migration.version in pending else 'applied'
+                print(f"{migration.version:04d}_{migration.name}: {status}")
+            return 0
+
+        applied = migrate(target=args.to)
+        if applied:
+            print(f"🎉 Applied {len(applied)} migration(s)")
+        else:
+            print("✅ Database is up to date")
+    except Exception:
+        print("❌ Migration failed:")
+        traceback.print_exc()
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
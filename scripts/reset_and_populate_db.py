@@ -25,13 +25,16 @@ from werkzeug.security import generate_password_hash
 import time
 from typing import Dict, List, Any, Optional
 
-# Add the current directory to the path for imports
+# Add the current directory and the project root to the path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
+from database.dimensions import get_resolver
+
 class DatabaseManager:
     """Handles all database operations"""
     
@@ -399,42 +402,16 @@ class DataPopulator:
         """Populate books and related data"""
         print("📚 Populating books and related data...")
         
-        # Create lookup dictionaries
-        authors_map = {}  # name -> id
-        categories_map = {}  # name -> id
-        languages_map = {}  # name -> id
         book_ids = []
         
         for i, book_data in enumerate(books_data, 1):
             print(f"  📖 Processing book {i}/{len(books_data)}: {book_data['title'][:50]}...")
             
             try:
-                # Handle authors
-                author_ids = []
-                for author_name in book_data['authors']:
-                    author_name = author_name.strip()
-                    if author_name not in authors_map:
-                        author_id = self._insert_author(author_name)
-                        authors_map[author_name] = author_id
-                    author_ids.append(authors_map[author_name])
-                
-                # Handle categories
-                category_ids = []
-                for category_name in book_data['categories']:
-                    category_name = category_name.strip()
-                    if category_name not in categories_map:
-                        category_id = self._insert_category(category_name)
-                        categories_map[category_name] = category_id
-                    category_ids.append(categories_map[category_name])
-                
-                # Handle languages
-                language_ids = []
-                for language_name in book_data['languages']:
-                    language_name = language_name.strip()
-                    if language_name not in languages_map:
-                        language_id = self._insert_language(language_name)
-                        languages_map[language_name] = language_id
-                    language_ids.append(languages_map[language_name])
+                # Resolve authors, categories and languages (cached, missing names created)
+                author_ids = self._resolve_names('authors', book_data['authors'])
+                category_ids = self._resolve_names('categories', book_data['categories'])
+                language_ids = self._resolve_names('languages', book_data['languages'])
                 
                 # Insert book
                 book_id = self._insert_book(
@@ -457,46 +434,16 @@ class DataPopulator:
         print(f"✅ Successfully created {len(book_ids)} books")
         return book_ids
     
-    def _insert_author(self, name: str) -> int:
-        """Insert author and return ID"""
-        query = """
-            INSERT INTO authors (name) 
-            VALUES (%s) 
-            ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
-            RETURNING id;
-        """
+    def _resolve_names(self, table: str, names: List[str]) -> List[int]:
+        """Resolve names to IDs with the application's dimension resolver, creating missing ones"""
+        names = [name.strip() for name in names if name and name.strip()]
+        if not names:
+            return []
         
         with self.db.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, (name,))
-                return cursor.fetchone()[0]
-    
-    def _insert_category(self, name: str) -> int:
-        """Insert category and return ID"""
-        query = """
-            INSERT INTO categories (name) 
-            VALUES (%s) 
-            ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
-            RETURNING id;
-        """
-        
-        with self.db.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, (name,))
-                return cursor.fetchone()[0]
-    
-    def _insert_language(self, name: str) -> int:
-        """Insert language and return ID"""
-        query = """
-            INSERT INTO languages (name) 
-            VALUES (%s) 
-            RETURNING id;
-        """
-        
-        with self.db.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, (name,))
-                return cursor.fetchone()[0]
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                ids = get_resolver(table).resolve(cursor, names)
+        return list(dict.fromkeys(ids[name.lower()] for name in names))
     
     def _insert_book(self, title: str, publication_year: int, cover_id: str, open_library_id: str) -> int:
         """Insert book and return ID"""
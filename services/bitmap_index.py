@@ -0,0 +1,461 @@
+"""In-process bitmap index for combined catalog filters (``/api/books?filter=``).
+
+Every book id is a bit position. The index keeps one bitset per category,
+language and author (by ``normalize_strings`` name) and per publication
+year, plus the set of all books, so an expression such as::
+
+    category:fantasy,drama AND language:french AND year:1950-1980 AND NOT author:"j. r. r. tolkien"
+
+is answered with AND / OR / AND NOT over whole bitsets; only the page of
+matching ids is then read from the database, with one ``= ANY`` query.
+
+Bitsets are Python ints: ``&``, ``|`` and ``bit_count()`` run in C over
+machine words. A value held by few books (most authors) is stored as a
+sorted tuple of ids instead, which costs a few bytes per book rather than
+one bit per catalog id, and is expanded to an int only while a query uses
+it.
+
+The index is built in a background thread on first use and then follows
+the ``book_changes`` log (migration 0017): once it is older than
+``Config.BITMAP_INDEX_REFRESH_SECONDS``, the next request starts a catch-up
+that re-reads only the books changed since the last position applied, so
+writes from any process are seen after about that delay. ``expression_sql``
+turns the same expressions into SQL conditions; it answers filters while
+the index is being built or when ``Config.BITMAP_INDEX_ENABLED`` is off,
+and ``scripts/benchmark_bitmap_filters.py`` compares the two paths.
+
+Expression syntax: ``facet:value[,value...]`` terms (facets ``category``,
+``language``, ``author``, ``year``; values double-quoted if they contain
+spaces; years as ``1950`` or ``1950-1980``), combined with ``AND`` (or
+juxtaposition), ``OR``, ``NOT`` and parentheses. NOT binds tightest, then AND.
+"""
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import Config
+from database import get_db
+from database.book_changes import START, latest_position, read_changes
+from database.book_queries import ALL_RELATIONS, book_select, relation_exists
+from util import normalize_strings
+
+FACETS = ('category', 'language', 'author', 'year')
+# book_select relation -> facet
+RELATION_FACETS = {'categories': 'category', 'languages': 'language', 'authors': 'author'}
+# Postings with more ids than this are int bitsets, smaller ones sorted tuples
+SPARSE_LIMIT = 64
+MAX_TERMS = 50
+# Changes read per round trip while catching up with the log
+DELTA_BATCH = 5000
+
+SOURCE_COLUMNS = ('id', 'publication_year')
+
+Key = Tuple[str, object]
+
+
+def ids_to_bits(ids: Iterable[int]) -> int:
+    """Int bitset with the bits of ``ids`` set, built in one pass"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for book_id in ids:
+        buffer[book_id >> 3] |= 1 << (book_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def iter_bits(bits: int, after: int = 0):
+    """Ids set in ``bits`` greater than ``after`` (negative counts as 0), ascending"""
+    base = max(after, 0) + 1
+    bits >>= base
+    while bits:
+        low = (bits & -bits).bit_length() - 1
+        yield base + low
+        bits >>= low + 1
+        base += low + 1
+
+
+def _as_bits(posting) -> int:
+    if posting is None:
+        return 0
+    return posting if isinstance(posting, int) else ids_to_bits(posting)
+
+
+class BitmapIndex:
+    """Bitsets of book ids per category, language, author and publication year"""
+
+    def __init__(self):
+        self._postings: Dict[str, dict] = {facet: {} for facet in FACETS}
+        self._books: Dict[int, Tuple[Key, ...]] = {}  # book id -> its (facet, value) keys
+        self._all = 0
+        self._lock = threading.RLock()
+        self.position = START  # last book_changes row applied
+
+    def __len__(self):
+        return len(self._books)
+
+    @staticmethod
+    def keys_for(row) -> Tuple[Key, ...]:
+        """(facet, value) keys of a book row with publication_year and the relation arrays"""
+        keys = set()
+        if row.get('publication_year') is not None:
+            keys.add(('year', row['publication_year']))
+        for relation, facet in RELATION_FACETS.items():
+            for name in row.get(relation) or ():
+                if normalize_strings(name):
+                    keys.add((facet, normalize_strings(name)))
+        return tuple(keys)
+
+    def load(self, rows):
+        """Replace the contents with book rows (see keys_for), building each bitset once"""
+        collected = {facet: {} for facet in FACETS}
+        books = {}
+        for row in rows:
+            keys = self.keys_for(row)
+            books[row['id']] = keys
+            for facet, value in keys:
+                collected[facet].setdefault(value, []).append(row['id'])
+        postings = {facet: {} for facet in FACETS}
+        for facet, values in collected.items():
+            for value, ids in values.items():
+                postings[facet][value] = ids_to_bits(ids) if len(ids) > SPARSE_LIMIT else tuple(sorted(ids))
+        with self._lock:
+            self._postings = postings
+            self._books = books
+            self._all = ids_to_bits(books)
+
+    def _add(self, facet, value, book_id):
+        postings = self._postings[facet]
+        posting = postings.get(value)
+        if posting is None:
+            postings[value] = (book_id,)
+        elif isinstance(posting, int):
+            postings[value] = posting | (1 << book_id)
+        elif book_id not in posting:
+            if len(posting) >= SPARSE_LIMIT:
+                postings[value] = ids_to_bits(posting + (book_id,))
+            else:
+                postings[value] = tuple(sorted(posting + (book_id,)))
+
+    def _discard(self, facet, value, book_id):
+        postings = self._postings[facet]
+        posting = postings.get(value)
+        if posting is None:
+            return
+        if isinstance(posting, int):
+            posting &= ~(1 << book_id)
+        else:
+            posting = tuple(entry for entry in posting if entry != book_id)
+        if posting:
+            postings[value] = posting
+        else:
+            del postings[value]
+
+    def set_book(self, row):
+        """Index (or re-index) one book row"""
+        keys = self.keys_for(row)
+        with self._lock:
+            self._unlink(row['id'])
+            for facet, value in keys:
+                self._add(facet, value, row['id'])
+            self._books[row['id']] = keys
+            self._all |= 1 << row['id']
+
+    def remove_book(self, book_id: int):
+        with self._lock:
+            self._unlink(book_id)
+            self._all &= ~(1 << book_id)
+
+    def _unlink(self, book_id):
+        for facet, value in self._books.pop(book_id, ()):
+            self._discard(facet, value, book_id)
+
+    def _term(self, facet, values) -> int:
+        postings = self._postings[facet]
+        bits = 0
+        if facet == 'year':
+            for low, high in values:
+                for year, posting in postings.items():
+                    if low <= year <= high:
+                        bits |= _as_bits(posting)
+        else:
+            for value in values:
+                bits |= _as_bits(postings.get(value))
+        return bits
+
+    def _evaluate(self, node) -> int:
+        kind = node[0]
+        if kind == 'term':
+            return self._term(node[1], node[2])
+        if kind == 'not':
+            return self._all & ~self._evaluate(node[1])
+        if kind == 'and':
+            bits = self._all
+            # NOT operands are subtracted rather than complemented against every book
+            for operand in sorted(node[1:], key=lambda operand: operand[0] == 'not'):
+                if operand[0] == 'not':
+                    bits &= ~self._evaluate(operand[1])
+                else:
+                    bits &= self._evaluate(operand)
+                if not bits:
+                    break
+            return bits
+        bits = 0
+        for operand in node[1:]:
+            bits |= self._evaluate(operand)
+        return bits
+
+    def evaluate(self, expression) -> int:
+        """Bitset of the books matching a parsed expression (see parse_filter)"""
+        with self._lock:
+            return self._evaluate(expression)
+
+    @staticmethod
+    def page(bits: int, after: int = 0, limit: int = 50) -> List[int]:
+        """Up to ``limit`` ids from ``bits`` greater than ``after``, ascending"""
+        ids = []
+        for book_id in iter_bits(bits, after):
+            ids.append(book_id)
+            if len(ids) >= limit:
+                break
+        return ids
+
+    def stats(self) -> dict:
+        """Books, values and dense (int) bitsets per facet"""
+        with self._lock:
+            return {
+                'books': len(self._books),
+                'position': list(self.position),
+                'facets': {facet: {'values': len(postings),
+                                   'dense': sum(isinstance(posting, int) for posting in postings.values())}
+                           for facet, postings in self._postings.items()}
+            }
+
+
+# --- Expressions ---------------------------------------------------------
+
+_TOKEN_RE = re.compile(r'\s*(?:(?P<punct>[(),:])|"(?P<quoted>(?:[^"\\]|\\.)*)"|(?P<word>[^\s(),:"]+))')
+_YEAR_RE = re.compile(r'^(\d{1,4})(?:-(\d{1,4}))?$')
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Invalid filter near: {text[position:position + 20]!r}")
+        position = match.end()
+        if match.group('punct'):
+            tokens.append(('punct', match.group('punct')))
+        elif match.group('quoted') is not None:
+            tokens.append(('value', re.sub(r'\\(.)', r'\1', match.group('quoted'))))
+        else:
+            tokens.append(('word', match.group('word')))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.position = 0
+        self.terms = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def keyword(self, word):
+        kind, value = self.peek()
+        return kind == 'word' and value.upper() == word
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("Empty filter")
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            raise ValueError(f"Unexpected {self.peek()[1]!r} in filter")
+        return node
+
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self.keyword('OR'):
+            self.take()
+            operands.append(self.parse_and())
+        return operands[0] if len(operands) == 1 else ('or', *operands)
+
+    def parse_and(self):
+        operands = [self.parse_not()]
+        while True:
+            if self.keyword('AND'):
+                self.take()
+            elif self.peek()[0] is None or self.peek() == ('punct', ')') or self.keyword('OR'):
+                break
+            operands.append(self.parse_not())
+        return operands[0] if len(operands) == 1 else ('and', *operands)
+
+    def parse_not(self):
+        if self.keyword('NOT'):
+            self.take()
+            return ('not', self.parse_not())
+        if self.peek() == ('punct', '('):
+            self.take()
+            node = self.parse_or()
+            if self.take() != ('punct', ')'):
+                raise ValueError("Missing ) in filter")
+            return node
+        return self.parse_term()
+
+    def parse_term(self):
+        kind, facet = self.take()
+        if kind != 'word' or self.take() != ('punct', ':'):
+            raise ValueError(f"Expected facet:value in filter, got {facet!r}")
+        facet = facet.lower()
+        if facet not in FACETS:
+            raise ValueError(f"Unknown filter facet {facet!r}; use one of: {', '.join(FACETS)}")
+        self.terms += 1
+        if self.terms > MAX_TERMS:
+            raise ValueError(f"At most {MAX_TERMS} terms per filter")
+        values = [self.parse_value(facet)]
+        while self.peek() == ('punct', ','):
+            self.take()
+            values.append(self.parse_value(facet))
+        return ('term', facet, tuple(values))
+
+    def parse_value(self, facet):
+        kind, value = self.take()
+        if kind not in ('word', 'value'):
+            raise ValueError(f"Missing value for {facet} in filter")
+        if facet == 'year':
+            match = _YEAR_RE.match(value)
+            if not match:
+                raise ValueError(f"Invalid year {value!r} in filter; use 1950 or 1950-1980")
+            low = int(match.group(1))
+            return low, int(match.group(2) or low)
+        return normalize_strings(value)
+
+
+def parse_filter(text: str):
+    """Parse a filter expression into a tree of ('term', facet, values) / ('and' | 'or', ...) / ('not', x).
+
+    Raises ValueError with a message fit for the client.
+    """
+    return _Parser(text or '').parse()
+
+
+def combine(*expressions):
+    """AND the given expressions, skipping None; None if there are none"""
+    expressions = [expression for expression in expressions if expression is not None]
+    if not expressions:
+        return None
+    return expressions[0] if len(expressions) == 1 else ('and', *expressions)
+
+
+def expression_sql(expression):
+    """(condition on ``books``, params) equivalent to an expression, for book_select"""
+    kind = expression[0]
+    if kind == 'term':
+        facet, values = expression[1], expression[2]
+        if facet == 'year':
+            # A missing year matches no range, also under NOT
+            ranges = ' OR '.join(['books.publication_year BETWEEN %s AND %s'] * len(values))
+            return f"COALESCE({ranges}, FALSE)", [bound for pair in values for bound in pair]
+        relation = next(relation for relation, name in RELATION_FACETS.items() if name == facet)
+        return relation_exists(relation, f"LOWER({relation}.name) = ANY(%s)"), [list(values)]
+    if kind == 'not':
+        condition, params = expression_sql(expression[1])
+        return f"NOT {condition}", params
+    conditions = []
+    params = []
+    for operand in expression[1:]:
+        condition, operand_params = expression_sql(operand)
+        conditions.append(condition)
+        params.extend(operand_params)
+    return "(" + f" {kind.upper()} ".join(conditions) + ")", params
+
+
+# --- Process-wide index ----------------------------------------------------
+
+def source_query(where=()):
+    """Book rows the index is built from: id, publication_year and the relation arrays"""
+    return book_select(where=where, order_by=(), columns=SOURCE_COLUMNS, relations=ALL_RELATIONS)
+
+
+_index: Optional[BitmapIndex] = None
+_refreshed_at = 0.0
+_update_lock = threading.Lock()
+_updating = False
+
+
+def _build():
+    index = BitmapIndex()
+    with get_db() as conn:
+        with conn.cursor() as cursor:
+            # Read before the books: replaying changes that are already loaded is harmless
+            position = latest_position(cursor)
+        with conn.cursor(name='bitmap_index_load') as cursor:
+            cursor.itersize = Config.STREAM_CHUNK_SIZE
+            cursor.execute(source_query())
+            index.load(cursor)
+    index.position = position
+    return index
+
+
+def apply_changes(index: BitmapIndex, cursor):
+    """Re-index the books changed since ``index.position``; returns the number of change rows read"""
+    read = 0
+    while True:
+        rows = read_changes(cursor, index.position, DELTA_BATCH)
+        if not rows:
+            return read
+        read += len(rows)
+        book_ids = sorted({row['book_id'] for row in rows})
+        cursor.execute(source_query(["books.id = ANY(%s)"]), (book_ids,))
+        found = {row['id']: row for row in cursor.fetchall()}
+        for book_id in book_ids:
+            if book_id in found:
+                index.set_book(found[book_id])
+            else:
+                index.remove_book(book_id)
+        index.position = (rows[-1]['txid'], rows[-1]['id'])
+        if len(rows) < DELTA_BATCH:
+            return read
+
+
+def _update():
+    global _index, _refreshed_at, _updating
+    try:
+        # Outside of a request get_db() uses its own connection, free of the request's
+        # statement timeout and query budget
+        if _index is None:
+            _index = _build()
+        else:
+            with get_db() as conn:
+                with conn.cursor() as cursor:
+                    apply_changes(_index, cursor)
+        _refreshed_at = time.time()
+    except Exception as e:
+        print(f"Error updating bitmap index: {e}")
+    finally:
+        _updating = False
+
+
+def get_bitmap_index() -> Optional[BitmapIndex]:
+    """Return the process-wide index, or None until its first build has finished.
+
+    Building and catching up with the change log (when the index is older than
+    ``Config.BITMAP_INDEX_REFRESH_SECONDS``) run in a background thread; requests
+    use the index as it is meanwhile.
+    """
+    global _updating
+    if _index is None or time.time() - _refreshed_at > Config.BITMAP_INDEX_REFRESH_SECONDS:
+        with _update_lock:
+            if not _updating:
+                _updating = True
+                threading.Thread(target=_update, name='bitmap-index-update', daemon=True).start()
+    return _index
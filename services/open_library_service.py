@@ -1,6 +1,8 @@
 import requests
 from typing import Optional, Dict, Any, List
 from database import get_db
+from database.book_queries import book_select
+from database.dimensions import link_book
 from util import normalize_strings
 
 class OpenLibraryService:
@@ -159,23 +161,11 @@ class OpenLibraryService:
         try:
             with get_db() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT 
-                            books.id,
-                            books.title,
-                            books.cover_id,
-                            books.open_library_id,
-                            COALESCE(
-                                ARRAY_AGG(DISTINCT authors.name) FILTER (WHERE authors.name IS NOT NULL), 
-                                ARRAY[]::text[]
-                            ) AS authors
-                        FROM books
-                        LEFT JOIN book_authors ON books.id = book_authors.book_id
-                        LEFT JOIN authors ON book_authors.author_id = authors.id
-                        WHERE books.cover_id IS NULL OR books.cover_id = ''
-                        GROUP BY books.id, books.title, books.cover_id, books.open_library_id
-                        ORDER BY books.id
-                    """)
+                    cursor.execute(book_select(
+                        where=["(books.cover_id IS NULL OR books.cover_id = '')"],
+                        columns=('id', 'title', 'cover_id', 'open_library_id'),
+                        relations=('authors',)
+                    ))
                     return cursor.fetchall()
         except Exception as e:
             print(f"Error finding missing covers: {e}")
@@ -309,47 +299,21 @@ class OpenLibraryService:
         try:
             with get_db() as conn:
                 with conn.cursor() as cursor:
-                    # Check if book already exists
+                    # Insert book; an existing title or open_library_id (unique indexes) skips it
                     cursor.execute(
-                        "SELECT id FROM books WHERE LOWER(title) = %s OR open_library_id = %s",
-                        (title.lower(), open_library_id)
+                        "INSERT INTO books (title, publication_year, open_library_id, cover_id) VALUES (%s, %s, %s, %s) "
+                        "ON CONFLICT DO NOTHING RETURNING id",
+                        (title, publication_year, open_library_id, str(cover_id) if cover_id else None)
                     )
-                    existing_book = cursor.fetchone()
-                    
-                    if existing_book:
+                    inserted = cursor.fetchone()
+                    if not inserted:
                         print(f"Book already exists: {title}")
                         return -1  # Duplicate
+                    new_book_id = inserted["id"]
                     
-                    # Insert book
-                    cursor.execute(
-                        "INSERT INTO books (title, publication_year, open_library_id, cover_id) VALUES (%s, %s, %s, %s) RETURNING id",
-                        (title, publication_year, open_library_id, str(cover_id) if cover_id else None)
-                    )
-                    new_book_id = cursor.fetchone()["id"]
-                    
-                    # Handle language if provided
-                    if language:
-                        cursor.execute("SELECT id FROM languages WHERE LOWER(name) = %s", (language.lower(),))
-                        language_result = cursor.fetchone()
-                        if language_result:
-                            language_id = language_result["id"]
-                        else:
-                            cursor.execute("INSERT INTO languages (name) VALUES (%s) RETURNING id", (language,))
-                            language_id = cursor.fetchone()["id"]
-                        
-                        cursor.execute("INSERT INTO book_languages (book_id, language_id) VALUES (%s, %s)", (new_book_id, language_id))
-                    
-                    # Handle author if provided
-                    if author:
-                        cursor.execute("SELECT id FROM authors WHERE LOWER(name) = %s", (author.lower(),))
-                        author_result = cursor.fetchone()
-                        if author_result:
-                            author_id = author_result["id"]
-                        else:
-                            cursor.execute("INSERT INTO authors (name) VALUES (%s) RETURNING id", (author,))
-                            author_id = cursor.fetchone()["id"]
-                        
-                        cursor.execute("INSERT INTO book_authors (book_id, author_id) VALUES (%s, %s)", (new_book_id, author_id))
+                    # Link language and author, creating missing names
+                    link_book(cursor, new_book_id, 'languages', [language] if language else [])
+                    link_book(cursor, new_book_id, 'authors', [author] if author else [])
 
                     print(f"✓ Imported: {title}")
                     return new_book_id
@@ -364,30 +328,13 @@ class OpenLibraryService:
         try:
             with get_db() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT 
-                            books.id,
-                            books.title,
-                            books.publication_year,
-                            books.open_library_id,
-                            COALESCE(
-                                ARRAY_AGG(DISTINCT authors.name) FILTER (WHERE authors.name IS NOT NULL), 
-                                ARRAY[]::text[]
-                            ) AS authors,
-                            COALESCE(
-                                ARRAY_AGG(DISTINCT categories.name) FILTER (WHERE categories.name IS NOT NULL), 
-                                ARRAY[]::text[]
-                            ) AS categories
-                        FROM books
-                        LEFT JOIN book_authors ON books.id = book_authors.book_id
-                        LEFT JOIN authors ON book_authors.author_id = authors.id
-                        LEFT JOIN book_categories ON books.id = book_categories.book_id
-                        LEFT JOIN categories ON book_categories.category_id = categories.id
-                        WHERE books.cover_id IS NULL OR books.cover_id = ''
-                        GROUP BY books.id, books.title, books.publication_year, books.open_library_id
-                        ORDER BY books.title
-                        LIMIT 50
-                    """)
+                    cursor.execute(book_select(
+                        where=["(books.cover_id IS NULL OR books.cover_id = '')"],
+                        order_by=('books.title', 'books.id'),
+                        columns=('id', 'title', 'publication_year', 'open_library_id'),
+                        relations=('authors', 'categories'),
+                        limit=True
+                    ), (50,))
                     return cursor.fetchall()
         except Exception as e:
             print(f"Error getting books without covers: {e}")
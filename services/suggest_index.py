@@ -0,0 +1,336 @@
+"""In-process autocomplete index over book titles, author names and category names.
+
+Every entry is indexed under its ``normalize_strings`` form and under each
+word suffix of it ("the great gatsby", "great gatsby", "gatsby"), so typing
+the start of any word finds it. Each trie node keeps the best ``TOP_K``
+entries below it, overall and per kind, ordered by popularity (collections
+holding a book, books by an author or in a category), so a lookup is a walk
+down the prefix plus a slice and never scans the catalog.
+
+The index is built from the database on first use and updated
+incrementally by the blueprints that create, rename or delete books,
+authors and categories; changes noted while a build runs are replayed onto
+the new index before it is swapped in. Other worker processes see those
+changes after their next rebuild (``Config.SUGGEST_INDEX_REBUILD_SECONDS``).
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from config import Config
+from database import get_db
+from util import normalize_strings
+
+TOP_K = 10
+# Trie depth cap; longer queries are matched against the entries below this depth
+MAX_PREFIX_LENGTH = 20
+KINDS = ('book', 'author', 'category')
+
+logger = logging.getLogger(__name__)
+
+EntryKey = Tuple[str, int]
+
+
+class _Node:
+    __slots__ = ('children', 'entries', 'top', 'top_by_kind')
+
+    def __init__(self):
+        self.children = {}
+        self.entries = set()  # entry keys whose indexed string ends here
+        self.top = []  # best TOP_K entry keys in this subtree, best first
+        self.top_by_kind = {}  # kind -> best TOP_K entry keys of that kind in this subtree
+
+
+class SuggestIndex:
+    """Prefix trie with popularity-ordered top-k completions at every node"""
+
+    def __init__(self):
+        self._root = _Node()
+        self._entries: Dict[EntryKey, dict] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _rank(self, key):
+        return self._entries[key]['rank']
+
+    @staticmethod
+    def _suffixes(text):
+        words = text.split()
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    @classmethod
+    def _keys_for(cls, text):
+        return {suffix[:MAX_PREFIX_LENGTH] for suffix in cls._suffixes(text)}
+
+    @staticmethod
+    def _entry(kind, entry_id, text, normalized, weight):
+        return {'type': kind, 'id': entry_id, 'text': text, 'normalized': normalized, 'weight': weight,
+                'rank': (-weight, text, kind, entry_id)}
+
+    def _path(self, key_string, create=False):
+        node = self._root
+        path = [node]
+        for char in key_string:
+            child = node.children.get(char)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[char] = _Node()
+            node = child
+            path.append(node)
+        return path
+
+    def _refresh(self, node):
+        candidates = set(node.entries)
+        for child in node.children.values():
+            for keys in child.top_by_kind.values():
+                candidates.update(keys)
+        ranked = sorted(candidates, key=self._rank)
+        top_by_kind = {}
+        for key in ranked:
+            keys = top_by_kind.setdefault(key[0], [])
+            if len(keys) < TOP_K:
+                keys.append(key)
+        # Replace the lists rather than mutating them so concurrent readers never see a partial update
+        node.top = ranked[:TOP_K]
+        node.top_by_kind = top_by_kind
+
+    def _refresh_path(self, path):
+        for node in reversed(path):
+            self._refresh(node)
+
+    def _unlink(self, key):
+        entry = self._entries[key]
+        for key_string in self._keys_for(entry['normalized']):
+            path = self._path(key_string)
+            if path is None:
+                continue
+            path[-1].entries.discard(key)
+            # Prune branches left without entries
+            for depth in range(len(path) - 1, 0, -1):
+                node = path[depth]
+                if node.entries or node.children:
+                    break
+                del path[depth - 1].children[key_string[depth - 1]]
+            self._refresh_path([node for node in path if node is self._root or node.entries or node.children])
+
+    def _link(self, key, refresh=True):
+        for key_string in self._keys_for(self._entries[key]['normalized']):
+            if refresh:
+                path = self._path(key_string, create=True)
+                path[-1].entries.add(key)
+                self._refresh_path(path)
+            else:
+                node = self._root
+                for char in key_string:
+                    child = node.children.get(char)
+                    if child is None:
+                        child = node.children[char] = _Node()
+                    node = child
+                node.entries.add(key)
+
+    def upsert(self, kind: str, entry_id: int, text: str, weight: Optional[int] = None):
+        """Add or rename an entry; ``weight`` None keeps the current popularity (1 for new entries)"""
+        normalized = normalize_strings(text)
+        if not normalized:
+            return
+        key = (kind, entry_id)
+        with self._lock:
+            existing = self._entries.get(key)
+            if weight is None:
+                weight = existing['weight'] if existing else 1
+            if existing:
+                self._unlink(key)
+            self._entries[key] = self._entry(kind, entry_id, text, normalized, weight)
+            self._link(key)
+
+    def remove(self, kind: str, entry_id: int):
+        key = (kind, entry_id)
+        with self._lock:
+            if key in self._entries:
+                self._unlink(key)
+                del self._entries[key]
+
+    def load(self, rows):
+        """Replace the contents with ``(kind, id, text, weight)`` rows, building the top-k lists in one pass"""
+        with self._lock:
+            self._root = _Node()
+            self._entries = {}
+            for kind, entry_id, text, weight in rows:
+                normalized = normalize_strings(text)
+                if normalized:
+                    key = (kind, entry_id)
+                    self._entries[key] = self._entry(kind, entry_id, text, normalized, weight)
+                    self._link(key, refresh=False)
+            # Post-order pass: children before parents
+            stack = [(self._root, False)]
+            while stack:
+                node, visited = stack.pop()
+                if visited:
+                    if not node.entries and len(node.children) == 1:
+                        # Chain node: same completions as its only child
+                        child = next(iter(node.children.values()))
+                        node.top, node.top_by_kind = child.top, child.top_by_kind
+                    else:
+                        self._refresh(node)
+                else:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in node.children.values())
+
+    def suggest(self, prefix: str, limit: int = TOP_K, kinds=KINDS) -> List[dict]:
+        """Top completions for ``prefix``, most popular first"""
+        normalized = normalize_strings(prefix)
+        if not normalized:
+            return []
+        # upsert/remove change the trie from other threads; the walk is short, so hold the lock
+        with self._lock:
+            path = self._path(normalized[:MAX_PREFIX_LENGTH])
+            if path is None:
+                return []
+            node = path[-1]
+            if len(normalized) > MAX_PREFIX_LENGTH:
+                candidates = sorted(self._subtree_entries(node, normalized), key=self._rank)
+            elif set(KINDS) <= set(kinds):
+                candidates = node.top
+            else:
+                # The overall top-k can be all of another kind; merge the requested kinds' own lists
+                candidates = sorted((key for kind in set(kinds) for key in node.top_by_kind.get(kind, ())),
+                                    key=self._rank)
+            results = []
+            for key in candidates:
+                entry = self._entries.get(key)
+                if entry and entry['type'] in kinds:
+                    results.append({'type': entry['type'], 'id': entry['id'], 'text': entry['text'], 'weight': entry['weight']})
+                    if len(results) >= limit:
+                        break
+            return results
+
+    def _subtree_entries(self, node, prefix):
+        """Entries below ``node`` that really start a word suffix with the (long) ``prefix`` (call with the lock held)"""
+        found = set()
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            found.update(current.entries)
+            stack.extend(current.children.values())
+        return [key for key in found if key in self._entries
+                and any(suffix.startswith(prefix) for suffix in self._suffixes(self._entries[key]['normalized']))]
+
+
+SOURCE_QUERY = """
+    SELECT 'book' AS kind, books.id, books.title AS text,
+           1 + (SELECT COUNT(*) FROM collection_books WHERE collection_books.book_id = books.id) AS weight
+    FROM books
+    UNION ALL
+    SELECT 'author', authors.id, authors.name,
+           1 + (SELECT COUNT(*) FROM book_authors WHERE book_authors.author_id = authors.id)
+    FROM authors
+    UNION ALL
+    SELECT 'category', categories.id, categories.name,
+           1 + (SELECT COUNT(*) FROM book_categories WHERE book_categories.category_id = categories.id)
+    FROM categories
+"""
+
+_index = None
+_built_at = 0.0
+_build_lock = threading.Lock()
+_rebuilding = False
+# Changes noted while a build runs, replayed onto the new index before it is swapped in
+_pending: Optional[list] = None
+_delta_lock = threading.Lock()
+
+
+def _load_rows():
+    with get_db(readonly=True) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(SOURCE_QUERY)
+            return [(row['kind'], row['id'], row['text'], row['weight']) for row in cursor.fetchall()]
+
+
+def _build():
+    index = SuggestIndex()
+    index.load(_load_rows())
+    return index
+
+
+def _apply(index, delta):
+    method, args = delta
+    try:
+        getattr(index, method)(*args)
+    except Exception:
+        logger.exception(f"Error updating suggest index ({method})")
+
+
+def _build_and_swap():
+    """Build a new index and swap it in, without losing changes noted meanwhile.
+
+    Replaying a change the build already read is harmless: upserts and removes
+    are idempotent.
+    """
+    global _index, _built_at, _pending
+    with _delta_lock:
+        _pending = []
+    try:
+        index = _build()
+    except Exception:
+        with _delta_lock:
+            _pending = None
+        raise
+    with _delta_lock:
+        for delta in _pending:
+            _apply(index, delta)
+        _pending = None
+        _index = index
+        _built_at = time.time()
+
+
+def _rebuild_in_background():
+    global _rebuilding
+
+    def run():
+        global _rebuilding
+        try:
+            # Outside of a request get_db() uses its own connection; the new index
+            # is swapped in whole so readers never see a half-built trie
+            _build_and_swap()
+        except Exception:
+            logger.exception("Error rebuilding suggest index")
+        finally:
+            _rebuilding = False
+
+    _rebuilding = True
+    threading.Thread(target=run, name='suggest-index-rebuild', daemon=True).start()
+
+
+def get_suggest_index() -> SuggestIndex:
+    """Return the process-wide index, building it on first use and refreshing it when stale"""
+    if _index is None:
+        with _build_lock:
+            if _index is None:
+                _build_and_swap()
+    elif (Config.SUGGEST_INDEX_REBUILD_SECONDS and not _rebuilding
+          and time.time() - _built_at > Config.SUGGEST_INDEX_REBUILD_SECONDS):
+        with _build_lock:
+            if not _rebuilding:
+                _rebuild_in_background()
+    return _index
+
+
+def _note(delta):
+    with _delta_lock:
+        if _pending is not None:
+            _pending.append(delta)
+        if _index is not None:
+            _apply(_index, delta)
+
+
+def note_saved(kind: str, entry_id: int, text: str):
+    """Blueprint hook: an entry was created or renamed (no-op until a build starts)"""
+    _note(('upsert', (kind, entry_id, text)))
+
+
+def note_deleted(kind: str, entry_id: int):
+    """Blueprint hook: an entry was deleted (no-op until a build starts)"""
+    _note(('remove', (kind, entry_id)))
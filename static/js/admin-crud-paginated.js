@@ -10,6 +10,7 @@ const CONFIG = {
         languages: '/languages/',
         users: '/users/'
     },
+    SUGGEST_ENDPOINT: '/suggest/',
     PER_PAGE: 10
 };
 
@@ -99,6 +100,38 @@ const utils = {
         };
     },
 
+    // Fill a <datalist> for the input with /api/suggest completions as the user types
+    attachSuggestions: function(inputId, type) {
+        const input = document.getElementById(inputId);
+        if (!input) return;
+
+        const datalist = document.createElement('datalist');
+        datalist.id = `${inputId}Suggestions`;
+        input.after(datalist);
+        input.setAttribute('list', datalist.id);
+        input.setAttribute('autocomplete', 'off');
+
+        input.addEventListener('input', utils.debounce(async () => {
+            const query = input.value.trim();
+            if (!query) {
+                datalist.innerHTML = '';
+                return;
+            }
+            try {
+                const params = new URLSearchParams({ q: query, type: type, limit: 8 });
+                const data = await utils.makeRequest(`${CONFIG.API_BASE}${CONFIG.SUGGEST_ENDPOINT}?${params}`);
+                datalist.innerHTML = '';
+                data.suggestions.forEach(suggestion => {
+                    const option = document.createElement('option');
+                    option.value = suggestion.text;
+                    datalist.appendChild(option);
+                });
+            } catch (error) {
+                console.error('Error loading suggestions:', error);
+            }
+        }, 100));
+    },
+
     showToast: function(title, message, type = 'info') {
         try {
             const toast = document.getElementById('alertToast');
@@ -646,4 +679,9 @@ document.addEventListener('DOMContentLoaded', function() {
             element.addEventListener('input', utils.debounce(func, 300));
         }
     });
+
+    // Autocomplete from the in-memory suggest index
+    utils.attachSuggestions('booksSearch', 'book');
+    utils.attachSuggestions('authorsSearch', 'author');
+    utils.attachSuggestions('categoriesSearch', 'category');
 });
\ No newline at end of file
@@ -12,13 +12,70 @@ class BooksManager {
     }
 
     // API Methods
-    async fetchBooks() {
+    // Fetch one page of books. Pass the previous page's `next` value as `cursor`
+    // to continue; filters: category, language, author, year_from, year_to, sort.
+    async fetchBooks(options = {}) {
         try {
-            const response = await fetch(`${this.apiBase}/books/`);
+            const params = new URLSearchParams();
+            Object.entries(options).forEach(([key, value]) => {
+                if (value === undefined || value === null || value === '') return;
+                [].concat(value).forEach(v => params.append(key, v));
+            });
+            const response = await fetch(`${this.apiBase}/books/?${params.toString()}`);
             return await response.json();
         } catch (error) {
             console.error('Error fetching books:', error);
-            return [];
+            return { data: [], next: null };
+        }
+    }
+
+    // Local copy of the catalog, kept current from /api/books/changes: the first
+    // call reads the whole feed, later calls only the changes since the stored cursor.
+    async syncCatalog() {
+        const cache = this.loadCatalogCache();
+        try {
+            let hasMore = true;
+            while (hasMore) {
+                const params = new URLSearchParams({ limit: 500 });
+                if (cache.cursor) params.set('since', cache.cursor);
+                const response = await fetch(`${this.apiBase}/books/changes?${params.toString()}`);
+                if (!response.ok) break;
+                const page = await response.json();
+                page.changes.forEach(change => {
+                    if (change.op === 'delete') {
+                        delete cache.books[change.id];
+                    } else {
+                        cache.books[change.id] = change.book;
+                    }
+                });
+                cache.cursor = page.next;
+                hasMore = page.has_more;
+            }
+            this.saveCatalogCache(cache);
+        } catch (error) {
+            console.error('Error syncing catalog:', error);
+        }
+        return cache.books;
+    }
+
+    loadCatalogCache() {
+        if (!this.catalogCache) {
+            try {
+                this.catalogCache = JSON.parse(localStorage.getItem('booksCatalog'));
+            } catch (error) {
+                this.catalogCache = null;
+            }
+            this.catalogCache = this.catalogCache || { cursor: null, books: {} };
+        }
+        return this.catalogCache;
+    }
+
+    saveCatalogCache(cache) {
+        try {
+            localStorage.setItem('booksCatalog', JSON.stringify(cache));
+        } catch (error) {
+            // Over the storage quota: keep the in-memory copy only
+            console.warn('Could not persist catalog cache:', error);
         }
     }
 
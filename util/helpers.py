@@ -1,4 +1,5 @@
 # normalize_strings
+# (books.normalized_title / normalize_title() in migration 0013 mirror this for titles)
 def normalize_strings(input_string):
     """Normalize a string by stripping whitespace and converting to lowercase one space between words."""
     return ' '.join(input_string.strip().lower().split()) if input_string else None